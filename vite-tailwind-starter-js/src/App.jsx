@@ -124,6 +124,7 @@ export default function App() {
 
   // uploaded flow state
   const [netlist, setNetlist] = useState('');
+  const [netlistId, setNetlistId] = useState(null); // backend registry id (POST /netlists)
   const [hints, setHints] = useState({
     supplies: { vdd: ['VDD', 'VCC'], vss: ['VSS', 'GND', '0'] },
     outputs: ['Y', 'OUT', 'Z', 'Q'],
@@ -134,7 +135,7 @@ export default function App() {
   const [pinRoles, setPinRoles] = useState({}); // { PIN: { role, drive, params{...} } }
 
   const { runDebounced } = useSimulate(); // legacy demo
-  const { analyze, simulateUploaded } = useUploadedSim();
+  const { analyze, registerNetlist, simulateUploaded } = useUploadedSim();
 
   const traces = useMemo(() => {
     const t = data.time || [];
@@ -147,9 +148,16 @@ export default function App() {
   async function doAnalyze(text, userHints = hints) {
     setNetlist(text);
     setHints(userHints);
+    setNetlistId(null);
     setStatus({ state: 'running' });
     try {
-      const res = await analyze(text, userHints);
+      let res;
+      try {
+        res = await registerNetlist(text, userHints); // indexes once, returns subckts too
+        setNetlistId(res.netlist_id);
+      } catch {
+        res = await analyze(text, userHints); // older backend without /netlists
+      }
       setSubckts(res.subckts || []);
       setChosen(null);
       setPlotNodes([]);
@@ -202,6 +210,7 @@ export default function App() {
       const pin_drives = computePinDrives();
       const body = {
         netlist,
+        netlist_id: netlistId,
         subckt: { name: chosen.name, pins: chosen.pins },
         plot_nodes: plotNodes,
         params: Object.fromEntries(Object.entries(params).map(([k, v]) => [k, Number(v)])),
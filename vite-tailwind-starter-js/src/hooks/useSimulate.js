@@ -3,6 +3,87 @@ import axios from 'axios';
 
 const sleep = (ms) => new Promise(r => setTimeout(r, ms));
 
+/* -------- binary waveform transport (api/transport.py) -------- */
+
+export const WAVE_MEDIA_TYPE = 'application/x-logicsim-wave';
+// VITE_WAVE_FORMAT=binary → ask the backend for packed columns instead of JSON lists
+const WANT_BINARY = import.meta.env.VITE_WAVE_FORMAT === 'binary';
+
+// "LSW1" | u32 header_len | header JSON | 8-byte aligned little-endian columns
+export function decodeWave(buf) {
+  const dv = new DataView(buf);
+  const magic = String.fromCharCode(dv.getUint8(0), dv.getUint8(1), dv.getUint8(2), dv.getUint8(3));
+  if (magic !== 'LSW1') throw new Error('not a waveform payload');
+  const hlen = dv.getUint32(4, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buf, 8, hlen)));
+  const base = 8 + hlen;
+  const cols = {};
+  for (const c of header.columns) {
+    const Arr = c.dtype === 'float64' ? Float64Array : Float32Array;
+    cols[c.name] = new Arr(buf, base + c.offset, c.length); // zero-copy view
+  }
+  const { time, ...waveforms } = cols;
+  const out = { time, waveforms, meta: header.meta };
+  if (header.measure) out.measure = header.measure; // request had a "measure" spec
+  return out;
+}
+
+async function postWave(url, body, opts) {
+  if (!WANT_BINARY) {
+    const res = await axios.post(url, body, { ...opts, headers: { 'Content-Type': 'application/json' } });
+    return res.data;
+  }
+  const res = await axios.post(url, body, {
+    ...opts,
+    responseType: 'arraybuffer',
+    headers: { 'Content-Type': 'application/json', Accept: `${WAVE_MEDIA_TYPE}, application/json` },
+  });
+  return decodeWave(res.data);
+}
+
+/* -------- interactive session (WebSocket /ws/session, api/session.py) -------- */
+
+// VITE_SIM_SESSION=ws → slider runs go over one WebSocket; the server kills
+// superseded ngspice runs and only simulates the latest params
+const USE_SESSION = import.meta.env.VITE_SIM_SESSION === 'ws';
+
+// config = /simulate or /simulate_uploaded body + mode: 'template' | 'uploaded'
+// onMessage({ seq, data }) for results, onMessage({ seq, error }) for failures
+export function openSimSession(config, onMessage) {
+  const url = import.meta.env.VITE_API_URL.replace(/^http/, 'ws') + '/ws/session';
+  const ws = new WebSocket(url);
+  ws.binaryType = 'arraybuffer';
+  let queued = null; // params sent before the socket opened (only the latest)
+  ws.onopen = () => {
+    ws.send(JSON.stringify({ type: 'config', ...config, ...(WANT_BINARY ? { format: 'binary' } : {}) }));
+    if (queued) ws.send(JSON.stringify(queued));
+    queued = null;
+  };
+  ws.onmessage = (ev) => {
+    if (ev.data instanceof ArrayBuffer) {
+      const data = decodeWave(ev.data);
+      onMessage({ seq: data.meta.seq, data });
+      return;
+    }
+    const msg = JSON.parse(ev.data);
+    if (msg.type === 'result') {
+      const { type, seq, ...data } = msg;
+      onMessage({ seq, data });
+    } else if (msg.type === 'error') {
+      onMessage({ seq: msg.seq, error: msg.error });
+    }
+  };
+  return {
+    update(params, seq) {
+      const msg = { type: 'params', params, seq };
+      if (ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify(msg));
+      else queued = msg;
+    },
+    cancel() { if (ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify({ type: 'cancel' })); },
+    close() { ws.close(); },
+  };
+}
+
 function dummySim(params) {
   const VDD = parseFloat(params.VDD ?? '1.2');
   const PER = parseFloat(params.PER ?? '1e-9');
@@ -38,18 +119,35 @@ export function useSimulate() {
     }
     const body = { params, nodes: ['a','y'] };
     try {
-      const res = await axios.post(`${base}/simulate`, body, {
-        signal,
-        headers: { 'Content-Type': 'application/json' },
-        timeout: 20000,
-      });
-      return res.data;
+      return await postWave(`${base}/simulate`, body, { signal, timeout: 20000 });
     } catch (e) {
       return { ...dummySim(params), error: e.message || 'simulate failed (fallback to dummy)' };
     }
   }
 
+  let session = null;
+  let sessionSetters = null;
+
+  // no client-side debounce: every change is pushed, the server coalesces
+  function runSession(setters, params) {
+    const runId = ++lastRunId;
+    sessionSetters = setters;
+    if (!session) {
+      session = openSimSession({ mode: 'template', params, nodes: ['a','y'] }, ({ seq, data, error }) => {
+        if (seq !== lastRunId) return; // superseded
+        if (error) sessionSetters.setStatus({ state: 'error', runId: seq, error });
+        else {
+          sessionSetters.setData(data);
+          sessionSetters.setStatus({ state: 'idle', runId: seq });
+        }
+      });
+    }
+    setters.setStatus({ state: 'running', runId });
+    session.update(params, runId);
+  }
+
   function runDebounced(setters, params, auto=false) {
+    if (USE_SESSION && import.meta.env.VITE_API_URL) return runSession(setters, params);
     const runId = ++lastRunId;
     if (currentController) currentController.abort();
     const controller = new AbortController();
@@ -91,16 +189,33 @@ export function useUploadedSim() {
     return res.data; // { subckts: [{ name, pins }] }
   }
 
-  // UPDATED: now accepts pin_drives and forwards it to backend
-  async function simulateUploaded({ netlist, subckt, plot_nodes, params, hints, roles, pin_drives }) {
+  // upload once → { netlist_id, subckts, ... }; later calls send only the id
+  async function registerNetlist(netlist, hints) {
     const base = import.meta.env.VITE_API_URL;
     if (!base) throw new Error('VITE_API_URL not set');
-    const body = { netlist, subckt, plot_nodes, params, hints, roles, pin_drives };
-    const res = await axios.post(`${base}/simulate_uploaded`, body, {
-      headers: { 'Content-Type': 'application/json' }, timeout: 30000
+    const res = await axios.post(`${base}/netlists`, { netlist, hints }, {
+      headers: { 'Content-Type': 'application/json' }, timeout: 60000
     });
-    return res.data; // { time, waveforms, meta }
+    return res.data;
+  }
+
+  // UPDATED: now accepts pin_drives and forwards it to backend
+  // max_points (optional): server min/max-decimates the waveforms to ~chart width
+  // netlist_id (optional): registered netlist; text is only sent if the server forgot it
+  async function simulateUploaded({ netlist, netlist_id, subckt, plot_nodes, params, hints, roles, pin_drives, max_points }) {
+    const base = import.meta.env.VITE_API_URL;
+    if (!base) throw new Error('VITE_API_URL not set');
+    const body = { subckt, plot_nodes, params, hints, roles, pin_drives };
+    if (max_points) body.max_points = max_points;
+    if (netlist_id) {
+      try {
+        return await postWave(`${base}/simulate_uploaded`, { ...body, netlist_id }, { timeout: 30000 });
+      } catch (e) {
+        if (e?.response?.status !== 404 || !netlist) throw e; // evicted → resend text below
+      }
+    }
+    return postWave(`${base}/simulate_uploaded`, { ...body, netlist }, { timeout: 30000 }); // { time, waveforms, meta }
   }
 
-  return { analyze, simulateUploaded };
+  return { analyze, registerNetlist, simulateUploaded };
 }
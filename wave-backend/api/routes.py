@@ -1,27 +1,38 @@
 # api/routes.py
 from __future__ import annotations
 
-import shutil
 import subprocess
 import time
-from pathlib import Path
-from typing import Any, Dict, List, Optional
-
-from fastapi import APIRouter, Body, HTTPException
-from fastapi.responses import JSONResponse
-
-from core.config import TPL_PATH, new_run_dir, KEEP_RUNS
-from core.utils import norm_params, tail_warnings, run_ngspice
-from spice.parse import (
-    parse_subckts_from_text,
-    parse_wrdata_ordered,
-    parse_csv,
-)
-from spice.tb import render_uploaded_tb, render_tb, write_tpl_from_netlist
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Body, HTTPException, Request, WebSocket
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from api.session import SESSION_STATS, SimSession
+from api.sim import (TemplateSim, UploadedSim, archive_view, archive_window, max_points_field, registered_netlist,
+                     until_disconnect)
+from api.sweep import ACTIVE_SWEEPS, batch_size_for, expand_grid, sweep_stream
+from api.transport import wants_binary, wave_dtype, wave_response
+from api.upload import receive_netlist
+from core.archive import run_archive
+from core.config import JOB_TIMEOUT_S, TPL_PATH
+from core.inflight import inflight
+from core.jobs import DONE, JobStoreFull, job_store
+from core.metrics import metrics
+from core.netlists import netlist_store
+from core.scheduler import scheduler, slow_scheduler
+from core.workspace import workspace
+from spice.engine import SimError, engine_stats
+from spice.parse import parse_subckts_from_text
+from spice.tb import template_report, write_tpl_from_netlist
 
 # Expose only the router here; FastAPI app is created in server.py
 router = APIRouter()
 
+VIEW_MAX_WIDTH = 16384
+CLIENT_CLOSED = 499  # nginx convention: client closed the request before the response
+
 
 @router.get("/health")
 def health():
@@ -31,15 +42,25 @@ def health():
         version = vtxt.strip().splitlines()[0]
     except Exception as e:
         version = f"unavailable ({e})"
-    return {"ok": True, "ngspice": version}
+    return {"ok": True, "ngspice": version, "scheduler": scheduler.stats(),
+            "slow_lane": slow_scheduler.stats(), "engine": engine_stats(),
+            "jobs": job_store.stats(), "workspace": workspace.stats(), "sessions": dict(SESSION_STATS),
+            "metrics": metrics.snapshot(), "inflight": inflight.stats()}
 
 
 @router.post("/analyze")
 def analyze(payload: Dict[str, Any] = Body(...)):
     """
     Body: { "netlist": "<...>", "hints"?: {supplies:{vdd:[], vss:[]}, outputs:[] } }
+          or { "netlist_id": "<id from POST /netlists>" }  (index computed at registration)
     Resp: { "subckts": [ { "name": str, "pins": [..] } ] }
     """
+    if payload.get("netlist_id"):
+        subs = registered_netlist(payload["netlist_id"])["subckts"]
+        if not subs:
+            raise HTTPException(400, "no .subckt found in netlist")
+        return {"subckts": subs}
+
     text = payload.get("netlist", "")
     hints = payload.get("hints") or {}
     if not text.strip():
@@ -56,208 +77,249 @@ def prepare_tpl(payload: Dict[str, Any] = Body(...)):
     """
     Body: { "netlist": "<full .cir text>" }
     Effect: tb.tpl.cir is overwritten to contain uploaded netlist + templated TB block.
+    Resp: { ok, tpl_path, template: { placeholders, unknown, missing } }
     """
     netlist = payload.get("netlist", "").strip()
     if not netlist:
         raise HTTPException(400, "empty netlist")
 
     write_tpl_from_netlist(netlist)
-    return {"ok": True, "tpl_path": str(TPL_PATH)}
+    return {"ok": True, "tpl_path": str(TPL_PATH), "template": template_report()}
+
+
+# ---------------- netlist registry ----------------
+
+@router.post("/netlists")
+def register_netlist(payload: Dict[str, Any] = Body(...)):
+    """
+    Body: { "netlist": "<full .cir text>", "hints"?: {...} }
+    Resp: { "netlist_id", "subckts": [..], "bytes", "hints", "created", "existing": bool }
+    Hash + normalize + index once; later calls send "netlist_id" instead of text.
+    """
+    text = payload.get("netlist", "")
+    if not text.strip():
+        raise HTTPException(400, "empty netlist")
+    return netlist_store.register(text, payload.get("hints") or None)
+
+
+@router.post("/netlists/upload")
+async def upload_netlist(request: Request):
+    """
+    Streaming variant of POST /netlists for big netlists (nothing buffered in memory):
+      - raw body (text/plain, application/octet-stream, ...), hints as ?hints=<json>
+      - multipart/form-data: optional "hints" field first, then the "file" part
+    Resp: same as POST /netlists. 413 above NETLIST_UPLOAD_MAX_MB.
+    """
+    return await receive_netlist(request)
+
+
+@router.get("/netlists/{netlist_id}")
+def get_netlist(netlist_id: str):
+    return netlist_store.public(registered_netlist(netlist_id))
+
+
+@router.delete("/netlists/{netlist_id}")
+def delete_netlist(netlist_id: str):
+    if not netlist_store.delete(netlist_id):
+        raise HTTPException(404, "unknown netlist_id")
+    return {"ok": True, "netlist_id": netlist_id}
 
 
 @router.post("/simulate_uploaded")
-def simulate_uploaded(payload: Dict[str, Any] = Body(...)):
+async def simulate_uploaded(request: Request, payload: Dict[str, Any] = Body(...)):
     """
     Body:
     {
-      "netlist": "<full .cir text>",
+      "netlist": "<full .cir text>",  # or "netlist_id": "<id from POST /netlists>"
       "subckt":   { "name": "NAND2", "pins": ["Y","A","B","VDD","VSS"] },
       "plot_nodes": ["A","Y"],
       "params": { VDD, TEMP, TR, TF, PW, PER, CLOAD, TSTEP, TSTOP },
       "roles": { ... },           # optional
       "pin_drives": { ... },      # optional (front-end chooses pulse/dc/etc per input pin)
-      "hints": { ... }            # optional alias hints
+      "hints": { ... },           # optional alias hints
+      "output": "ascii"|"binary", # optional, default SIM_OUTPUT
+      "engine": "subprocess"|"shared", # optional, default SIM_ENGINE
+      "max_points": 2000,         # optional: min/max-decimate waveforms to this many samples
+      "measure": true | {...},    # optional: delays/slews/overshoot/supply power → "measure"
+                                  #   (spec: spice.measure.MeasureSpec; "waveforms": false → metrics only)
+      "admission": "auto"|"strict", # optional: pre-flight cost check (core/admission.py); too many
+                                  #   output rows → TSTEP coarsened ("auto") or 422 ("strict"),
+                                  #   long runs → slow lane; decision + reasons in meta.admission
+      "truth_table": true | {"order": "binary"|"gray", "slot": s, "sample_at": 0.9},
+                                  # optional: all 2^N input codes (PWL) in one run →
+                                  #   measure.truth_table {rows, functions}; TSTOP = slot * 2^N
+      "format": "json"|"binary",  # optional; or Accept: application/x-logicsim-wave
+      "dtype": "float32"|"float64"  # binary only (time column is always float64)
     }
+    meta.points = returned samples, meta.points_raw = simulated samples.
+    Errors are always JSON.
     """
     t0 = time.time()
-    netlist: str = payload.get("netlist", "")
-    sub = payload.get("subckt") or {}
-    sub_name: Optional[str] = sub.get("name")
-    pin_order: List[str] = sub.get("pins") or []
-    plot_nodes: List[str] = payload.get("plot_nodes") or []
-    hints: Dict[str, Any] = payload.get("hints") or {}
-    roles_override: Optional[Dict[str, Any]] = payload.get("roles")
-    pin_drives: Optional[Dict[str, Dict[str, Any]]] = payload.get("pin_drives")
-
-    if not netlist.strip():
-        raise HTTPException(400, "empty netlist")
-    if not sub_name or not pin_order:
-        raise HTTPException(400, "subckt name/pins required")
-    if not plot_nodes:
-        plot_nodes = pin_order[:2]
-
-    params = norm_params(payload.get("params", {}))
-
-    # Single, predictable run dir
-    run_dir = new_run_dir(prefix="u_")
-    out_csv = run_dir / "sim.csv"
-    cir = run_dir / "tb.cir"
-    log = run_dir / "run.log"
-
-    tb_text = render_uploaded_tb(
-        netlist_text=netlist,
-        subckt_name=sub_name,
-        pin_order=pin_order,
-        params=params,
-        plot_nodes=plot_nodes,
-        out_csv=out_csv.resolve(),
-        roles=roles_override,
-        pin_drives=pin_drives,
-        hints=hints,
-    )
-    # # --- PATCH START: force headless mode ---
-    # if ".set nograph" not in tb_text:
-    #     # Insert it before .control if it exists
-    #     if ".control" in tb_text:
-    #         tb_text = tb_text.replace(".control", ".set nograph\n.control")
-    #     else:
-    #         # If there's no .control, just append it near the top
-    #         tb_text = ".set nograph\n" + tb_text
-    # # --- PATCH END ---
-    print("[DEBUG] Rendered testbench tb.cir:\n" + tb_text) 
-    cir.write_text(tb_text)
-
-    try:
-        print(f"[DEBUG] Running ngspice on: {cir}")  # --- Debug point 1 ---
-        ret = run_ngspice(cir, log, timeout_s=25)
-        print(f"[DEBUG] ngspice return code: {ret}")  # --- Debug point 2 ---
-
-        # Read log after execution for more debug info
-        log_text = log.read_text(errors="ignore") if log.exists() else ""
-        print(f"[DEBUG] ngspice log (first 20 lines):\n" + "\n".join(log_text.splitlines()[:20]))
-
-        if ret != 0:
-            return JSONResponse(
-                {
-                    "error": f"ngspice exited with code {ret}",
-                    "paths": {"run_dir": str(run_dir), "tb": str(cir), "log": str(log)},
-                    "log": log_text,
-                },
-                status_code=500,
-            )
-
-    except subprocess.TimeoutExpired:
-        return JSONResponse(
-            {"error": "ngspice timeout (reduce TSTOP or increase TSTEP)",
-             "paths": {"run_dir": str(run_dir), "tb": str(cir), "log": str(log)}},
-            status_code=504
-        )
-    except Exception as e:
-        return JSONResponse(
-            {"error": f"spawn failed: {e}",
-             "paths": {"run_dir": str(run_dir), "tb": str(cir), "log": str(log)}},
-            status_code=500
-        )
-
-    if not out_csv.exists():
-        log_text = log.read_text(errors="ignore") if log.exists() else ""
-        print("[DEBUG] sim.csv not found! ngspice log below:\n" + log_text)  # --- Debug point 3 ---
-        return JSONResponse(
-            {"error": "simulation failed (no CSV)",
-            "paths": {"run_dir": str(run_dir), "tb": str(cir), "log": str(log)},
-            "log": log_text},
-            status_code=500
-        )
-
-
-    vec_labels = [f"v({n})" for n in plot_nodes]
+    req = await run_in_threadpool(UploadedSim, payload)
+    binary = wants_binary(request, payload)
+    dtype = wave_dtype(payload)
     try:
-        parsed = parse_wrdata_ordered(out_csv, vec_labels)
-    except Exception as e:
-        return JSONResponse(
-            {"error": f"parse failed: {e}",
-             "paths": {"run_dir": str(run_dir), "tb": str(cir), "log": str(log)},
-             "log": log.read_text(errors="ignore")},
-            status_code=500
-        )
-
-    elapsed = int((time.time() - t0) * 1000)
-    warns = tail_warnings(log.read_text(errors="ignore"))
-    waves = {lbl: parsed[lbl] for lbl in vec_labels if lbl in parsed}
-
-    # Clean up unless KEEP_RUNS=1
-    if not KEEP_RUNS:
-        try:
-            shutil.rmtree(run_dir)
-        except Exception:
-            pass
-
-    return {
-        "time": parsed["time"],
-        "waveforms": waves,
-        "meta": {
-            "points": len(parsed["time"]),
-            "elapsed_ms": elapsed,
-            "warnings": warns,
-            "run_dir": str(run_dir),
-        },
-    }
+        res = await until_disconnect(request, req.simulate(t0=t0))
+    except SimError as e:
+        return JSONResponse(e.body(), status_code=e.status_code)
+    if res is None:  # client went away, run killed
+        return Response(status_code=CLIENT_CLOSED)
+    return wave_response(res, dtype) if binary else res
 
 
 @router.post("/simulate")
-def simulate(payload: Dict[str, Any] = Body(...)):
+async def simulate(request: Request, payload: Dict[str, Any] = Body(...)):
     """
     Template path: tb.tpl.cir
     Optional: tpl_vars = {"SUBCKT_NAME": "...", "PIN_LIST": ["...", "...", "VDD", "0"]}
+    Same output/engine/max_points/measure/admission/format/dtype options as /simulate_uploaded.
+    measure: nodes are "a" (input) and "y" (output); supply metrics need a
+    VDD_SRC source in the template (the /prepare_tpl one has it).
     """
     t0 = time.time()
-    params_in = payload.get("params", {})
-    nodes = payload.get("nodes", ["a", "y"])
-    tpl_vars = payload.get("tpl_vars") or {}
+    req = await run_in_threadpool(TemplateSim, payload)
+    binary = wants_binary(request, payload)
+    dtype = wave_dtype(payload)
+    try:
+        res = await until_disconnect(request, req.simulate(t0=t0))
+    except SimError as e:
+        return JSONResponse(e.body(), status_code=e.status_code)
+    if res is None:
+        return Response(status_code=CLIENT_CLOSED)
+    return wave_response(res, dtype) if binary else res
+
+
+@router.websocket("/ws/session")
+async def sim_session(ws: WebSocket):
+    """Interactive session: latest-params-only runs, superseded ngspice runs killed (api/session.py)."""
+    await SimSession(ws).serve()
+
+
+@router.post("/sweep")
+async def sweep(payload: Dict[str, Any] = Body(...)):
+    """
+    Body: /simulate_uploaded body + "grid": { "CLOAD": [..], "VDD": {"start":..,"stop":..,"num":..}, ... }
+          + "batch"?: true | <int>   (several points per ngspice run; ascii output)
+    Resp: application/x-ndjson stream
+      {"type":"start","sweep_id":..,"total":N}
+      {"type":"point","index":i,"params":{..},"status":200,"time":[..],"waveforms":{..},"meta":{..},"done":k,"total":N}
+      {"type":"end","done":k,"total":N,"cancelled":bool,"elapsed_ms":..}
+    Points stream in completion order. Disconnect or DELETE /sweep/{sweep_id} cancels.
+    """
+    req = await run_in_threadpool(UploadedSim, payload)
+    points = expand_grid(payload.get("grid"))
+    # truth-table PWL timing depends on each point's PER → no batching
+    batch = 1 if req.truth_table else batch_size_for(payload.get("batch"), len(points))
+    return StreamingResponse(sweep_stream(req, points, batch), media_type="application/x-ndjson")
+
+
+@router.delete("/sweep/{sweep_id}")
+def cancel_sweep(sweep_id: str):
+    ev = ACTIVE_SWEEPS.get(sweep_id)
+    if ev is None:
+        raise HTTPException(404, "unknown or finished sweep")
+    ev.set()
+    return {"ok": True, "sweep_id": sweep_id}
+
 
-    params = norm_params(params_in)
+# ---------------- async jobs ----------------
 
-    run_dir = new_run_dir(prefix="")
-    out_csv = run_dir / "sim.csv"
-    cir = run_dir / "tb.cir"
-    log = run_dir / "run.log"
+@router.post("/jobs", status_code=202)
+async def submit_job(payload: Dict[str, Any] = Body(...)):
+    """
+    Body: /simulate_uploaded body (validated now, simulated in the background
+          with JOB_TIMEOUT_S instead of SIM_TIMEOUT_S).
+    Resp: 202 { "job_id", "status": "queued", ... }  → poll GET /jobs/{job_id}
+    "format"/"dtype" in the body are the defaults for delivering the result.
+    """
+    req = await run_in_threadpool(UploadedSim, payload)
+    options = {"format": payload.get("format"), "dtype": wave_dtype(payload)}
 
-    cir_text = render_tb(params, nodes, out_csv.resolve(), tpl_vars=tpl_vars)
-    cir.write_text(cir_text)
+    def _err(e: BaseException):
+        if isinstance(e, SimError):
+            return e.status_code, e.body()
+        return None
 
     try:
-        _ = run_ngspice(cir, log, timeout_s=25)
-    except subprocess.TimeoutExpired:
-        return JSONResponse(
-            {"error": "ngspice timeout (reduce TSTOP or increase TSTEP)",
-             "log": log.read_text(errors="ignore")},
-            status_code=504
-        )
-    except Exception as e:
-        return JSONResponse({"error": f"spawn failed: {e}"}, status_code=500)
-
-    if not out_csv.exists():
-        log_txt = log.read_text(errors="ignore") if log.exists() else ""
-        return JSONResponse({"error": "simulation failed (no CSV)", "log": log_txt}, status_code=500)
-
-    data = parse_csv(out_csv)
-    elapsed = int((time.time() - t0) * 1000)
-    log_txt = log.read_text(errors="ignore") if log.exists() else ""
-    warns = tail_warnings(log_txt)
-
-    if not KEEP_RUNS:
-        try:
-            shutil.rmtree(run_dir)
-        except Exception:
-            pass
-
-    return {
-        "time": data["time"],
-        "waveforms": {"v(a)": data["v(a)"], "v(y)": data["v(y)"]},
-        "meta": {
-            "points": len(data["time"]),
-            "elapsed_ms": elapsed,
-            "warnings": warns,
-            "run_dir": str(run_dir),
-        },
-    }
+        job = job_store.submit("simulate_uploaded",
+                               lambda: req.simulate(timeout_s=JOB_TIMEOUT_S), on_error=_err,
+                               options=options)
+    except JobStoreFull as e:
+        raise HTTPException(503, f"job store full: {e}")
+    return job.summary()
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str, request: Request, format: Optional[str] = None, dtype: Optional[str] = None):
+    """
+    Resp: { "job_id", "status": queued|running|done|failed|cancelled, "elapsed_ms", ... }
+      done   → + "result": usual /simulate_uploaded body (binary body if format=binary
+               or Accept asks for it; ?format= / ?dtype= override the submitted ones)
+      failed → + "error": {...}, "status_code"
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(404, "unknown or expired job")
+    if job.status == DONE:
+        opts = {"format": format or job.options.get("format"), "dtype": dtype or job.options.get("dtype")}
+        if wants_binary(request, opts):
+            return wave_response(job.result, wave_dtype(opts))
+        return {**job.summary(), "result": job.result}
+    return job.summary()
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a job: kills its ngspice child, removes its run dir, drops it from the store."""
+    job = await job_store.cancel(job_id)
+    if job is None:
+        raise HTTPException(404, "unknown or expired job")
+    return job.summary()
+
+
+@router.get("/runs/{run_id}")
+def get_run(run_id: str):
+    """Archive index of a finished run (meta.run_id of a /simulate* response)."""
+    index = run_archive.index(run_id)
+    if index is None:
+        raise HTTPException(404, "unknown or expired run_id")
+    return index
+
+
+@router.get("/runs/{run_id}/window")
+async def run_window(run_id: str, request: Request, t0: Optional[float] = None, t1: Optional[float] = None,
+                     max_points: Optional[int] = None, vectors: Optional[str] = None,
+                     format: Optional[str] = None, dtype: Optional[str] = None):
+    """
+    Samples of an archived run with t0 <= time <= t1 (either bound optional),
+    min/max-decimated to max_points. vectors = comma separated subset.
+    Binary body with format=binary or the wave Accept header (like /simulate).
+    """
+    opts = {"max_points": max_points, "format": format, "dtype": dtype}
+    mp = max_points_field(opts)
+    labels = [v.strip() for v in vectors.split(",") if v.strip()] if vectors else None
+    binary, dt = wants_binary(request, opts), wave_dtype(opts)
+    res = await run_in_threadpool(archive_window, run_id, t0, t1, labels, mp)
+    if binary:
+        return wave_response(res, dt)
+    return res
+
+
+@router.get("/runs/{run_id}/view")
+async def run_view(run_id: str, request: Request, width: int, t0: Optional[float] = None,
+                   t1: Optional[float] = None, vectors: Optional[str] = None,
+                   format: Optional[str] = None, dtype: Optional[str] = None):
+    """
+    Zoom / pan query for a chart `width` pixels wide: min/max envelope of
+    [t0, t1] from the run's pyramid (meta.level = samples per bucket, 1 = raw).
+    Same body / binary options as /window.
+    """
+    if not 1 <= width <= VIEW_MAX_WIDTH:
+        raise HTTPException(400, f"width must be 1..{VIEW_MAX_WIDTH}")
+    opts = {"format": format, "dtype": dtype}
+    labels = [v.strip() for v in vectors.split(",") if v.strip()] if vectors else None
+    binary, dt = wants_binary(request, opts), wave_dtype(opts)
+    res = await run_in_threadpool(archive_view, run_id, t0, t1, labels, width)
+    if binary:
+        return wave_response(res, dt)
+    return res
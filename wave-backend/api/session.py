@@ -0,0 +1,172 @@
+# api/session.py
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+
+from api.sim import TemplateSim, UploadedSim
+from api.transport import encode_wave, wants_binary, wave_dtype
+from spice.engine import SimError
+
+# Interactive WebSocket session (/ws/session): the client pushes every slider
+# move, the server keeps at most ONE run in flight per session.
+#
+#   client → {"type": "config", "mode": "uploaded"|"template", ...body}
+#              body = /simulate_uploaded or /simulate payload (params = base values)
+#            {"type": "params", "params": {...}, "seq": n}   (merged over the base)
+#            {"type": "cancel"}
+#   server → {"type": "ready", "mode": ...}
+#            {"type": "result", "seq": n, "time", "waveforms", "meta", "measure"?}
+#              (binary frame, meta.seq = n, when config has "format": "binary")
+#            {"type": "error", "seq": n | null, "status": ..., "error": ..., ...}
+#
+# A new "params" message kills the in-flight ngspice child (task cancel → the
+# engine kills it and frees its scheduler slot) and replaces any waiting one,
+# so only the latest parameters are ever simulated. Load grows with active
+# sessions, not with slider events.
+
+SimRequest = Union[UploadedSim, TemplateSim]
+
+# process-wide counters for /health
+SESSION_STATS: Dict[str, int] = {"active": 0, "runs": 0, "superseded": 0, "coalesced": 0}
+
+
+class SimSession:
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.sim: Optional[SimRequest] = None
+        self.binary = False
+        self.dtype = "float32"
+        self.pending: Optional[Tuple[Optional[int], Dict[str, Any]]] = None
+        self.current: Optional[asyncio.Task] = None
+        self.wake = asyncio.Event()
+        self._send_lock = asyncio.Lock()
+
+    # ---------- outgoing ----------
+
+    async def _send(self, msg: Union[Dict[str, Any], bytes]) -> None:
+        async with self._send_lock:
+            if isinstance(msg, bytes):
+                await self.ws.send_bytes(msg)
+            else:
+                await self.ws.send_text(json.dumps(msg, separators=(",", ":")))
+
+    async def _error(self, seq: Optional[int], status: int, error: str) -> None:
+        await self._send({"type": "error", "seq": seq, "status": status, "error": error})
+
+    # ---------- incoming ----------
+
+    def _supersede(self) -> None:
+        """Drop the waiting params and kill the in-flight run (if any)."""
+        if self.pending is not None:
+            SESSION_STATS["coalesced"] += 1
+            self.pending = None
+        if self.current is not None and not self.current.done():
+            self.current.cancel()
+            SESSION_STATS["superseded"] += 1
+
+    async def _on_message(self, msg: Dict[str, Any]) -> None:
+        kind = msg.get("type")
+        if kind == "config":
+            self._supersede()
+            mode = msg.get("mode", "uploaded")
+            try:
+                if mode == "uploaded":
+                    sim: SimRequest = await run_in_threadpool(UploadedSim, msg)
+                elif mode == "template":
+                    sim = await run_in_threadpool(TemplateSim, msg)
+                else:
+                    raise HTTPException(400, "mode must be 'uploaded' or 'template'")
+                self.binary = wants_binary(self.ws, msg)
+                self.dtype = wave_dtype(msg)
+            except HTTPException as e:
+                await self._error(None, e.status_code, str(e.detail))
+                return
+            self.sim = sim
+            await self._send({"type": "ready", "mode": mode})
+        elif kind == "params":
+            seq = msg.get("seq")
+            if self.sim is None:
+                await self._error(seq, 409, "send a 'config' message first")
+                return
+            if not isinstance(msg.get("params", {}), dict):
+                await self._error(seq, 400, "params must be an object")
+                return
+            self._supersede()
+            self.pending = (seq, msg.get("params") or {})
+            self.wake.set()
+        elif kind == "cancel":
+            self._supersede()
+        else:
+            await self._error(msg.get("seq"), 400, "type must be 'config', 'params' or 'cancel'")
+
+    # ---------- runner ----------
+
+    async def _runner(self) -> None:
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            if self.pending is None or self.sim is None:
+                continue
+            (seq, params), self.pending = self.pending, None
+            t0 = time.time()
+            SESSION_STATS["runs"] += 1
+            self.current = asyncio.create_task(self.sim.simulate(params, t0=t0))
+            try:
+                res = await asyncio.shield(self.current)
+            except asyncio.CancelledError:
+                if not self.current.cancelled():  # the session itself is closing
+                    self.current.cancel()
+                    raise
+                continue  # superseded by newer params
+            except SimError as e:
+                await self._send({"type": "error", "seq": seq, "status": e.status_code, **e.body()})
+                continue
+            except HTTPException as e:
+                await self._error(seq, e.status_code, str(e.detail))
+                continue
+            except Exception as e:  # anything else fails this run only; the session keeps serving
+                await self._error(seq, 500, f"{type(e).__name__}: {e}")
+                continue
+            finally:
+                self.current = None
+            if self.pending is not None:  # finished just as newer params arrived
+                continue
+            if self.binary:
+                await self._send(encode_wave({**res, "meta": {**res["meta"], "seq": seq}}, self.dtype))
+            else:
+                await self._send({"type": "result", "seq": seq, **res})
+
+    async def serve(self) -> None:
+        await self.ws.accept()
+        SESSION_STATS["active"] += 1
+        runner = asyncio.create_task(self._runner())
+        try:
+            while True:
+                frame = await self.ws.receive()
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(frame.get("code", 1000))
+                text = frame.get("text")
+                if text is None:  # binary frame
+                    await self._error(None, 400, "messages must be JSON text frames")
+                    continue
+                try:
+                    msg = json.loads(text)
+                except ValueError:
+                    await self._error(None, 400, "messages must be JSON")
+                    continue
+                if not isinstance(msg, dict):
+                    await self._error(None, 400, "messages must be JSON objects")
+                    continue
+                await self._on_message(msg)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            SESSION_STATS["active"] -= 1
+            self._supersede()
+            runner.cancel()
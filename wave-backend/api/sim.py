@@ -0,0 +1,650 @@
+# api/sim.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import numpy as np
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from core.admission import ADMISSION_POLICIES, admit, count_devices, devices_for
+from core.archive import archive_id, run_archive
+from core.cache import OUT_PLACEHOLDER, result_cache, tb_cache_key
+from core.config import LIMITS, OUTPUT_FORMAT, SIM_TIMEOUT_S, SLOW_TIMEOUT_S, TRUTH_TABLE_MAX_INPUTS
+from core.inflight import inflight
+from core.metrics import metrics
+from core.netlists import netlist_store
+from core.utils import norm_params, tail_warnings
+from spice.decimate import MIN_POINTS, decimate_arrays
+from spice.engine import ENGINES, SimError, SimRun, run_tb
+from spice.measure import SUPPLY_SRC, SUPPLY_VEC, MeasureSpec, measure_arrays, truth_table
+from spice.stimulus import STIM_TYPES, StimulusError, compile_drive
+from spice.tb import (OUTPUT_MODES, TRUTH_TABLE_ORDERS, io_roles, render_tb, render_uploaded_tb,
+                      render_uploaded_tb_batch, template_defines, truth_table_codes)
+
+# Shared request → response plumbing for /simulate_uploaded and everything
+# built on top of it (sweeps, jobs, sessions). Route handlers stay thin.
+
+
+def output_mode(payload: Dict[str, Any]) -> str:
+    """Per-request 'output' ("ascii"|"binary"), defaulting to SIM_OUTPUT."""
+    mode = str(payload.get("output") or OUTPUT_FORMAT).lower()
+    if mode not in OUTPUT_MODES:
+        raise HTTPException(400, f"output must be one of {list(OUTPUT_MODES)}")
+    return mode
+
+
+def engine_choice(payload: Dict[str, Any]) -> Optional[str]:
+    """Per-request 'engine' ("subprocess"|"shared"); None → SIM_ENGINE."""
+    eng = payload.get("engine")
+    if eng is None:
+        return None
+    eng = str(eng).lower()
+    if eng not in ENGINES:
+        raise HTTPException(400, f"engine must be one of {list(ENGINES)}")
+    return eng
+
+
+def max_points_field(payload: Dict[str, Any]) -> Optional[int]:
+    """Optional 'max_points' budget for the returned waveforms (None → all samples)."""
+    mp = payload.get("max_points")
+    if mp is None:
+        return None
+    try:
+        mp = int(mp)
+    except (TypeError, ValueError):
+        raise HTTPException(400, "max_points must be an integer")
+    if mp < MIN_POINTS:
+        raise HTTPException(400, f"max_points must be >= {MIN_POINTS}")
+    return mp
+
+
+def measure_field(payload: Dict[str, Any],
+                  default_pair: Tuple[Optional[str], Optional[str]]) -> Optional[MeasureSpec]:
+    """Optional 'measure' spec (see spice.measure.MeasureSpec); None when absent/false."""
+    spec = payload.get("measure")
+    if spec is None or spec is False:
+        return None
+    try:
+        return MeasureSpec(spec, default_pair)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+def check_pin_drives(pin_drives: Any) -> None:
+    """
+    Compile bits/prbs/pwl drives up front (memoized) so bad stimuli are a 400,
+    not a failed run. Can take seconds for long PRBS/PWL: build requests in the threadpool.
+    """
+    if pin_drives is None:
+        return
+    if not isinstance(pin_drives, dict):
+        raise HTTPException(400, "pin_drives must be an object {pin: drive}")
+    for pin, drv in pin_drives.items():
+        if not isinstance(drv, dict):
+            raise HTTPException(400, f"pin_drives['{pin}'] must be an object")
+        if (drv.get("type") or drv.get("kind") or "").lower() in STIM_TYPES:
+            try:
+                compile_drive(drv)
+            except StimulusError as e:
+                raise HTTPException(400, f"pin_drives['{pin}']: {e}")
+
+
+def admission_field(payload: Dict[str, Any]) -> str:
+    """'admission' policy: "auto" (coarsen TSTEP / slow lane as needed, default) or "strict" (reject instead)."""
+    policy = str(payload.get("admission") or "auto").lower()
+    if policy not in ADMISSION_POLICIES:
+        raise HTTPException(400, f"admission must be one of {list(ADMISSION_POLICIES)}")
+    return policy
+
+
+def truth_table_field(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Optional 'truth_table': true | {"order": "binary"|"gray", "slot": s, "sample_at": 0.9}
+    slot = time each code is held (default: params PER); sample_at = where in
+    the slot the settled output is read (fraction).
+    """
+    spec = payload.get("truth_table")
+    if spec is None or spec is False:
+        return None
+    if spec is True:
+        spec = {}
+    if not isinstance(spec, dict):
+        raise HTTPException(400, "truth_table must be true or an object")
+    order = str(spec.get("order") or "binary").lower()
+    if order not in TRUTH_TABLE_ORDERS:
+        raise HTTPException(400, f"truth_table.order must be one of {list(TRUTH_TABLE_ORDERS)}")
+    try:
+        slot = float(spec["slot"]) if spec.get("slot") is not None else None
+        at = float(spec.get("sample_at", 0.9))
+    except (TypeError, ValueError):
+        raise HTTPException(400, "truth_table.slot / sample_at must be numbers")
+    if slot is not None and slot <= 0:
+        raise HTTPException(400, "truth_table.slot must be > 0")
+    if not 0.0 < at < 1.0:
+        raise HTTPException(400, "truth_table.sample_at must be in (0, 1)")
+    return {"order": order, "slot": slot, "sample_at": at}
+
+
+# metrics function for one run: column arrays → measure dict
+Measure = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+def measure_for(spec: Optional[MeasureSpec], params: Dict[str, float]) -> Optional[Measure]:
+    return partial(measure_arrays, spec=spec, vdd=params["VDD"]) if spec else None
+
+
+def arrays_to_lists(arrays: Dict[str, Any], vec_labels: List[str]) -> Dict[str, Any]:
+    return {
+        "time": arrays["time"].tolist(),
+        "waveforms": {lbl: arrays[lbl].tolist() for lbl in vec_labels if lbl in arrays},
+    }
+
+
+def reduced_lists(arrays: Dict[str, Any], vec_labels: List[str],
+                  max_points: Optional[int]) -> Dict[str, Any]:
+    """
+    arrays_to_lists after min/max decimation to max_points (if given).
+    No labels (measure with waveforms=false) → empty time/waveforms.
+    """
+    if not vec_labels:
+        return {"time": [], "waveforms": {}}
+    if max_points:
+        arrays = decimate_arrays(arrays, vec_labels, max_points)
+    return arrays_to_lists(arrays, vec_labels)
+
+
+def archive_arrays(cache_key: str, arrays: Dict[str, Any], vec_labels: List[str],
+                   warnings: List[str]) -> Optional[str]:
+    """Store a finished result in the run archive (threadpool). Returns its run_id, or None if disabled."""
+    if not run_archive.enabled:
+        return None
+    run_id = archive_id(cache_key)
+    if run_archive.has(run_id):
+        return run_id
+    meta = {"cache_key": cache_key, "warnings": warnings}
+    return run_id if run_archive.put(run_id, arrays, vec_labels, meta) else None
+
+
+def finish_run(run: SimRun, vec_labels: List[str], cache_key: str, warnings: List[str]) -> Dict[str, Any]:
+    """
+    Tail of a cache miss, done once per run even when requests share it
+    (threadpool): result cache + archive, then release the run. Returns
+    {"arrays": in-memory arrays (mmap views are copied out first), "full":
+    cached lists of every vec_label (None with the cache off), "run_id"}.
+    """
+    try:
+        arrays = {k: np.array(v) if isinstance(v, np.memmap) else v for k, v in run.arrays.items()}
+    finally:
+        run.cleanup()
+    full = None
+    if result_cache.enabled:
+        full = arrays_to_lists(arrays, vec_labels)
+        result_cache.put(cache_key, {"time": full["time"], "waveforms": full["waveforms"], "warnings": warnings})
+    return {"arrays": arrays, "full": full, "run_id": archive_arrays(cache_key, arrays, vec_labels, warnings)}
+
+
+def shape_result(done: Dict[str, Any], vec_labels: List[str], wave_labels: List[str],
+                 max_points: Optional[int], measure: Optional[Measure]) -> Dict[str, Any]:
+    """One request's view of a finished run (threadpool): {"data": response lists, "metrics"}."""
+    arrays = done["arrays"]
+    points_raw = len(arrays["time"])
+    if done["full"] is not None and wave_labels == vec_labels and (max_points is None or points_raw <= max_points):
+        data = done["full"]  # same lists as the cache entry, no second tolist()
+    else:
+        data = reduced_lists(arrays, wave_labels, max_points)
+    return {"data": data, "metrics": measure(arrays) if measure else None}
+
+
+def entry_arrays(entry: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    arrays = {"time": np.asarray(entry["time"], dtype=np.float64)}
+    for lbl, v in entry["waveforms"].items():
+        arrays[lbl] = np.asarray(v, dtype=np.float64)
+    return arrays
+
+
+def entry_lists(entry: Dict[str, Any], vec_labels: List[str],
+                max_points: Optional[int]) -> Dict[str, Any]:
+    """Cache entry (full lists) → response lists (vec_labels only) under the max_points budget."""
+    if not vec_labels:
+        return {"time": [], "waveforms": {}}
+    waves = entry["waveforms"]
+    if max_points is None or len(entry["time"]) <= max_points:
+        if all(l in vec_labels for l in waves):
+            return {"time": entry["time"], "waveforms": waves}
+        return {"time": entry["time"], "waveforms": {l: waves[l] for l in vec_labels if l in waves}}
+    labels = [l for l in vec_labels if l in waves] or list(waves)
+    return reduced_lists(entry_arrays(entry), labels, max_points)
+
+
+def _archive_body(run_id: str, win: Optional[Dict[str, Any]], labels: Optional[List[str]],
+                  max_points: Optional[int]) -> Dict[str, Any]:
+    if win is None:
+        raise HTTPException(404, "unknown or expired run_id")
+    index = win["index"]
+    if labels is not None:
+        bad = [l for l in labels if l not in index["columns"]]
+        if bad:
+            raise HTTPException(400, f"unknown vectors {bad} (run has {index['labels']})")
+    wanted = index["labels"] if labels is None else labels
+    data = reduced_lists(win["arrays"], wanted, max_points) if wanted else arrays_to_lists(win["arrays"], [])
+    return {
+        "time": data["time"],
+        "waveforms": data["waveforms"],
+        "meta": {
+            "run_id": run_id,
+            "points": len(data["time"]),
+            "points_window": win["i1"] - win["i0"],
+            "points_raw": index["points"],
+            "index_range": [win["i0"], win["i1"]],
+            "t_range": [index["t_start"], index["t_stop"]],
+            "warnings": index["meta"].get("warnings", []),
+            "cache_key": index["meta"].get("cache_key"),
+        },
+    }
+
+
+def _check_span(t0: Optional[float], t1: Optional[float]) -> None:
+    if t0 is not None and t1 is not None and t1 < t0:
+        raise HTTPException(400, "t1 must be >= t0")
+
+
+def archive_window(run_id: str, t0: Optional[float], t1: Optional[float],
+                   labels: Optional[List[str]], max_points: Optional[int]) -> Dict[str, Any]:
+    """Archived run → usual {time, waveforms, meta} body for the [t0, t1] slice (threadpool)."""
+    _check_span(t0, t1)
+    return _archive_body(run_id, run_archive.window(run_id, t0, t1, labels), labels, max_points)
+
+
+def archive_view(run_id: str, t0: Optional[float], t1: Optional[float],
+                 labels: Optional[List[str]], width: int) -> Dict[str, Any]:
+    """
+    Viewport body for a chart width pixels wide: served from the run's min/max
+    pyramid, so at most ~4 points per pixel whatever the run length (threadpool).
+    """
+    _check_span(t0, t1)
+    win = run_archive.view(run_id, t0, t1, width, labels)
+    res = _archive_body(run_id, win, labels, max(MIN_POINTS, 4 * width))
+    res["meta"]["level"] = win["level"]
+    return res
+
+
+def cached_response(entry: Dict[str, Any], cache_key: str, t0: float,
+                    vec_labels: Optional[List[str]] = None,
+                    max_points: Optional[int] = None,
+                    measure: Optional[Measure] = None) -> Dict[str, Any]:
+    """Build the usual /simulate* response from a result-cache entry (vec_labels = plotted vectors)."""
+    data = entry_lists(entry, vec_labels if vec_labels is not None else list(entry["waveforms"]), max_points)
+    run_id = None
+    if run_archive.enabled:  # e.g. cached before the archive was on, or evicted from it
+        run_id = archive_id(cache_key)
+        if not run_archive.has(run_id):
+            run_id = archive_arrays(cache_key, entry_arrays(entry), list(entry["waveforms"]),
+                                    entry.get("warnings", []))
+    res = {
+        "time": data["time"],
+        "waveforms": data["waveforms"],
+        "meta": {
+            "points": len(data["time"]),
+            "points_raw": len(entry["time"]),
+            "elapsed_ms": int((time.time() - t0) * 1000),
+            "warnings": entry.get("warnings", []),
+            "run_dir": None,
+            "cache": "hit",
+            "cache_key": cache_key,
+            "run_id": run_id,
+        },
+    }
+    if measure is not None:
+        res["measure"] = measure(entry_arrays(entry))
+    return res
+
+
+async def simulate_cached(tb_text: str, vec_labels: List[str], t0: float, output: str,
+                          engine: Optional[str], prefix: str, check_rc: bool = True,
+                          max_points: Optional[int] = None,
+                          timeout_s: float = SIM_TIMEOUT_S,
+                          wave_labels: Optional[List[str]] = None,
+                          measure: Optional[Measure] = None,
+                          admission: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Rendered testbench (OUT_PLACEHOLDER path) → response body, via the result
+    cache and run_tb. The cache always holds every sample of every vec_label;
+    max_points / wave_labels (default: vec_labels) only shape the response.
+    measure → "measure": metrics computed on the full-resolution arrays.
+    Concurrent calls for the same testbench and run settings (lane, timeout_s,
+    check_rc) share one run (core.inflight); meta.shared = {"role": "leader"|"follower", "requests": n}.
+    admission: core.admission decision → its lane is used, meta.admission.
+    Raises SimError on failed runs.
+    """
+    lane = admission["lane"] if admission else "fast"
+    if lane == "slow":
+        timeout_s = max(timeout_s, SLOW_TIMEOUT_S)
+    wave_labels = vec_labels if wave_labels is None else wave_labels
+    cache_key = tb_cache_key(tb_text, vec_labels)
+    cached = await run_in_threadpool(result_cache.get, cache_key)
+    if cached is not None:
+        res = await run_in_threadpool(cached_response, cached, cache_key, t0, wave_labels, max_points, measure)
+        if admission:
+            res["meta"]["admission"] = admission
+        return res
+
+    async def execute() -> Dict[str, Any]:
+        run = await run_tb(tb_text, vec_labels, output=output, timeout_s=timeout_s, prefix=prefix,
+                           engine=engine, check_rc=check_rc, lane=lane)
+        warns = tail_warnings(run.log)
+        done = await run_in_threadpool(finish_run, run, vec_labels, cache_key, warns)
+        return {**done, "warnings": warns, "run_dir": run.run_dir, "engine": run.engine}
+
+    # identical testbenches already running → wait for that run instead of starting another;
+    # only runs with the same lane / timeout / rc check are shared, so nobody inherits
+    # a shorter (or longer) timeout than it asked for
+    flight_key = f"{cache_key}|{lane}|{timeout_s:g}|{int(check_rc)}"
+    done, shared = await inflight.run(flight_key, execute)
+    res = await run_in_threadpool(shape_result, done, vec_labels, wave_labels, max_points, measure)
+    data = res["data"]
+    out = {
+        "time": data["time"],
+        "waveforms": data["waveforms"],
+        "meta": {
+            "points": len(data["time"]),
+            "points_raw": len(done["arrays"]["time"]),
+            "elapsed_ms": int((time.time() - t0) * 1000),
+            "warnings": done["warnings"],
+            "run_dir": str(done["run_dir"]) if done["run_dir"] else None,
+            "output": output,
+            "engine": done["engine"],
+            "cache": "miss",
+            "cache_key": cache_key,
+            "run_id": done["run_id"],
+            "shared": shared,
+        },
+    }
+    if admission:
+        out["meta"]["admission"] = admission
+    if res["metrics"] is not None:
+        out["measure"] = res["metrics"]
+    return out
+
+
+T = TypeVar("T")
+
+
+async def _disconnected(request: Request) -> None:
+    """Returns once the client has gone away (body already read → next message is http.disconnect)."""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def until_disconnect(request: Request, coro: Awaitable[T]) -> Optional[T]:
+    """
+    Await coro, cancelling it the moment the client disconnects: the engine
+    then kills the ngspice process group and releases the run dir, instead of
+    finishing and parsing a result nobody reads. Returns None when aborted.
+    """
+    task = asyncio.ensure_future(coro)
+    watch = asyncio.ensure_future(_disconnected(request))
+    try:
+        await asyncio.wait({task, watch}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        watch.cancel()
+    if task.done():
+        return task.result()
+    task.cancel()
+    try:
+        await task  # wait for the kill + run dir release
+    except (asyncio.CancelledError, SimError):
+        pass
+    metrics.inc("aborted_runs")
+    return None
+
+
+def registered_netlist(netlist_id: Any) -> Dict[str, Any]:
+    """netlist_store entry for a payload 'netlist_id'; 404 if unknown/evicted."""
+    entry = netlist_store.get(str(netlist_id))
+    if entry is None:
+        raise HTTPException(404, "unknown netlist_id (expired or never registered); POST /netlists again")
+    return entry
+
+
+class UploadedSim:
+    """
+    Validated /simulate_uploaded payload. Everything except 'params' is fixed,
+    so one instance can be rendered for many parameter points (sweeps).
+    The netlist comes either as 'netlist' text or as a registered 'netlist_id'
+    (already normalized; hints default to the ones it was registered with).
+    Raises HTTPException(400/404) on bad input.
+    """
+
+    def __init__(self, payload: Dict[str, Any]):
+        sub = payload.get("subckt") or {}
+        self.sub_name: Optional[str] = sub.get("name")
+        self.pin_order: List[str] = sub.get("pins") or []
+        self.plot_nodes: List[str] = payload.get("plot_nodes") or []
+        self.hints: Dict[str, Any] = payload.get("hints") or {}
+        self.roles: Optional[Dict[str, Any]] = payload.get("roles")
+        self.pin_drives: Optional[Dict[str, Dict[str, Any]]] = payload.get("pin_drives")
+        check_pin_drives(self.pin_drives)
+
+        self.normalized = False
+        if payload.get("netlist_id"):
+            entry = registered_netlist(payload["netlist_id"])
+            self.netlist: str = entry["normalized"]
+            self.normalized = True
+            self.hints = self.hints or entry.get("hints") or {}
+        else:
+            self.netlist = payload.get("netlist", "")
+
+        if not self.netlist.strip():
+            raise HTTPException(400, "empty netlist")
+        if not self.sub_name or not self.pin_order:
+            raise HTTPException(400, "subckt name/pins required")
+        if not self.plot_nodes:
+            self.plot_nodes = self.pin_order[:2]
+
+        self.raw_params: Dict[str, Any] = payload.get("params") or {}
+        self.output = output_mode(payload)
+        self.engine = engine_choice(payload)
+        self.max_points = max_points_field(payload)
+        self.admission = admission_field(payload)
+        self.io = io_roles(self.pin_order, self.roles, self.hints)
+        self.measure = measure_field(payload, self._default_pair())
+        self.truth_table = truth_table_field(payload)
+
+        # saved vectors = plotted nodes + whatever the measurements need
+        self.save_nodes = list(self.plot_nodes)
+        self.extra_vectors: List[str] = []
+        if self.measure is not None:
+            self.save_nodes += [n for n in self.measure.node_names() if n not in self.save_nodes]
+            if self.measure.supply:
+                self.extra_vectors.append(SUPPLY_VEC)
+        self.tt_codes: List[int] = []
+        if self.truth_table is not None:
+            n = len(self.io["inputs"])
+            if not 1 <= n <= TRUTH_TABLE_MAX_INPUTS:
+                raise HTTPException(400, f"truth_table needs 1..{TRUTH_TABLE_MAX_INPUTS} inputs (got {n})")
+            if not self.io["outputs"]:
+                raise HTTPException(400, "truth_table needs at least one output (roles.outputs)")
+            self.tt_codes = truth_table_codes(n, self.truth_table["order"])
+            tt_nodes = self.io["inputs"] + self.io["outputs"]
+            self.save_nodes += [p for p in tt_nodes if p not in self.save_nodes]
+            try:
+                self.params_for()
+            except SimError as e:
+                raise HTTPException(e.status_code, e.error)
+        self.vec_labels = [f"v({n})" for n in self.save_nodes] + self.extra_vectors
+        self.wave_labels = [f"v({n})" for n in self.plot_nodes]
+        if self.measure is not None and not self.measure.waveforms:
+            self.wave_labels = []
+
+        # admission device count: element lines depend on the netlist and the DUT wiring, not on params
+        h = hashlib.sha256(self.netlist.encode("utf-8", errors="surrogatepass"))
+        h.update(json.dumps([self.sub_name, self.pin_order, self.roles, self.hints,
+                             self.truth_table is not None], sort_keys=True, default=str).encode())
+        self.device_key = h.hexdigest()
+
+    def _default_pair(self) -> Tuple[Optional[str], Optional[str]]:
+        """Default measure.delays pair: first input → first output (roles, else guessed)."""
+        ins, outs = self.io["inputs"], self.io["outputs"]
+        return (ins[0] if ins else None), (outs[0] if outs else None)
+
+    def params_for(self, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+        """
+        norm_params(params + overrides). Truth-table mode: TSTOP = slot * 2^N
+        (slot defaults to PER); SimError(400) if that exceeds the TSTOP limit,
+        or if an input edge (TR/TF) isn't settled by the sample point.
+        """
+        params = norm_params({**self.raw_params, **(overrides or {})})
+        if self.truth_table is not None:
+            slot = self.truth_table["slot"] or params["PER"]
+            edge, at = max(params["TR"], params["TF"]), self.truth_table["sample_at"]
+            if slot * (1.0 - at) <= edge:
+                raise SimError(f"truth table slot {slot:g}s too short for TR/TF={edge:g}s: edges must finish "
+                               f"before the sample at {at:g} x slot (slot > {edge / (1.0 - at):g}s)", 400)
+            tstop = slot * len(self.tt_codes)
+            if tstop > LIMITS["TSTOP"][1]:
+                raise SimError(f"truth table needs TSTOP={tstop:g}s ({len(self.tt_codes)} codes x {slot:g}s), "
+                               f"max {LIMITS['TSTOP'][1]:g}s; use a shorter slot", 400)
+            params["TSTOP"] = tstop
+        return params
+
+    def measure_fn(self, params: Dict[str, float]) -> Optional[Measure]:
+        """measure spec and/or truth-table analysis for one normalized param set."""
+        metrics = measure_for(self.measure, params)
+        if self.truth_table is None:
+            return metrics
+        tt = dict(self.truth_table)
+        slot = params["TSTOP"] / len(self.tt_codes)
+
+        def _fn(arrays: Dict[str, Any]) -> Dict[str, Any]:
+            out = metrics(arrays) if metrics else {}
+            out["truth_table"] = {
+                "order": tt["order"],
+                **truth_table(arrays, self.io["inputs"], self.io["outputs"], self.tt_codes, slot,
+                              params["VDD"], at=tt["sample_at"]),
+            }
+            return out
+        return _fn
+
+    def render(self, params: Dict[str, float]) -> str:
+        """Testbench text with OUT_PLACEHOLDER as output path (sync; use the threadpool)."""
+        return render_uploaded_tb(
+            netlist_text=self.netlist,
+            subckt_name=self.sub_name,
+            pin_order=self.pin_order,
+            params=params,
+            plot_nodes=self.save_nodes,
+            out_csv=Path(OUT_PLACEHOLDER),
+            roles=dict(self.roles) if self.roles is not None else None,
+            pin_drives=self.pin_drives,
+            hints=self.hints,
+            output=self.output,
+            normalized=self.normalized,
+            extra_vectors=self.extra_vectors,
+            truth_table=self._tt_render(params),
+        )
+
+    def admit(self, params: Dict[str, float], tb_text: str) -> Tuple[Dict[str, float], Dict[str, Any]]:
+        """
+        Admission control for one rendered testbench (core.admission; SimError 422
+        if refused). Threadpool: the first call for a netlist scans tb_text.
+        """
+        return admit(params, len(self.vec_labels), devices_for(self.device_key, tb_text), self.output,
+                     self.admission)
+
+    def _tt_render(self, params: Dict[str, float]) -> Optional[Dict[str, Any]]:
+        if self.truth_table is None:
+            return None
+        return {"codes": self.tt_codes, "slot": params["TSTOP"] / len(self.tt_codes)}
+
+    def render_batch(self, points: List[Dict[str, float]]) -> str:
+        """One batched testbench for many normalized param dicts (ascii only; no truth-table mode)."""
+        return render_uploaded_tb_batch(
+            netlist_text=self.netlist,
+            subckt_name=self.sub_name,
+            pin_order=self.pin_order,
+            points=points,
+            plot_nodes=self.save_nodes,
+            out_csv=Path(OUT_PLACEHOLDER),
+            roles=dict(self.roles) if self.roles is not None else None,
+            pin_drives=self.pin_drives,
+            hints=self.hints,
+            normalized=self.normalized,
+            extra_vectors=self.extra_vectors,
+        )
+
+    async def simulate(self, overrides: Optional[Dict[str, Any]] = None,
+                       t0: Optional[float] = None,
+                       timeout_s: float = SIM_TIMEOUT_S) -> Dict[str, Any]:
+        """Full simulate_uploaded response for params (+ overrides). Raises SimError."""
+        t0 = time.time() if t0 is None else t0
+        params = self.params_for(overrides)
+        tb_text = await run_in_threadpool(self.render, params)
+        params, adm = await run_in_threadpool(self.admit, params, tb_text)
+        if "coarsened" in adm:
+            tb_text = await run_in_threadpool(self.render, params)
+        return await simulate_cached(tb_text, self.vec_labels, t0, self.output,
+                                     self.engine, prefix="u_", max_points=self.max_points,
+                                     timeout_s=timeout_s, wave_labels=self.wave_labels,
+                                     measure=self.measure_fn(params), admission=adm)
+
+
+class TemplateSim:
+    """
+    Validated /simulate payload (tb.tpl.cir template path); like UploadedSim,
+    one instance serves many parameter sets (interactive sessions).
+    measure: nodes are "a" (input) and "y" (output).
+    """
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.raw_params = payload.get("params", {}) or {}
+        self.nodes = payload.get("nodes", ["a", "y"])
+        self.tpl_vars = payload.get("tpl_vars") or {}
+        self.output = output_mode(payload)
+        self.engine = engine_choice(payload)
+        self.max_points = max_points_field(payload)
+        self.admission = admission_field(payload)
+        self.measure = measure_field(payload, ("a", "y"))
+        # i(VDD_SRC) only exists if the template has that source (the shipped one names it VDD);
+        # without it the supply metric reports a per-metric error instead of failing the run
+        wants_supply = self.measure is not None and self.measure.supply
+        self.extra_vectors = [SUPPLY_VEC] if wants_supply and template_defines(SUPPLY_SRC) else []
+        plotted = ["v(a)", "v(y)"]
+        self.vec_labels = plotted + self.extra_vectors
+        self.wave_labels = plotted if self.measure is None or self.measure.waveforms else []
+        self.devices: Optional[int] = None  # counted on the first admit (template + params → same elements)
+
+    async def simulate(self, overrides: Optional[Dict[str, Any]] = None,
+                       t0: Optional[float] = None,
+                       timeout_s: float = SIM_TIMEOUT_S) -> Dict[str, Any]:
+        """Full /simulate response for params (+ overrides). Raises SimError."""
+        t0 = time.time() if t0 is None else t0
+        params = norm_params({**self.raw_params, **(overrides or {})})
+        cir_text = await run_in_threadpool(self.render, params)
+        params, adm = await run_in_threadpool(self.admit, params, cir_text)
+        if "coarsened" in adm:
+            cir_text = await run_in_threadpool(self.render, params)
+        # legacy route: ngspice exit code is not checked, only the output file
+        return await simulate_cached(cir_text, self.vec_labels, t0, self.output, self.engine,
+                                     prefix="", check_rc=False, max_points=self.max_points,
+                                     timeout_s=timeout_s, wave_labels=self.wave_labels,
+                                     measure=measure_for(self.measure, params), admission=adm)
+
+    def admit(self, params: Dict[str, float], cir_text: str) -> Tuple[Dict[str, float], Dict[str, Any]]:
+        """Admission control for one rendered testbench (threadpool, like UploadedSim.admit)."""
+        if self.devices is None:
+            self.devices = count_devices(cir_text)
+        return admit(params, len(self.vec_labels), self.devices, self.output, self.admission)
+
+    def render(self, params: Dict[str, float]) -> str:
+        return render_tb(params, self.nodes, Path(OUT_PLACEHOLDER), tpl_vars=self.tpl_vars,
+                         output=self.output, extra_vectors=self.extra_vectors)
@@ -0,0 +1,271 @@
+# api/sweep.py
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List
+from uuid import uuid4
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from api.sim import UploadedSim, archive_arrays, arrays_to_lists, cached_response, reduced_lists
+from core.cache import result_cache, tb_cache_key
+from core.config import (ADMIT_SLOW_S, LIMITS, SIM_CONCURRENCY, SIM_TIMEOUT_S, SLOW_TIMEOUT_S, SWEEP_BATCH_MAX,
+                         SWEEP_MAX_POINTS)
+from core.scheduler import scheduler
+from core.utils import norm_params, tail_warnings
+from spice.engine import SimError, run_tb
+from spice.parse import split_batch_arrays
+
+# cache-key variant of batched results: another testbench, always ascii output
+BATCH_VARIANT = "batch-ascii"
+
+# sweep_id -> cancel event (DELETE /sweep/{id})
+ACTIVE_SWEEPS: Dict[str, asyncio.Event] = {}
+
+
+def _axis_values(name: str, spec: Any) -> List[float]:
+    """Grid axis: [v1, v2, ...] or {"start", "stop", "num"} (linear, inclusive)."""
+    if isinstance(spec, dict):
+        try:
+            start, stop, num = float(spec["start"]), float(spec["stop"]), int(spec["num"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(400, f"grid['{name}'] needs numeric start/stop/num")
+        if num < 1:
+            raise HTTPException(400, f"grid['{name}'].num must be >= 1")
+        if num == 1:
+            return [start]
+        step = (stop - start) / (num - 1)
+        return [start + i * step for i in range(num)]
+    if isinstance(spec, (list, tuple)) and spec:
+        try:
+            return [float(v) for v in spec]
+        except (TypeError, ValueError):
+            raise HTTPException(400, f"grid['{name}'] must contain numbers")
+    raise HTTPException(400, f"grid['{name}'] must be a non-empty list or {{start,stop,num}}")
+
+
+def expand_grid(grid: Dict[str, Any]) -> List[Dict[str, float]]:
+    """
+    {"CLOAD": [...], "VDD": {...}} → cartesian product as a list of override
+    dicts. Only LIMITS keys can be swept; size capped by SWEEP_MAX_POINTS.
+    """
+    if not isinstance(grid, dict) or not grid:
+        raise HTTPException(400, "grid must be a non-empty object")
+    unknown = [k for k in grid if k not in LIMITS]
+    if unknown:
+        raise HTTPException(400, f"cannot sweep {unknown}; allowed: {list(LIMITS)}")
+
+    names = list(grid)
+    axes = [_axis_values(n, grid[n]) for n in names]
+    total = 1
+    for a in axes:
+        total *= len(a)
+    if total > SWEEP_MAX_POINTS:
+        raise HTTPException(400, f"grid has {total} points (max {SWEEP_MAX_POINTS})")
+    return [dict(zip(names, combo)) for combo in itertools.product(*axes)]
+
+
+def batch_size_for(spec: Any, n_points: int) -> int:
+    """payload 'batch': false/absent → 1, true → scheduler's choice, int → that (capped)."""
+    if spec is None or spec is False:
+        return 1
+    if spec is True:
+        return scheduler.batch_size(n_points, SWEEP_BATCH_MAX)
+    try:
+        n = int(spec)
+    except (TypeError, ValueError):
+        raise HTTPException(400, "batch must be true/false or a positive integer")
+    return max(1, min(n, SWEEP_BATCH_MAX))
+
+
+def _line(obj: Dict[str, Any]) -> bytes:
+    return (json.dumps(obj, separators=(",", ":")) + "\n").encode()
+
+
+def _failed_point(index: int, swept: Dict[str, float], status: int, error: str) -> Dict[str, Any]:
+    return {"type": "point", "index": index, "params": swept, "status": status, "error": error}
+
+
+async def _run_point(req: UploadedSim, index: int, point: Dict[str, float]) -> Dict[str, Any]:
+    """Always returns a 'point' line: failures of any kind become status != 200."""
+    swept = dict(point)
+    try:
+        # report the values actually simulated (norm_params may clamp/couple them)
+        applied = norm_params({**req.raw_params, **point})
+        swept = {k: applied[k] for k in point}
+        res = await req.simulate(point)
+    except SimError as e:
+        return _failed_point(index, swept, e.status_code, e.error)
+    except HTTPException as e:
+        return _failed_point(index, swept, e.status_code, str(e.detail))
+    except Exception as e:  # bad drive values in render, measure errors, ...
+        return _failed_point(index, swept, 500, f"{type(e).__name__}: {e}")
+    return {"type": "point", "index": index, "params": swept, "status": 200, **res}
+
+
+async def _run_batch(req: UploadedSim, chunk: List[tuple]) -> List[Dict[str, Any]]:
+    """One 'point' line per chunk index, whatever fails (unreported points get status 500)."""
+    out: List[Dict[str, Any]] = []
+    try:
+        await _batch_into(req, chunk, out)
+    except Exception as e:
+        reported = {r["index"] for r in out}
+        out += [_failed_point(index, point, 500, f"{type(e).__name__}: {e}")
+                for index, point in chunk if index not in reported]
+    return out
+
+
+async def _batch_into(req: UploadedSim, chunk: List[tuple], out: List[Dict[str, Any]]) -> None:
+    """
+    Several points in ONE ngspice invocation (render_uploaded_tb_batch).
+    Cached points are answered first; misses are batched and their results are
+    cached under a batch-tagged key (the batch testbench is not the single-run
+    one, so its results never answer /simulate_uploaded). Batches always write
+    ascii (wrdata appendwrite), whatever req.output is; the tag says so.
+    The whole batch gets one lane timeout: SIM_TIMEOUT_S, or the slow lane
+    (SLOW_TIMEOUT_S) when the summed runtime estimates exceed ADMIT_SLOW_S.
+    If the batch fails or its output can't be split, the points are retried
+    one by one.
+    """
+    t0 = time.time()
+    todo: List[tuple] = []
+    single: List[tuple] = []
+    for index, point in chunk:
+        try:
+            params = norm_params({**req.raw_params, **point})
+            swept = {k: params[k] for k in point}
+            tb_text = await run_in_threadpool(req.render, params)
+            _params, adm = await run_in_threadpool(req.admit, params, tb_text)
+        except Exception:
+            adm = None
+        if adm is None or adm["lane"] != "fast" or "coarsened" in adm:
+            single.append((index, point))  # bad/refused / coarsened / slow lane → handled (and reported) point by point
+            continue
+        # a plain single-run result is as good as any; batch results only answer batches
+        key = tb_cache_key(tb_text, req.vec_labels)
+        cached = await run_in_threadpool(result_cache.get, key)
+        if cached is None:
+            key = tb_cache_key(tb_text, req.vec_labels, variant=BATCH_VARIANT)
+            cached = await run_in_threadpool(result_cache.get, key)
+        if cached is not None:
+            res = await run_in_threadpool(cached_response, cached, key, t0, req.wave_labels, req.max_points,
+                                          req.measure_fn(params))
+            out.append({"type": "point", "index": index, "params": swept, "status": 200, **res})
+        else:
+            todo.append((index, point, params, swept, key, adm["estimate"]["runtime_s"]))
+
+    for index, point in single:
+        out.append(await _run_point(req, index, point))
+    if len(todo) == 1:
+        out.append(await _run_point(req, todo[0][0], todo[0][1]))
+    elif todo:
+        tb_text = await run_in_threadpool(req.render_batch, [t[2] for t in todo])
+        lane = "slow" if sum(t[5] for t in todo) > ADMIT_SLOW_S else "fast"
+        timeout = SLOW_TIMEOUT_S if lane == "slow" else SIM_TIMEOUT_S
+        try:
+            run = await run_tb(tb_text, req.vec_labels, output="ascii", timeout_s=timeout,
+                               prefix="b_", engine="subprocess", lane=lane)
+        except SimError:
+            run = None
+        parts = None
+        if run is not None:
+            try:
+                parts = split_batch_arrays(run.arrays, len(todo))
+            except ValueError:
+                run.cleanup()
+        if parts is None:  # fall back to independent runs
+            for index, point, *_ in todo:
+                out.append(await _run_point(req, index, point))
+            return
+
+        warns = tail_warnings(run.log)
+        elapsed = int((time.time() - t0) * 1000)
+        try:
+            for k, ((index, _pt, params, swept, key, _est), arrays) in enumerate(zip(todo, parts)):
+                if result_cache.enabled:
+                    full = await run_in_threadpool(arrays_to_lists, arrays, req.vec_labels)
+                    await run_in_threadpool(result_cache.put, key, {**full, "warnings": warns})
+                run_id = await run_in_threadpool(archive_arrays, key, arrays, req.vec_labels, warns)
+                data = await run_in_threadpool(reduced_lists, arrays, req.wave_labels, req.max_points)
+                measure = req.measure_fn(params)
+                if measure is not None:
+                    data["measure"] = await run_in_threadpool(measure, arrays)
+                out.append({
+                    "type": "point", "index": index, "params": swept, "status": 200, **data,
+                    "meta": {
+                        "points": len(data["time"]),
+                        "points_raw": len(arrays["time"]),
+                        "elapsed_ms": elapsed,
+                        "warnings": warns,
+                        "run_dir": str(run.run_dir) if run.run_dir else None,
+                        "output": "ascii",
+                        "engine": run.engine,
+                        "cache": "miss",
+                        "cache_key": key,
+                        "run_id": run_id,
+                        "batch": {"size": len(todo), "position": k, "lane": lane},
+                    },
+                })
+        finally:
+            run.cleanup()
+
+
+async def sweep_stream(req: UploadedSim, points: List[Dict[str, float]],
+                       batch_size: int = 1) -> AsyncIterator[bytes]:
+    """
+    NDJSON stream: one 'start' line, one 'point' line per grid point in
+    completion order (with done/total), then 'end'. Points run on
+    SIM_CONCURRENCY workers through the normal scheduler/cache path; with
+    batch_size > 1 each queue item is a slice simulated in one ngspice run.
+    Closing the stream (client gone) or DELETE /sweep/{id} cancels the
+    remaining points and kills running ngspice children.
+    """
+    sweep_id = uuid4().hex[:12]
+    cancel = asyncio.Event()
+    ACTIVE_SWEEPS[sweep_id] = cancel
+    t0 = time.time()
+    total = len(points)
+
+    todo: "asyncio.Queue[List[tuple]]" = asyncio.Queue()
+    indexed = list(enumerate(points))
+    for a in range(0, total, batch_size):
+        todo.put_nowait(indexed[a:a + batch_size])
+    results: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+    async def worker() -> None:
+        while True:
+            try:
+                chunk = todo.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if len(chunk) == 1:
+                await results.put(await _run_point(req, *chunk[0]))
+            else:
+                for r in await _run_batch(req, chunk):
+                    await results.put(r)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(SIM_CONCURRENCY, todo.qsize()))]
+    done = 0
+    try:
+        yield _line({"type": "start", "sweep_id": sweep_id, "total": total, "batch_size": batch_size})
+        while done < total:
+            get = asyncio.create_task(results.get())
+            stop = asyncio.create_task(cancel.wait())
+            await asyncio.wait({get, stop}, return_when=asyncio.FIRST_COMPLETED)
+            stop.cancel()
+            if not get.done():
+                get.cancel()
+                break
+            done += 1
+            yield _line({**get.result(), "done": done, "total": total})
+        yield _line({"type": "end", "sweep_id": sweep_id, "done": done, "total": total,
+                     "cancelled": done < total, "elapsed_ms": int((time.time() - t0) * 1000)})
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        ACTIVE_SWEEPS.pop(sweep_id, None)
@@ -0,0 +1,74 @@
+# api/transport.py
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, Dict, List
+
+import numpy as np
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+# Binary waveform transport (content negotiation on /simulate*):
+#   Accept: application/x-logicsim-wave   (or body "format": "binary")
+#
+# Layout (little-endian):
+#   b"LSW1" | u32 header_len | header JSON (space padded, 8-byte aligned) | columns
+# header = {"version": 1, "meta": {...},
+#           "columns": [{"name", "dtype", "length", "offset"}, ...],
+#           "measure"?: {...}}            (only when the request asked for measurements)
+# offsets are relative to the first column byte and 8-byte aligned, so the
+# browser can wrap each column as a Float32Array/Float64Array without copying.
+# 'time' is always float64 (ps steps over long TSTOP need the mantissa).
+
+WAVE_MEDIA_TYPE = "application/x-logicsim-wave"
+WAVE_MAGIC = b"LSW1"
+WAVE_DTYPES = {"float32": "<f4", "float64": "<f8"}
+
+
+def wants_binary(request: Request, payload: Dict[str, Any]) -> bool:
+    fmt = str(payload.get("format") or "").lower()
+    if fmt:
+        if fmt not in ("json", "binary"):
+            raise HTTPException(400, "format must be 'json' or 'binary'")
+        return fmt == "binary"
+    return WAVE_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def wave_dtype(payload: Dict[str, Any]) -> str:
+    dt = str(payload.get("dtype") or "float32").lower()
+    if dt not in WAVE_DTYPES:
+        raise HTTPException(400, f"dtype must be one of {list(WAVE_DTYPES)}")
+    return dt
+
+
+def _pad8(n: int) -> int:
+    return (-n) % 8
+
+
+def encode_wave(res: Dict[str, Any], dtype: str = "float32") -> bytes:
+    """{"time", "waveforms", "meta"} (lists or ndarrays) → binary body."""
+    cols = [("time", np.asarray(res["time"], dtype=WAVE_DTYPES["float64"]))]
+    for name, vals in (res.get("waveforms") or {}).items():
+        cols.append((name, np.asarray(vals, dtype=WAVE_DTYPES[dtype])))
+
+    entries: List[Dict[str, Any]] = []
+    blobs: List[bytes] = []
+    offset = 0
+    for name, arr in cols:
+        entries.append({"name": name, "dtype": "float64" if arr.itemsize == 8 else "float32",
+                        "length": int(arr.size), "offset": offset})
+        blob = arr.tobytes()
+        blobs.append(blob + b"\0" * _pad8(len(blob)))
+        offset += len(blobs[-1])
+
+    head: Dict[str, Any] = {"version": 1, "meta": res.get("meta", {}), "columns": entries}
+    if "measure" in res:
+        head["measure"] = res["measure"]
+    header = json.dumps(head, separators=(",", ":")).encode()
+    header += b" " * _pad8(len(WAVE_MAGIC) + 4 + len(header))
+    return b"".join([WAVE_MAGIC, struct.pack("<I", len(header)), header, *blobs])
+
+
+def wave_response(res: Dict[str, Any], dtype: str) -> Response:
+    return Response(encode_wave(res, dtype), media_type=WAVE_MEDIA_TYPE)
@@ -0,0 +1,136 @@
+# api/upload.py
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from core.netlists import NetlistUpload, UploadTooLarge, netlist_store
+
+# Streaming netlist upload (POST /netlists/upload). The body is never held in
+# memory: chunks go to NetlistUpload (disk + sha256 + .subckt scan) as they
+# arrive from the socket.
+
+
+def _hints_json(txt: Optional[str]) -> Optional[dict]:
+    if not txt:
+        return None
+    try:
+        obj = json.loads(txt)
+    except ValueError:
+        raise HTTPException(400, "hints must be JSON")
+    if not isinstance(obj, dict):
+        raise HTTPException(400, "hints must be a JSON object")
+    return obj
+
+
+class _MultipartNetlist:
+    """
+    multipart/form-data → NetlistUpload. Parts:
+      hints  (optional, small JSON field; must come BEFORE the file part)
+      file | netlist  (the netlist; any part with a filename also counts)
+    """
+
+    def __init__(self, boundary: bytes, hints: Optional[dict]):
+        self.hints = hints
+        self.upload: Optional[NetlistUpload] = None
+        self.done = False
+        self._hdr_field = b""
+        self._hdr_value = b""
+        self._disp: Dict[bytes, bytes] = {}
+        self._is_file = False
+        self._field: List[bytes] = []
+        self._field_name = b""
+        self._error: Optional[str] = None
+        self.parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._part_begin,
+            "on_header_field": lambda d, s, e: self._acc("_hdr_field", d[s:e]),
+            "on_header_value": lambda d, s, e: self._acc("_hdr_value", d[s:e]),
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_done,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        })
+
+    def _acc(self, attr: str, data: bytes) -> None:
+        setattr(self, attr, getattr(self, attr) + data)
+
+    def _part_begin(self) -> None:
+        self._disp, self._is_file, self._field = {}, False, []
+
+    def _header_end(self) -> None:
+        if self._hdr_field.strip().lower() == b"content-disposition":
+            _kind, self._disp = parse_options_header(self._hdr_value)
+        self._hdr_field = self._hdr_value = b""
+
+    def _headers_done(self) -> None:
+        name = self._disp.get(b"name", b"")
+        self._is_file = b"filename" in self._disp or name in (b"file", b"netlist")
+        self._field_name = name
+        if self._is_file:
+            if self.upload is not None:
+                self._error = "only one netlist part allowed"
+                return
+            self.upload = netlist_store.upload(self.hints)
+
+    def _part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._error:
+            return
+        if self._is_file:
+            self.upload.feed(data[start:end])
+        else:
+            self._field.append(data[start:end])
+            if sum(map(len, self._field)) > 1 << 20:
+                self._error = "form field too large"
+
+    def _part_end(self) -> None:
+        if self._is_file or self._error:
+            return
+        if self._field_name == b"hints":
+            if self.upload is not None:
+                self._error = "hints must be sent before the netlist part"
+            else:
+                self.hints = _hints_json(b"".join(self._field).decode("utf-8", "replace"))
+
+    def write(self, chunk: bytes) -> None:
+        self.parser.write(chunk)
+        if self._error:
+            raise ValueError(self._error)
+
+
+async def receive_netlist(request: Request) -> Dict[str, Any]:
+    """
+    Raw body (any non-multipart content type; ?hints=<json>) or
+    multipart/form-data → registered netlist index (see NetlistStore).
+    """
+    ctype, opts = parse_options_header(request.headers.get("content-type", ""))
+    hints = _hints_json(request.query_params.get("hints"))
+
+    if ctype == b"multipart/form-data":
+        boundary = opts.get(b"boundary")
+        if not boundary:
+            raise HTTPException(400, "multipart body without boundary")
+        mp = _MultipartNetlist(boundary, hints)
+        sink, get_upload = mp.write, (lambda: mp.upload)
+    else:
+        up = await run_in_threadpool(netlist_store.upload, hints)
+        sink, get_upload = up.feed, (lambda: up)
+
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(sink, chunk)
+        upload = get_upload()
+        if upload is None:
+            raise ValueError("no netlist part (field 'file' or 'netlist')")
+        return await run_in_threadpool(upload.finish)
+    except ValueError as e:
+        if get_upload() is not None:
+            get_upload().abort()
+        raise HTTPException(413 if isinstance(e, UploadTooLarge) else 400, str(e))
+    except BaseException:  # client went away / server error → no half-written dirs
+        if get_upload() is not None:
+            get_upload().abort()
+        raise
@@ -0,0 +1,83 @@
+# bench/bench_engines.py
+"""
+Per-run latency: subprocess engine (ngspice -b per run) vs shared engine
+(libngspice sessions in long-lived workers).
+
+    cd wave-backend
+    python -m bench.bench_engines --runs 30 [--tstop 3e-9] [--tstep 1e-12]
+
+Needs ngspice on PATH and libngspice (or NGSPICE_LIB) for the shared engine.
+Result cache is not involved: run_tb is called directly.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from pathlib import Path
+
+from core.cache import OUT_PLACEHOLDER
+from core.utils import norm_params
+from spice.engine import SimError, engine_stats, run_tb
+from spice.tb import render_uploaded_tb
+
+NETLIST = """
+.MODEL NMOS_GLOBEL NMOS LEVEL=1
+.MODEL PMOS_GLOBEL PMOS LEVEL=1
+.SUBCKT NOT1 OUTPUT INPUT VDD VSS WP WN L M
+MP0 OUTPUT INPUT VDD VDD PMOS_GLOBEL W=WP L=L M=M
+MN0 OUTPUT INPUT VSS VSS NMOS_GLOBEL W=WN L=L M=M
+.ENDS
+"""
+
+
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))]
+
+
+async def _bench(engine: str, tb_text: str, labels, runs: int):
+    lat = []
+    for i in range(runs + 1):
+        t = time.perf_counter()
+        try:
+            run = await run_tb(tb_text, labels, engine=engine)
+        except SimError as e:
+            print(f"  {engine}: run failed: {e.error}")
+            return None, None
+        dt = (time.perf_counter() - t) * 1000
+        used = run.engine
+        run.cleanup()
+        if i > 0:  # first run warms up (process spawn / library load)
+            lat.append(dt)
+    return used, lat
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=30)
+    ap.add_argument("--tstop", type=float, default=3e-9)
+    ap.add_argument("--tstep", type=float, default=1e-12)
+    args = ap.parse_args()
+
+    params = norm_params({"TSTOP": args.tstop, "TSTEP": args.tstep})
+    tb_text = render_uploaded_tb(
+        netlist_text=NETLIST, subckt_name="NOT1",
+        pin_order=["OUTPUT", "INPUT", "VDD", "VSS"], params=params,
+        plot_nodes=["INPUT", "OUTPUT"], out_csv=Path(OUT_PLACEHOLDER),
+    )
+    labels = ["v(INPUT)", "v(OUTPUT)"]
+
+    print(f"{'engine':<12}{'used':<12}{'mean ms':>10}{'p50':>10}{'p95':>10}")
+    for engine in ("subprocess", "shared"):
+        used, lat = await _bench(engine, tb_text, labels, args.runs)
+        if not lat:
+            continue
+        print(f"{engine:<12}{used:<12}{statistics.mean(lat):>10.1f}"
+              f"{_pct(lat, 50):>10.1f}{_pct(lat, 95):>10.1f}")
+    print("engine stats:", engine_stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
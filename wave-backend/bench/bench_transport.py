@@ -0,0 +1,63 @@
+# bench/bench_transport.py
+"""
+Response encoding: JSON float lists (what FastAPI does for a dict return)
+vs the binary waveform transport (api/transport.py), on synthetic waveforms.
+
+    cd wave-backend
+    python -m bench.bench_transport [--points 3000 30000 300000] [--vectors 2] [--reps 5]
+
+No ngspice needed. Sizes are raw body bytes (before any HTTP compression).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+from api.transport import encode_wave
+
+
+def _body(n: int, k: int):
+    t = np.linspace(0.0, 3e-9, n)
+    waves = {f"v(n{i})": (0.6 + 0.6 * np.sin(2e9 * np.pi * t + i)).tolist() for i in range(k)}
+    return {"time": t.tolist(), "waveforms": waves, "meta": {"points": n}}
+
+
+def _json(res):
+    # FastAPI: jsonable_encoder walk + JSONResponse.render
+    return json.dumps(jsonable_encoder(res), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode()
+
+
+def _best(fn, reps):
+    best, out = float("inf"), None
+    for _ in range(reps):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--points", type=int, nargs="+", default=[3000, 30000, 300000])
+    ap.add_argument("--vectors", type=int, default=2)
+    ap.add_argument("--reps", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"{'points':>8} {'encoding':<10}{'ms':>10}{'bytes':>12}{'x size':>8}{'x time':>8}")
+    for n in args.points:
+        res = _body(n, args.vectors)
+        j_ms, j_body = _best(lambda: _json(res), args.reps)
+        print(f"{n:>8} {'json':<10}{j_ms:>10.2f}{len(j_body):>12}{1.0:>8.1f}{1.0:>8.1f}")
+        for dtype in ("float32", "float64"):
+            b_ms, b_body = _best(lambda: encode_wave(res, dtype), args.reps)
+            print(f"{n:>8} {dtype:<10}{b_ms:>10.2f}{len(b_body):>12}"
+                  f"{len(j_body) / len(b_body):>8.1f}{j_ms / b_ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# core/admission.py
+from __future__ import annotations
+
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from core.config import (ADMIT_BASE_S, ADMIT_MAX_MB, ADMIT_MAX_ROWS, ADMIT_S_PER_ROW_DEVICE, ADMIT_SLOW_S,
+                         LIMITS, SLOW_TIMEOUT_S)
+from spice.engine import SimError
+
+# Pre-flight cost estimate for one transient run, checked before ngspice is
+# started. norm_params clamps TSTEP and TSTOP one by one, but the pair can
+# still mean tens of millions of output rows (TSTOP=5e-6, TSTEP=1e-13).
+#   rows      = TSTOP / TSTEP + 1   (the .tran output grid; TMAX <= TSTEP)
+#   file_mb   = rows * bytes per row (ascii wrdata text / binary rawfile)
+#   runtime_s = ADMIT_BASE_S + rows * devices * ADMIT_S_PER_ROW_DEVICE
+# Decisions:
+#   rows / file too large → coarsen TSTEP to fit ("auto"), or reject ("strict")
+#   runtime > ADMIT_SLOW_S → slow lane (own scheduler, SLOW_TIMEOUT_S)
+#   runtime > SLOW_TIMEOUT_S (or no TSTEP fits) → reject, HTTP 422
+# Every decision carries its reason; responses report it in meta.admission.
+
+ADMISSION_POLICIES = ("auto", "strict")
+
+# primitive element lines (subckt instances X… and sources V/I excluded)
+_DEVICE_RE = re.compile(r"^[ \t]*[BCDEFGHJKLMQRSTWZ][^\s.]*\s", re.M | re.I)
+_CONTROL_RE = re.compile(r"^[ \t]*\.control\b.*?^[ \t]*\.endc\b", re.M | re.I | re.S)
+
+_ASCII_BYTES_PER_VALUE = 17   # wrdata "% .8e" column + separator
+_BINARY_BYTES_PER_VALUE = 8
+
+
+def count_devices(tb_text: str) -> int:
+    """Element lines in a testbench (.control script lines like 'set'/'run' are not devices)."""
+    return len(_DEVICE_RE.findall(_CONTROL_RE.sub("", tb_text)))
+
+
+# device counts by testbench structure (netlist + DUT wiring): parameter values
+# don't add or remove element lines, so each netlist is scanned once
+_DEVICE_MEMO_SIZE = 256
+_device_memo: "OrderedDict[str, int]" = OrderedDict()
+_device_lock = threading.Lock()
+
+
+def devices_for(key: str, tb_text: str) -> int:
+    """count_devices(tb_text), memoized on key (whatever fixes the testbench's element lines)."""
+    with _device_lock:
+        n = _device_memo.get(key)
+        if n is not None:
+            _device_memo.move_to_end(key)
+            return n
+    n = count_devices(tb_text)
+    with _device_lock:
+        _device_memo[key] = n
+        while len(_device_memo) > _DEVICE_MEMO_SIZE:
+            _device_memo.popitem(last=False)
+    return n
+
+
+def estimate(params: Dict[str, float], n_vectors: int, devices: int, output: str) -> Dict[str, Any]:
+    rows = int(params["TSTOP"] / params["TSTEP"]) + 1
+    per_value = _BINARY_BYTES_PER_VALUE if output == "binary" else _ASCII_BYTES_PER_VALUE
+    row_bytes = per_value * (n_vectors + 1)
+    return {
+        "rows": rows,
+        "file_mb": round(rows * row_bytes / 2**20, 2),
+        "runtime_s": round(ADMIT_BASE_S + rows * max(1, devices) * ADMIT_S_PER_ROW_DEVICE, 3),
+        "devices": devices,
+        "row_bytes": row_bytes,
+    }
+
+
+def _coarse_tstep(tstop: float, max_rows: int) -> float:
+    """Smallest TSTEP (3 significant digits, rounded up) giving <= max_rows output rows."""
+    x = tstop / max(1, max_rows - 1)
+    scale = 10 ** (math.floor(math.log10(x)) - 2)
+    return float(f"{math.ceil(x / scale) * scale:.3g}")
+
+
+def admit(params: Dict[str, float], n_vectors: int, devices: int, output: str,
+          policy: str = "auto") -> Tuple[Dict[str, float], Dict[str, Any]]:
+    """
+    (params to run with, {"lane": "fast"|"slow", "estimate", "reasons", "coarsened"?}).
+    Raises SimError(422) with the reason and estimate when the run is refused.
+    """
+    est = estimate(params, n_vectors, devices, output)
+    info: Dict[str, Any] = {"lane": "fast", "estimate": est, "reasons": []}
+    reasons: List[str] = info["reasons"]
+
+    def reject(why: str) -> SimError:
+        return SimError(f"run refused: {why}", 422, details={"admission": {**info, "reasons": reasons + [why]}})
+
+    max_rows = min(ADMIT_MAX_ROWS, int(ADMIT_MAX_MB * 2**20 / est["row_bytes"]))
+    if est["rows"] > max_rows:
+        why = (f"{est['rows']:,} output rows / {est['file_mb']:g} MB "
+               f"(limits {ADMIT_MAX_ROWS:,} rows, {ADMIT_MAX_MB:g} MB)")
+        if policy == "strict":
+            raise reject(why + "; increase TSTEP or shorten TSTOP")
+        tstep = _coarse_tstep(params["TSTOP"], max_rows)
+        if tstep > LIMITS["TSTEP"][1]:
+            raise reject(why + f"; TSTEP would have to exceed {LIMITS['TSTEP'][1]:g}s")
+        info["coarsened"] = {"TSTEP": [params["TSTEP"], tstep]}
+        reasons.append(why + f"; TSTEP coarsened {params['TSTEP']:g}s -> {tstep:g}s")
+        params = {**params, "TSTEP": tstep}
+        est = info["estimate"] = estimate(params, n_vectors, devices, output)
+
+    if est["runtime_s"] > SLOW_TIMEOUT_S:
+        raise reject(f"estimated runtime {est['runtime_s']:g}s ({devices} devices x {est['rows']:,} rows) "
+                     f"exceeds {SLOW_TIMEOUT_S:g}s")
+    if est["runtime_s"] > ADMIT_SLOW_S:
+        info["lane"] = "slow"
+        reasons.append(f"estimated runtime {est['runtime_s']:g}s > {ADMIT_SLOW_S:g}s; slow lane")
+    return params, info
@@ -0,0 +1,362 @@
+# core/archive.py
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import numpy as np
+
+from core.config import (ARCHIVE_CHUNK, ARCHIVE_DISK_MB, ARCHIVE_ENABLED, ARCHIVE_ROOT, PYRAMID_BASE,
+                         PYRAMID_MIN_BUCKETS)
+
+# Columnar archive of finished runs, for GET /runs/{run_id}/window.
+# run_id = first 32 hex chars of the result-cache key (same testbench → same id).
+# One dir per run:
+#   time.f8     raw little-endian float64 time column → np.memmap + searchsorted,
+#               so a window lookup touches only O(log n) pages
+#   cols.bin    every other column in chunks of ARCHIVE_CHUNK samples, each
+#               chunk byte-shuffled (8 byte planes) + zlib; a window only
+#               inflates the chunks it overlaps
+#   pyramid.f8  min/max levels for GET /runs/{run_id}/view (see build_pyramid)
+#   index.json  {"run_id", "created", "points", "chunk", "labels",
+#                "columns": {label: [[offset, length], ...]},
+#                "pyramid": [{"size", "buckets", "offset"}, ...], "meta": {...}}
+
+logger = logging.getLogger("logicsim.archive")
+
+_F8 = np.dtype("<f8")
+_TRASH = ".del"
+
+
+def _shuffle(a: np.ndarray) -> bytes:
+    return np.ascontiguousarray(np.ascontiguousarray(a, dtype=_F8).view(np.uint8).reshape(-1, 8).T).tobytes()
+
+
+def _unshuffle(b: bytes) -> np.ndarray:
+    planes = np.frombuffer(b, dtype=np.uint8).reshape(8, -1)
+    return np.ascontiguousarray(planes.T).view(_F8).ravel()
+
+
+# ---------- min/max pyramid ----------
+# Level k: buckets of size = base * 2^k samples. Per bucket two points,
+# (t_first, a) and (t_last, b), where a/b are the bucket min and max in the
+# order they occur — plotted as a polyline this keeps every spike and edge.
+# Stored raw (float64) per level: t_a[m], t_b[m], then a[m], b[m] per label,
+# so a view reads just the [j0, j1) bucket slices through np.memmap.
+
+def _extrema(Y: np.ndarray, size: int) -> Tuple[np.ndarray, ...]:
+    """Y (k, n) → per-bucket (lo, ilo, hi, ihi), each (k, m); the tail bucket is padded with the last sample."""
+    k, n = Y.shape
+    m = -(-n // size)
+    pad = m * size - n
+    if pad:
+        Y = np.concatenate([Y, np.repeat(Y[:, -1:], pad, axis=1)], axis=1)
+    B = Y.reshape(k, m, size)
+    offs = (np.arange(m) * size)[None, :]
+    ilo, ihi = B.argmin(axis=2), B.argmax(axis=2)
+    lo = np.take_along_axis(B, ilo[..., None], axis=2)[..., 0]
+    hi = np.take_along_axis(B, ihi[..., None], axis=2)[..., 0]
+    return lo, ilo + offs, hi, ihi + offs
+
+
+def _pair(v: np.ndarray, i: np.ndarray, take_max: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge neighbouring buckets (k, 2m) → (k, m) keeping the min (or max) and its sample index."""
+    V, I = v.reshape(v.shape[0], -1, 2), i.reshape(i.shape[0], -1, 2)
+    sel = (V.argmax(axis=2) if take_max else V.argmin(axis=2))[..., None]
+    return np.take_along_axis(V, sel, axis=2)[..., 0], np.take_along_axis(I, sel, axis=2)[..., 0]
+
+
+def build_pyramid(t: np.ndarray, cols: List[np.ndarray], base: int = PYRAMID_BASE,
+                  min_buckets: int = PYRAMID_MIN_BUCKETS) -> List[Tuple[int, List[np.ndarray]]]:
+    """
+    [(bucket size, [t_a, t_b, a_1, b_1, a_2, b_2, ...]), ...] finest level
+    first; each coarser level is reduced from the previous one (O(n) total).
+    Empty when the run is too short to need one.
+    """
+    n = t.size
+    if not cols or n < 2 * base * max(1, min_buckets):
+        return []
+    Y = np.vstack(cols)
+    lo, ilo, hi, ihi = _extrema(Y, base)
+    starts = np.arange(lo.shape[1]) * base
+    t_a, t_b = t[starts], t[np.minimum(starts + base, n) - 1]
+    size = base
+    levels = []
+    while True:
+        first = ilo <= ihi
+        blocks = [t_a, t_b]
+        for r in range(Y.shape[0]):
+            blocks += [np.where(first[r], lo[r], hi[r]), np.where(first[r], hi[r], lo[r])]
+        levels.append((size, blocks))
+        m = t_a.size
+        if m <= min_buckets:
+            return levels
+        if m % 2:  # duplicate the tail bucket so buckets pair up
+            lo, ilo, hi, ihi = (np.concatenate([x, x[:, -1:]], axis=1) for x in (lo, ilo, hi, ihi))
+            t_a, t_b = np.append(t_a, t_a[-1]), np.append(t_b, t_b[-1])
+        lo, ilo = _pair(lo, ilo, take_max=False)
+        hi, ihi = _pair(hi, ihi, take_max=True)
+        t_a, t_b = t_a[0::2], t_b[1::2]
+        size *= 2
+
+
+def _valid_id(run_id: str) -> bool:
+    return len(run_id) == 32 and all(c in "0123456789abcdef" for c in run_id)
+
+
+def archive_id(cache_key: str) -> str:
+    return cache_key[:32]
+
+
+class RunArchive:
+    """
+    Disk-only store bounded by total bytes; least recently read/written runs
+    (index.json mtime) are evicted first: renamed out of place under the lock,
+    then removed, so readers see either the whole run or none of it (→ 404).
+    """
+
+    def __init__(self, root: Path, disk_bytes: int, chunk: int, enabled: bool = True):
+        self.root = root
+        self.disk_bytes = disk_bytes
+        self.chunk = max(1024, chunk)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    def _dir(self, run_id: str) -> Path:
+        return self.root / run_id
+
+    def has(self, run_id: str) -> bool:
+        return self.enabled and _valid_id(run_id) and (self._dir(run_id) / "index.json").exists()
+
+    # ---------- write ----------
+
+    def put(self, run_id: str, arrays: Dict[str, np.ndarray], labels: List[str],
+            meta: Optional[Dict[str, Any]] = None) -> bool:
+        """Archive {"time", *labels} (ndarrays or lists). Returns False if disabled/failed."""
+        if not self.enabled or not _valid_id(run_id):
+            return False
+        d = self._dir(run_id)
+        if (d / "index.json").exists():
+            try:
+                os.utime(d / "index.json")
+                return True
+            except OSError:
+                pass
+
+        t = np.asarray(arrays["time"], dtype=_F8)
+        labels = [l for l in labels if l in arrays]
+        tmp = self.root / f".{run_id}.{uuid4().hex[:6]}.tmp"
+        try:
+            tmp.mkdir(parents=True)
+            np.ascontiguousarray(t).tofile(tmp / "time.f8")
+            columns: Dict[str, List[Tuple[int, int]]] = {}
+            offset = 0
+            with open(tmp / "cols.bin", "wb") as f:
+                for lbl in labels:
+                    col = np.asarray(arrays[lbl], dtype=_F8)
+                    spans = []
+                    for i in range(0, col.size, self.chunk):
+                        blob = zlib.compress(_shuffle(col[i:i + self.chunk]), 1)
+                        f.write(blob)
+                        spans.append((offset, len(blob)))
+                        offset += len(blob)
+                    columns[lbl] = spans
+            pyramid = []
+            levels = build_pyramid(t, [np.asarray(arrays[l], dtype=_F8) for l in labels])
+            with open(tmp / "pyramid.f8", "wb") as f:
+                pos = 0
+                for size, blocks in levels:
+                    pyramid.append({"size": size, "buckets": int(blocks[0].size), "offset": pos})
+                    for blk in blocks:
+                        np.ascontiguousarray(blk, dtype=_F8).tofile(f)
+                        pos += blk.size
+            index = {
+                "run_id": run_id,
+                "created": time.time(),
+                "points": int(t.size),
+                "chunk": self.chunk,
+                "labels": labels,
+                "columns": columns,
+                "pyramid": pyramid,
+                "t_start": float(t[0]) if t.size else None,
+                "t_stop": float(t[-1]) if t.size else None,
+                "bytes": t.nbytes + offset + (tmp / "pyramid.f8").stat().st_size,
+                "meta": meta or {},
+            }
+            (tmp / "index.json").write_text(json.dumps(index, separators=(",", ":")))
+            with self._lock:
+                if d.exists():
+                    shutil.rmtree(d, ignore_errors=True)
+                os.replace(tmp, d)
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            logger.warning("run archive write failed: %s", e)
+            return False
+        self._evict(keep=run_id)
+        return True
+
+    def _evict(self, keep: str) -> None:
+        runs = []
+        total = 0
+        for d in self.root.iterdir() if self.root.exists() else []:
+            if d.name.endswith(_TRASH):  # left by an interrupted eviction
+                shutil.rmtree(d, ignore_errors=True)
+                continue
+            if not _valid_id(d.name):
+                continue
+            try:
+                size = sum(p.stat().st_size for p in d.iterdir())
+                mtime = (d / "index.json").stat().st_mtime
+            except OSError:
+                continue
+            total += size
+            runs.append((mtime, size, d))
+        runs.sort()
+        doomed = []
+        with self._lock:
+            for _mt, size, d in runs:
+                if total <= self.disk_bytes:
+                    break
+                if d.name == keep:
+                    continue
+                gone = self.root / f".{d.name}.{uuid4().hex[:6]}{_TRASH}"
+                try:
+                    os.rename(d, gone)
+                except OSError:
+                    continue
+                doomed.append(gone)
+                total -= size
+        for d in doomed:
+            shutil.rmtree(d, ignore_errors=True)
+
+    # ---------- read ----------
+
+    def index(self, run_id: str) -> Optional[Dict[str, Any]]:
+        if not _valid_id(run_id):
+            return None
+        p = self._dir(run_id) / "index.json"
+        try:
+            index = json.loads(p.read_text())
+            os.utime(p)  # LRU bump
+            return index
+        except (OSError, ValueError):
+            return None
+
+    def window(self, run_id: str, t0: Optional[float] = None, t1: Optional[float] = None,
+               labels: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Samples with t0 <= time <= t1 (+ one neighbour on each side so the
+        window edges plot continuously). Returns {"arrays", "index", "i0", "i1"}
+        or None if the run is unknown (or evicted while being read).
+        """
+        try:
+            return self._window(run_id, t0, t1, labels)
+        except FileNotFoundError:
+            return None
+
+    def _window(self, run_id: str, t0: Optional[float], t1: Optional[float],
+                labels: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+        index = self.index(run_id)
+        if index is None:
+            return None
+        d = self._dir(run_id)
+        n = index["points"]
+        if n == 0:
+            return {"arrays": {"time": np.empty(0)}, "index": index, "i0": 0, "i1": 0}
+        tcol = np.memmap(d / "time.f8", dtype=_F8, mode="r", shape=(n,))
+        i0 = 0 if t0 is None else int(np.searchsorted(tcol, t0, side="left"))
+        i1 = n if t1 is None else int(np.searchsorted(tcol, t1, side="right"))
+        i0, i1 = max(0, i0 - 1), min(n, i1 + 1)
+        if i1 < i0:
+            i1 = i0
+
+        arrays: Dict[str, np.ndarray] = {"time": np.array(tcol[i0:i1])}
+        del tcol
+        chunk = index["chunk"]
+        wanted = index["labels"] if labels is None else [l for l in labels if l in index["columns"]]
+        if i1 > i0 and wanted:
+            c0, c1 = i0 // chunk, (i1 - 1) // chunk
+            with open(d / "cols.bin", "rb") as f:
+                for lbl in wanted:
+                    parts = []
+                    for off, length in index["columns"][lbl][c0:c1 + 1]:
+                        f.seek(off)
+                        parts.append(_unshuffle(zlib.decompress(f.read(length))))
+                    col = np.concatenate(parts)
+                    arrays[lbl] = col[i0 - c0 * chunk:i1 - c0 * chunk]
+        else:
+            for lbl in wanted:
+                arrays[lbl] = np.empty(0)
+        return {"arrays": arrays, "index": index, "i0": i0, "i1": i1}
+
+    def view(self, run_id: str, t0: Optional[float], t1: Optional[float], width: int,
+             labels: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Viewport query: about 2..4 points per pixel of width for [t0, t1], read
+        from the coarsest pyramid level that still has >= width buckets in the
+        window. Cost follows the width, not the run length. Falls back to the
+        raw window (short spans, or runs archived without a pyramid).
+        Returns window()'s dict + "level" (bucket size, 1 = raw samples), or None.
+        """
+        try:
+            return self._view(run_id, t0, t1, width, labels)
+        except FileNotFoundError:
+            return None
+
+    def _view(self, run_id: str, t0: Optional[float], t1: Optional[float], width: int,
+              labels: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+        index = self.index(run_id)
+        if index is None:
+            return None
+        d = self._dir(run_id)
+        n = index["points"]
+        i0, i1 = 0, n
+        if n:
+            tcol = np.memmap(d / "time.f8", dtype=_F8, mode="r", shape=(n,))
+            i0 = 0 if t0 is None else max(0, int(np.searchsorted(tcol, t0, side="left")) - 1)
+            i1 = n if t1 is None else min(n, int(np.searchsorted(tcol, t1, side="right")) + 1)
+            del tcol
+        span = max(0, i1 - i0)
+        levels = [lv for lv in index.get("pyramid", []) if span // lv["size"] >= width]
+        if not levels:
+            win = self._window(run_id, t0, t1, labels)
+            if win is not None:
+                win["level"] = 1
+            return win
+
+        lv = levels[-1]
+        size, m = lv["size"], lv["buckets"]
+        j0, j1 = i0 // size, min(m, -(-i1 // size))
+        wanted = index["labels"] if labels is None else [l for l in labels if l in index["columns"]]
+        pyr = np.memmap(d / "pyramid.f8", dtype=_F8, mode="r")
+
+        def block(k: int) -> np.ndarray:
+            start = lv["offset"] + k * m
+            return pyr[start + j0:start + j1]
+
+        def interleave(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+            return np.column_stack([a, b]).ravel()
+
+        arrays: Dict[str, np.ndarray] = {"time": interleave(block(0), block(1))}
+        for lbl in wanted:
+            r = index["labels"].index(lbl)
+            arrays[lbl] = interleave(block(2 + 2 * r), block(3 + 2 * r))
+        del pyr
+        return {"arrays": arrays, "index": index, "i0": i0, "i1": i1, "level": size}
+
+
+# Process-wide instance used by the API routes
+run_archive = RunArchive(
+    root=ARCHIVE_ROOT,
+    disk_bytes=int(ARCHIVE_DISK_MB * 1024 * 1024),
+    chunk=ARCHIVE_CHUNK,
+    enabled=ARCHIVE_ENABLED,
+)
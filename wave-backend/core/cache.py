@@ -0,0 +1,186 @@
+# core/cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from core.config import CACHE_ENABLED, CACHE_ROOT, CACHE_MEM_MB, CACHE_DISK_MB
+
+# Placeholder used instead of the per-run output path while rendering, so that
+# two byte-identical testbenches hash to the same key regardless of run dir.
+OUT_PLACEHOLDER = "{OUT_CSV}"
+
+
+def tb_cache_key(tb_text: str, vectors: List[str], variant: str = "") -> str:
+    """
+    sha256 over the rendered testbench (with OUT_PLACEHOLDER) + plot vectors.
+    variant tags results produced some other way than running tb_text itself
+    ("batch-ascii": a point of a batched sweep testbench), so they never answer a
+    plain single run.
+    """
+    h = hashlib.sha256()
+    h.update(tb_text.encode("utf-8", errors="surrogatepass"))
+    h.update(b"\0")
+    h.update("\n".join(vectors).encode("utf-8"))
+    if variant:
+        h.update(b"\0" + variant.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    """Rough in-memory footprint: ~32 bytes per float (list slot + float obj)."""
+    n = len(entry.get("time", []))
+    for v in (entry.get("waveforms") or {}).values():
+        n += len(v)
+    return n * 32 + 256
+
+
+class ResultCache:
+    """
+    Two-tier simulation result cache.
+      - memory: LRU (OrderedDict) bounded by approx bytes
+      - disk:   one JSON file per key under CACHE_ROOT, bounded by total bytes
+                (oldest-accessed files evicted first)
+    Entry schema: {"time": [...], "waveforms": {label: [...]}, "warnings": [...]}
+    """
+
+    def __init__(self, root: Path, mem_bytes: int, disk_bytes: int, enabled: bool = True):
+        self.root = root
+        self.mem_bytes = mem_bytes
+        self.disk_bytes = disk_bytes
+        self.enabled = enabled
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._mem_sizes: Dict[str, int] = {}
+        self._mem_used = 0
+        self._disk_used: Optional[int] = None  # lazily scanned
+        self._lock = threading.Lock()       # memory tier only (held briefly; gets never wait on disk IO)
+        self._disk_lock = threading.Lock()  # _disk_used + eviction
+
+    # ---------- paths ----------
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    # ---------- memory tier ----------
+
+    def _mem_put(self, key: str, entry: Dict[str, Any]) -> None:
+        size = _entry_size(entry)
+        if size > self.mem_bytes:
+            return
+        if key in self._mem:
+            self._mem_used -= self._mem_sizes.pop(key)
+            del self._mem[key]
+        self._mem[key] = entry
+        self._mem_sizes[key] = size
+        self._mem_used += size
+        while self._mem_used > self.mem_bytes and self._mem:
+            old, _ = self._mem.popitem(last=False)
+            self._mem_used -= self._mem_sizes.pop(old)
+
+    # ---------- disk tier ----------
+
+    def _scan_disk(self) -> int:
+        total = 0
+        if self.root.exists():
+            for p in self.root.glob("*/*.json"):
+                try:
+                    total += p.stat().st_size
+                except OSError:
+                    pass
+        return total
+
+    def _disk_evict(self) -> None:
+        if self._disk_used is None or self._disk_used <= self.disk_bytes:
+            return
+        files = []
+        for p in self.root.glob("*/*.json"):
+            try:
+                st = p.stat()
+                files.append((st.st_mtime, st.st_size, p))
+            except OSError:
+                pass
+        files.sort()
+        for _mt, size, p in files:
+            if self._disk_used <= self.disk_bytes:
+                break
+            try:
+                p.unlink()
+                self._disk_used -= size
+            except OSError:
+                pass
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        p = self._path(key)
+        try:
+            entry = json.loads(p.read_text())
+            os.utime(p)  # bump for LRU-ish eviction
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key: str, entry: Dict[str, Any]) -> None:
+        """Outside _lock: written to a unique tmp file and renamed into place (readers see old or new)."""
+        data = json.dumps(entry, separators=(",", ":"))
+        if len(data) > self.disk_bytes:
+            return
+        p = self._path(key)
+        tmp = p.with_name(f".{key}.{uuid4().hex[:6]}.tmp")
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(data)
+            old = p.stat().st_size if p.exists() else 0
+            os.replace(tmp, p)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return
+        with self._disk_lock:
+            if self._disk_used is None:
+                self._disk_used = self._scan_disk()
+            else:
+                self._disk_used += len(data) - old
+            self._disk_evict()
+
+    # ---------- public API ----------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return cached entry or None. Disk hits are promoted to memory."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+                return entry
+        entry = self._disk_get(key)
+        if entry is not None:
+            with self._lock:
+                self._mem_put(key, entry)
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._mem_put(key, entry)
+        self._disk_put(key, entry)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._mem_sizes.clear()
+            self._mem_used = 0
+
+
+# Process-wide instance used by the API routes
+result_cache = ResultCache(
+    root=CACHE_ROOT,
+    mem_bytes=int(CACHE_MEM_MB * 1024 * 1024),
+    disk_bytes=int(CACHE_DISK_MB * 1024 * 1024),
+    enabled=CACHE_ENABLED,
+)
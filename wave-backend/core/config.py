@@ -1,6 +1,6 @@
 # core/config.py
 from pathlib import Path
-import os, time
+import os, re, time
 from uuid import uuid4
 
 # ---- Project roots ----
@@ -46,10 +46,87 @@ DEFAULT_PARAM_DEFAULTS = {
 # ---- Run-dir helpers ----
 KEEP_RUNS = os.environ.get("KEEP_RUNS", "0") in ("1", "true", "True")
 
-def new_run_dir(prefix: str = "run_"):
-    """Create a predictable folder name under RUN_ROOT, one per run."""
+# ---- Run workspace (tb.cir / run.log / sim.csv per run; see core/workspace.py) ----
+WORK_ROOT = Path(os.environ.get("WORK_ROOT") or RUN_ROOT)   # e.g. /dev/shm/logicsim (tmpfs)
+WORK_DIR = WORK_ROOT / "work"                               # run dirs live (and are reaped) only in here
+WORK_POOL = int(os.environ.get("WORK_POOL", "8"))           # emptied dirs kept for reuse
+WORK_MAX_AGE_S = float(os.environ.get("WORK_MAX_AGE_S", "3600"))  # reaper: drop run dirs older than this (0 = never)
+WORK_MAX_MB = float(os.environ.get("WORK_MAX_MB", "1024"))  # reaper: oldest run dirs go first above this
+WORK_REAP_S = float(os.environ.get("WORK_REAP_S", "60"))    # reaper scan interval
+KEEP_FAILED_RUNS = os.environ.get("KEEP_FAILED_RUNS", "0") in ("1", "true", "True")
+
+def run_dir_name(prefix: str = "run_") -> str:
     ts = time.strftime("%Y%m%d-%H%M%S")
-    name = f"{prefix}{ts}-{uuid4().hex[:6]}"
-    d = RUN_ROOT / name
+    return f"{prefix}{ts}-{uuid4().hex[:6]}"
+
+RUN_DIR_RE = re.compile(r"^[A-Za-z_]*\d{8}-\d{6}-[0-9a-f]{6}$")   # names made by run_dir_name()
+
+def new_run_dir(prefix: str = "run_"):
+    """Create a predictable folder name under WORK_DIR, one per run."""
+    d = WORK_DIR / run_dir_name(prefix)
     d.mkdir(parents=True, exist_ok=True)
     return d
+
+# ---- Result cache (keyed on rendered tb.cir + plot vectors) ----
+CACHE_ENABLED = os.environ.get("SIM_CACHE", "1") in ("1", "true", "True")
+CACHE_ROOT = RUN_ROOT / "_cache"                    # on-disk tier lives under RUN_ROOT
+CACHE_MEM_MB = float(os.environ.get("SIM_CACHE_MEM_MB", "64"))
+CACHE_DISK_MB = float(os.environ.get("SIM_CACHE_DISK_MB", "512"))
+
+# ---- Run archive (GET /runs/{id}/window): columnar copy of finished results ----
+ARCHIVE_ENABLED = os.environ.get("RUN_ARCHIVE", "1" if KEEP_RUNS else "0") in ("1", "true", "True")
+ARCHIVE_ROOT = RUN_ROOT / "_archive"
+ARCHIVE_DISK_MB = float(os.environ.get("ARCHIVE_DISK_MB", "2048"))
+ARCHIVE_CHUNK = int(os.environ.get("ARCHIVE_CHUNK", "65536"))     # samples per compressed chunk
+# min/max pyramid (GET /runs/{id}/view): finest level = PYRAMID_BASE samples per bucket,
+# ×2 per level until a level has <= PYRAMID_MIN_BUCKETS buckets
+PYRAMID_BASE = int(os.environ.get("PYRAMID_BASE", "16"))
+PYRAMID_MIN_BUCKETS = int(os.environ.get("PYRAMID_MIN_BUCKETS", "256"))
+
+# ---- Simulator output format: "ascii" (wrdata text) | "binary" (rawfile, mmap) ----
+OUTPUT_FORMAT = os.environ.get("SIM_OUTPUT", "ascii").lower()
+
+# ---- ngspice execution: concurrent runs (FIFO queue beyond this) + per-run timeout ----
+SIM_CONCURRENCY = max(1, int(os.environ.get("SIM_CONCURRENCY", "0") or 0) or (os.cpu_count() or 1))
+SIM_TIMEOUT_S = float(os.environ.get("SIM_TIMEOUT_S", "25"))
+SIM_DEBUG = os.environ.get("SIM_DEBUG", "0") in ("1", "true", "True")   # log rendered tb.cir / rc per run
+
+# ---- Admission control (core/admission.py): pre-flight cost estimate of every run ----
+ADMIT_MAX_ROWS = int(os.environ.get("ADMIT_MAX_ROWS", "2000000"))   # output rows ~ TSTOP/TSTEP
+ADMIT_MAX_MB = float(os.environ.get("ADMIT_MAX_MB", "256"))         # estimated output file size
+ADMIT_BASE_S = float(os.environ.get("ADMIT_BASE_S", "0.05"))        # runtime model: base +
+ADMIT_S_PER_ROW_DEVICE = float(os.environ.get("ADMIT_S_PER_ROW_DEVICE", "1e-6"))  # rows * devices * this
+ADMIT_SLOW_S = float(os.environ.get("ADMIT_SLOW_S", str(SIM_TIMEOUT_S / 2)))  # estimate above → slow lane
+SLOW_CONCURRENCY = max(1, int(os.environ.get("SLOW_CONCURRENCY", "1")))      # slow-lane runs at once
+SLOW_TIMEOUT_S = float(os.environ.get("SLOW_TIMEOUT_S", "300"))     # slow-lane timeout; estimate above → reject
+
+# ---- Engine: "subprocess" (ngspice -b per run) | "shared" (libngspice worker pool) ----
+SIM_ENGINE = os.environ.get("SIM_ENGINE", "subprocess").lower()
+NGSPICE_LIB = os.environ.get("NGSPICE_LIB", "")   # path to libngspice.so/.dll (auto-detect if empty)
+
+# ---- Parameter sweeps (/sweep) ----
+SWEEP_MAX_POINTS = int(os.environ.get("SWEEP_MAX_POINTS", "2000"))
+SWEEP_BATCH_MAX = int(os.environ.get("SWEEP_BATCH_MAX", "16"))   # points per batched ngspice run
+
+# ---- Stimulus compiler (pin_drives bits/prbs/pwl; see spice/stimulus.py) ----
+STIM_ROOT = RUN_ROOT / "_stimuli"                   # content-addressed PWL include files
+STIM_INLINE_POINTS = int(os.environ.get("STIM_INLINE_POINTS", "64"))   # longer → out-of-line file
+STIM_MAX_POINTS = int(os.environ.get("STIM_MAX_POINTS", "2000000"))    # per source
+STIM_DISK_MB = float(os.environ.get("STIM_DISK_MB", "256"))
+STIM_KEEP_S = float(os.environ.get("STIM_KEEP_S", "3600"))  # files used within this window are never evicted
+STIM_MEMO_POINTS = int(os.environ.get("STIM_MEMO_POINTS", "500000"))  # compiled stimuli kept in memory (total points)
+
+# ---- Truth-table mode (/simulate_uploaded "truth_table"): 2^N codes in one transient ----
+TRUTH_TABLE_MAX_INPUTS = int(os.environ.get("TRUTH_TABLE_MAX_INPUTS", "10"))
+
+# ---- Async jobs (/jobs): bounded in-memory store, finished jobs expire after TTL ----
+JOB_MAX = int(os.environ.get("JOB_MAX", "256"))
+JOB_TTL_S = float(os.environ.get("JOB_TTL_S", "900"))
+JOB_TIMEOUT_S = float(os.environ.get("JOB_TIMEOUT_S", "600"))     # per-run ngspice limit for jobs
+
+# ---- Netlist registry (/netlists): upload once, reference by netlist_id ----
+NETLIST_ROOT = RUN_ROOT / "_netlists"               # persisted across restarts
+NETLIST_MEM_MB = float(os.environ.get("NETLIST_MEM_MB", "128"))
+NETLIST_DISK_MB = float(os.environ.get("NETLIST_DISK_MB", "1024"))
+NETLIST_PRUNE = os.environ.get("NETLIST_PRUNE", "1") in ("1", "true", "True")  # tb.cir: only DUT-reachable cells
+NETLIST_UPLOAD_MAX_MB = float(os.environ.get("NETLIST_UPLOAD_MAX_MB", "512"))   # /netlists/upload body limit
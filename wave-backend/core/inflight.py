@@ -0,0 +1,86 @@
+# core/inflight.py
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from spice.engine import SimError
+
+# In-flight deduplication ("singleflight"): concurrent requests with the same
+# key (result-cache key = hash of the rendered testbench, plus the run's lane,
+# timeout and rc check) share ONE run.
+#   - the first caller starts the work as a task; later callers await it too
+#   - every caller gets the same result (or the same exception)
+#   - a caller that goes away (cancelled) only drops its reference; the run
+#     is cancelled (ngspice killed) when the LAST waiting caller is gone, and
+#     its key is dropped right then, so new arrivals start a fresh run instead
+#     of joining one that is being torn down
+#   - a caller whose shared run was cancelled by something else (not by its
+#     own cancellation) retries once, then gets a 503 SimError
+# The key is removed as soon as the run finishes, so later requests go
+# through the result cache as usual.
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0   # callers currently awaiting
+        self.joined = 0    # callers that ever attached (leader included)
+        self.abandoned = False  # cancelled by its last waiter
+
+
+class InFlight:
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.started = 0
+        self.deduped = 0
+
+    async def run(self, key: str, start: Callable[[], Awaitable[Any]]) -> Tuple[Any, Dict[str, Any]]:
+        """
+        (result, info) where info = {"role": "leader"|"follower", "requests": n}
+        and n counts every request that shared this run up to its completion.
+        """
+        for _attempt in range(2):
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call(asyncio.ensure_future(start()))
+                self._calls[key] = call
+                call.task.add_done_callback(lambda _t, k=key, c=call: self._done(k, c))
+                self.started += 1
+                role = "leader"
+            else:
+                self.deduped += 1
+                role = "follower"
+            call.waiters += 1
+            call.joined += 1
+            try:
+                res = await asyncio.shield(call.task)
+            except asyncio.CancelledError:
+                if call.task.cancelled() and not call.abandoned:
+                    continue  # the shared run was cancelled, this caller wasn't → run it again
+                if not call.task.done() and call.waiters == 1:
+                    self._abandon(key, call)  # last interested caller left → kill the run
+                raise
+            finally:
+                call.waiters -= 1
+            return res, {"role": role, "requests": call.joined}
+        raise SimError("shared run was cancelled", 503)
+
+    def _abandon(self, key: str, call: _Call) -> None:
+        call.abandoned = True
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        call.task.cancel()
+
+    def _done(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            call.task.exception()  # retrieved here so a failure nobody awaits isn't logged
+
+    def stats(self) -> Dict[str, int]:
+        return {"inflight": len(self._calls), "started": self.started, "deduped": self.deduped}
+
+
+# Process-wide registry used by simulate_cached
+inflight = InFlight()
@@ -0,0 +1,142 @@
+# core/jobs.py
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from uuid import uuid4
+
+from core.config import JOB_MAX, JOB_TTL_S
+
+# Job states
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobStoreFull(Exception):
+    pass
+
+
+class Job:
+    """One background simulation. result / error are filled when it finishes."""
+
+    def __init__(self, kind: str, options: Optional[Dict[str, Any]] = None):
+        self.id = uuid4().hex[:16]
+        self.kind = kind
+        self.options = options or {}  # result delivery options from the submit body (format, dtype)
+        self.status = QUEUED
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[Dict[str, Any]] = None
+        self.status_code = 200
+        self.task: Optional[asyncio.Task] = None
+
+    def summary(self) -> Dict[str, Any]:
+        end = self.finished or time.time()
+        out: Dict[str, Any] = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created": self.created,
+            "elapsed_ms": int((end - self.created) * 1000),
+        }
+        if self.error is not None:
+            out["error"] = self.error
+            out["status_code"] = self.status_code
+        return out
+
+
+class JobStore:
+    """
+    Bounded in-memory job table (insertion ordered).
+      - finished jobs expire JOB_TTL_S after finishing (lazily, on access)
+      - when full, the oldest finished job is dropped; if every slot holds a
+        live job, submit() raises JobStoreFull
+      - cancel() cancels the task: the run's ngspice child is killed and its
+        run dir removed by the engine (CancelledError path)
+    """
+
+    def __init__(self, max_jobs: int, ttl_s: float):
+        self.max_jobs = max(1, max_jobs)
+        self.ttl_s = ttl_s
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    # ---------- eviction ----------
+
+    def _expire(self) -> None:
+        now = time.time()
+        for jid in [j.id for j in self._jobs.values()
+                    if j.finished is not None and now - j.finished > self.ttl_s]:
+            del self._jobs[jid]
+
+    def _make_room(self) -> None:
+        self._expire()
+        if len(self._jobs) < self.max_jobs:
+            return
+        for jid, j in self._jobs.items():
+            if j.status in FINISHED:
+                del self._jobs[jid]
+                return
+        raise JobStoreFull(f"{len(self._jobs)} jobs still active (max {self.max_jobs})")
+
+    # ---------- public API ----------
+
+    def submit(self, kind: str, fn: Callable[[], Awaitable[Any]],
+               on_error: Callable[[BaseException], Optional[tuple]] = lambda e: None,
+               options: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        Start fn() as a background task. on_error(exc) may map an expected
+        exception to (status_code, error_body); anything else is a 500.
+        options are kept on the job for whoever delivers its result.
+        """
+        self._make_room()
+        job = Job(kind, options)
+
+        async def _runner() -> None:
+            job.status, job.started = RUNNING, time.time()
+            try:
+                job.result = await fn()
+                job.status = DONE
+            except asyncio.CancelledError:
+                job.status = CANCELLED
+                raise
+            except Exception as e:
+                mapped = on_error(e)
+                job.status_code, job.error = mapped or (500, {"error": f"job failed: {e}"})
+                job.status = FAILED
+            finally:
+                job.finished = time.time()
+
+        job.task = asyncio.create_task(_runner())
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel (if still live) and drop the job. Returns it, or None if unknown."""
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return None
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+        if job.status not in FINISHED:  # cancelled before the task ever started
+            job.status, job.finished = CANCELLED, time.time()
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        self._expire()
+        out = {"max": self.max_jobs, "total": len(self._jobs)}
+        for j in self._jobs.values():
+            out[j.status] = out.get(j.status, 0) + 1
+        return out
+
+
+# Process-wide job store used by the API routes
+job_store = JobStore(JOB_MAX, JOB_TTL_S)
@@ -0,0 +1,31 @@
+# core/metrics.py
+from __future__ import annotations
+
+import threading
+from typing import Dict
+
+# Process-wide event counters, reported under "metrics" in /health.
+#   aborted_runs   /simulate* requests whose client disconnected before the
+#                  result was ready (run cancelled: ngspice process group
+#                  killed, run dir released)
+
+
+class Metrics:
+    def __init__(self):
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self._counts.get(name, 0)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+metrics = Metrics()
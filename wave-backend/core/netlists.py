@@ -0,0 +1,308 @@
+# core/netlists.py
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from core.config import NETLIST_DISK_MB, NETLIST_MEM_MB, NETLIST_ROOT, NETLIST_UPLOAD_MAX_MB
+from core.utils import compile_hints
+from spice.parse import analyze_netlist, scan_subckt_line
+
+# Upload-once netlist registry. netlist_id = sha256(text + hints), so the same
+# library uploaded twice maps to the same id and survives restarts.
+# On disk, one dir per id:
+#   <id>/netlist.cir     uploaded text (as sent)
+#   <id>/normalized.cir  analyze_netlist().normalized (what testbenches embed)
+#   <id>/index.json      {"netlist_id", "hints", "subckts", "bytes", "created"}
+
+logger = logging.getLogger("logicsim.netlists")
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def _finish_id(h: "hashlib._Hash", hints: Optional[dict]) -> str:
+    h.update(b"\0")
+    h.update(json.dumps(hints or {}, sort_keys=True).encode())
+    return h.hexdigest()[:32]
+
+
+def netlist_id(text: str, hints: Optional[dict]) -> str:
+    return _finish_id(hashlib.sha256(text.encode("utf-8", errors="surrogatepass")), hints)
+
+
+def _valid_id(nid: str) -> bool:
+    return len(nid) == 32 and all(c in "0123456789abcdef" for c in nid)
+
+
+class NetlistStore:
+    """
+    Registered netlists: LRU memory tier (normalized text + index) over a
+    persistent disk tier bounded by total bytes (least recently used dirs
+    evicted first, access bumps the index.json mtime).
+    """
+
+    def __init__(self, root: Path, mem_bytes: int, disk_bytes: int):
+        self.root = root
+        self.mem_bytes = mem_bytes
+        self.disk_bytes = disk_bytes
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._mem_used = 0
+        self._lock = threading.Lock()
+
+    # ---------- memory tier ----------
+
+    @staticmethod
+    def _size(entry: Dict[str, Any]) -> int:
+        return len(entry["normalized"]) + 1024
+
+    def _mem_put(self, nid: str, entry: Dict[str, Any]) -> None:
+        if self._size(entry) > self.mem_bytes:
+            return
+        old = self._mem.pop(nid, None)
+        if old is not None:
+            self._mem_used -= self._size(old)
+        self._mem[nid] = entry
+        self._mem_used += self._size(entry)
+        while self._mem_used > self.mem_bytes and self._mem:
+            _k, ev = self._mem.popitem(last=False)
+            self._mem_used -= self._size(ev)
+
+    # ---------- disk tier ----------
+
+    def _dir(self, nid: str) -> Path:
+        return self.root / nid
+
+    def _disk_get(self, nid: str) -> Optional[Dict[str, Any]]:
+        d = self._dir(nid)
+        try:
+            index = json.loads((d / "index.json").read_text())
+            index["normalized"] = (d / "normalized.cir").read_text()
+            os.utime(d / "index.json")  # LRU bump
+            return index
+        except (OSError, ValueError):
+            return None
+
+    def _commit(self, nid: str, tmp: Path, index: Dict[str, Any]) -> bool:
+        """tmp dir (netlist.cir + normalized.cir) + index → <root>/<id>, then evict."""
+        d = self._dir(nid)
+        try:
+            (tmp / "index.json").write_text(json.dumps(index, separators=(",", ":")))
+            if d.exists():
+                shutil.rmtree(d, ignore_errors=True)
+            os.replace(tmp, d)
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            logger.warning("netlist store write failed: %s", e)
+            return False
+        self._disk_evict(keep=nid)
+        return True
+
+    def _disk_put(self, nid: str, text: str, entry: Dict[str, Any]) -> None:
+        tmp = self.root / f".{nid}.tmp"
+        try:
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir(parents=True)
+            (tmp / "netlist.cir").write_text(text)
+            (tmp / "normalized.cir").write_text(entry["normalized"])
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            logger.warning("netlist store write failed: %s", e)
+            return
+        self._commit(nid, tmp, self.public(entry))
+
+    def _disk_evict(self, keep: str) -> None:
+        dirs = []
+        total = 0
+        for d in self.root.iterdir() if self.root.exists() else []:
+            if not _valid_id(d.name):
+                continue
+            try:
+                size = sum(p.stat().st_size for p in d.iterdir())
+                mtime = (d / "index.json").stat().st_mtime
+            except OSError:
+                continue
+            total += size
+            dirs.append((mtime, size, d))
+        dirs.sort()
+        for _mt, size, d in dirs:
+            if total <= self.disk_bytes:
+                break
+            if d.name == keep:
+                continue
+            shutil.rmtree(d, ignore_errors=True)
+            with self._lock:
+                ev = self._mem.pop(d.name, None)
+                if ev is not None:
+                    self._mem_used -= self._size(ev)
+            total -= size
+
+    # ---------- public API ----------
+
+    def register(self, text: str, hints: Optional[dict] = None) -> Dict[str, Any]:
+        """Hash, normalize and index text once. Returns the index (+ "existing": bool)."""
+        nid = netlist_id(text, hints)
+        entry = self.get(nid)
+        if entry is not None:
+            return {**self.public(entry), "existing": True}
+        an = analyze_netlist(text, hints)
+        entry = {
+            "netlist_id": nid,
+            "hints": hints or {},
+            "subckts": an.index(),
+            "bytes": len(text.encode("utf-8", errors="surrogatepass")),
+            "created": time.time(),
+            "normalized": an.normalized,
+        }
+        with self._lock:
+            self._mem_put(nid, entry)
+        self._disk_put(nid, text, entry)
+        return {**self.public(entry), "existing": False}
+
+    def upload(self, hints: Optional[dict] = None) -> "NetlistUpload":
+        """Start a streaming registration (see NetlistUpload)."""
+        return NetlistUpload(self, hints)
+
+    def adopt(self, nid: str, tmp: Path, index: Dict[str, Any]) -> Dict[str, Any]:
+        """Register a finished upload dir. Same id already stored → tmp is discarded."""
+        existing = self.get(nid)
+        if existing is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return {**self.public(existing), "existing": True}
+        if not self._commit(nid, tmp, index):
+            raise OSError("netlist store write failed")
+        return {**index, "existing": False}
+
+    def get(self, nid: str) -> Optional[Dict[str, Any]]:
+        """Full entry (with "normalized" text) or None if unknown/evicted."""
+        if not _valid_id(nid):
+            return None
+        with self._lock:
+            entry = self._mem.get(nid)
+            if entry is not None:
+                self._mem.move_to_end(nid)
+                return entry
+        entry = self._disk_get(nid)
+        if entry is not None:
+            with self._lock:
+                self._mem_put(nid, entry)
+        return entry
+
+    def delete(self, nid: str) -> bool:
+        if not _valid_id(nid):
+            return False
+        with self._lock:
+            ev = self._mem.pop(nid, None)
+            if ev is not None:
+                self._mem_used -= self._size(ev)
+        d = self._dir(nid)
+        existed = d.exists()
+        shutil.rmtree(d, ignore_errors=True)
+        return existed or ev is not None
+
+    @staticmethod
+    def public(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in entry.items() if k != "normalized"}
+
+
+# Process-wide instance used by the API routes
+netlist_store = NetlistStore(
+    root=NETLIST_ROOT,
+    mem_bytes=int(NETLIST_MEM_MB * 1024 * 1024),
+    disk_bytes=int(NETLIST_DISK_MB * 1024 * 1024),
+)
+
+
+class NetlistUpload:
+    """
+    Streaming registration: feed() raw chunks as they arrive, finish() → index.
+    Each chunk goes straight to disk while the sha256 is updated and complete
+    lines are scanned for .subckt headers (normalized copy written alongside),
+    so memory stays at one partial line + the subckt index. The id and the
+    stored files match what register() produces for the same text (UTF-8).
+    Sync API: call from the threadpool.
+    """
+
+    MAX_LINE = 1 << 20
+
+    def __init__(self, store: NetlistStore, hints: Optional[dict] = None):
+        self.store = store
+        self.hints = hints or {}
+        self._ch = compile_hints(hints)
+        self.max_bytes = int(NETLIST_UPLOAD_MAX_MB * 1024 * 1024)
+        self.bytes = 0
+        self.subckts: List[Dict[str, Any]] = []
+        self._hash = hashlib.sha256()
+        self._tail = b""
+        self._first_line = True
+        self.tmp = store.root / f".upload-{uuid4().hex}.tmp"
+        self.tmp.mkdir(parents=True)
+        self._raw = open(self.tmp / "netlist.cir", "wb")
+        self._norm = open(self.tmp / "normalized.cir", "w", encoding="utf-8", newline="")
+
+    def _line(self, raw: bytes) -> None:
+        line = raw.decode("utf-8", errors="replace")
+        if line.endswith("\r"):
+            line = line[:-1]
+        hit = scan_subckt_line(line, self._ch)
+        if hit is not None:
+            self.subckts.append({"name": hit[0]["name"], "pins": hit[0]["pins"]})
+            line = hit[1]
+        if not self._first_line:
+            self._norm.write("\n")
+        self._norm.write(line)
+        self._first_line = False
+
+    def feed(self, chunk: bytes) -> None:
+        """Raises UploadTooLarge / ValueError when the size / line-length limits are exceeded."""
+        if not chunk:
+            return
+        self.bytes += len(chunk)
+        if self.bytes > self.max_bytes:
+            raise UploadTooLarge(f"netlist larger than {NETLIST_UPLOAD_MAX_MB:g} MB")
+        self._hash.update(chunk)
+        self._raw.write(chunk)
+        lines = (self._tail + chunk).split(b"\n")
+        self._tail = lines.pop()
+        if len(self._tail) > self.MAX_LINE:
+            raise ValueError("netlist line longer than 1 MB")
+        for ln in lines:
+            self._line(ln)
+
+    def finish(self) -> Dict[str, Any]:
+        """Flush, hash, register. Returns the /netlists index (+ "existing")."""
+        if self._tail:
+            self._line(self._tail)
+            self._tail = b""
+        self._raw.close()
+        self._norm.close()
+        if self.bytes == 0:
+            self.abort()
+            raise ValueError("empty netlist")
+        nid = _finish_id(self._hash, self.hints or None)
+        index = {
+            "netlist_id": nid,
+            "hints": self.hints,
+            "subckts": self.subckts,
+            "bytes": self.bytes,
+            "created": time.time(),
+        }
+        return self.store.adopt(nid, self.tmp, index)
+
+    def abort(self) -> None:
+        for f in (self._raw, self._norm):
+            try:
+                f.close()
+            except OSError:
+                pass
+        shutil.rmtree(self.tmp, ignore_errors=True)
@@ -0,0 +1,89 @@
+# core/scheduler.py
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+from core.config import SIM_CONCURRENCY, SLOW_CONCURRENCY
+
+
+class SimScheduler:
+    """
+    Bounded-concurrency FIFO scheduler for ngspice runs.
+      - at most `limit` runs hold a slot() at once; the rest wait in arrival order
+      - cancelling a waiting/running task frees its slot (the engine kills its child)
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.completed = 0
+
+    # ---------- slot handling ----------
+
+    async def _acquire(self) -> None:
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if not fut.done():
+                self._waiters.remove(fut)
+            elif not fut.cancelled():
+                # slot was handed to us right before the cancel → pass it on
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)  # hand the slot over, _active unchanged
+                return
+        self._active -= 1
+
+    # ---------- public API ----------
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one execution slot (any engine) for the duration of the block."""
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self.completed += 1
+            self._release()
+
+    def batch_size(self, n_points: int, max_batch: int) -> int:
+        """
+        Points per batched ngspice invocation: spread the sweep evenly over the
+        slots (every slot gets work) and amortise launch/parse overhead, but
+        never exceed max_batch so one slow batch can't hog a slot for long.
+        """
+        if n_points <= 0:
+            return 1
+        per_slot = -(-n_points // self.limit)  # ceil
+        return max(1, min(per_slot, max_batch))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.limit,
+            "active": self._active,
+            "queued": len(self._waiters),
+            "completed": self.completed,
+        }
+
+
+# Process-wide scheduler used by the API routes
+scheduler = SimScheduler(SIM_CONCURRENCY)
+
+# Slow lane: runs that admission control expects to be long (core/admission.py)
+# queue here, so they never hold the slots interactive requests wait for
+slow_scheduler = SimScheduler(SLOW_CONCURRENCY)
+LANES = {"fast": scheduler, "slow": slow_scheduler}
@@ -4,9 +4,8 @@ from __future__ import annotations
 import os
 import json
 import re
-import subprocess
-from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 from core.config import (
     LIMITS,        # dict: param -> (lo, hi)
@@ -50,7 +49,11 @@ def load_env_hints() -> dict:
     Optional env override:
       SUPPLY_ALIASES_JSON='{"supplies":{"vdd":["VDD","VCCA"],"vss":["VSS","GND","0"]},"outputs":["Y","OUT","Q"]}'
     """
-    txt = os.environ.get("SUPPLY_ALIASES_JSON", "").strip()
+    return _parse_env_hints(os.environ.get("SUPPLY_ALIASES_JSON", "").strip())
+
+@lru_cache(maxsize=8)
+def _parse_env_hints(txt: str) -> dict:
+    # cached per env value (treat the result as read-only)
     if not txt:
         return {}
     try:
@@ -93,6 +96,34 @@ def merge_hints(*objs) -> dict:
     out["outputs"] = uniq(out["outputs"]) or def_out
     return out
 
+class CompiledHints:
+    """
+    merge_hints(request, env, defaults) + lower-cased alias sets, built once
+    per distinct hints payload (see compile_hints). Read-only.
+    """
+    __slots__ = ("merged", "vdd", "vss", "supplies", "outputs")
+
+    def __init__(self, merged: dict):
+        self.merged = merged
+        self.vdd = frozenset(to_lower_set(merged["supplies"]["vdd"]))
+        self.vss = frozenset(to_lower_set(merged["supplies"]["vss"]))
+        self.supplies = self.vdd | self.vss
+        self.outputs = frozenset(to_lower_set(merged["outputs"]))
+
+def hints_key(hints: Optional[dict]) -> str:
+    """Canonical text of a hints payload (cache key)."""
+    return json.dumps(hints or {}, sort_keys=True, default=str)
+
+@lru_cache(maxsize=256)
+def _compile_hints(key: str, env_txt: str) -> CompiledHints:
+    return CompiledHints(merge_hints(json.loads(key), _parse_env_hints(env_txt), DEFAULT_HINTS))
+
+def compile_hints(hints: Any) -> CompiledHints:
+    """Request hints (dict/None, or already compiled) → cached CompiledHints."""
+    if isinstance(hints, CompiledHints):
+        return hints
+    return _compile_hints(hints_key(hints), os.environ.get("SUPPLY_ALIASES_JSON", "").strip())
+
 # ------------------ ngspice run + logs ------------------
 
 def tail_warnings(log_text: str) -> List[str]:
@@ -106,17 +137,3 @@ def tail_warnings(log_text: str) -> List[str]:
         if w not in seen:
             uniq.append(w); seen.add(w)
     return uniq[:20]
-
-def run_ngspice(cir_path: Path, log_path: Path, timeout_s: int = 20) -> int:
-    """
-    Run ngspice in batch; write stdout/stderr to log_path (handled by -o).
-    Returns process returncode.
-    """
-    proc = subprocess.run(
-        ["ngspice", "-b", "-o", str(log_path), str(cir_path)],
-        cwd=cir_path.parent,
-        text=True,
-        capture_output=False,
-        timeout=timeout_s
-    )
-    return proc.returncode
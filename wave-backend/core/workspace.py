@@ -0,0 +1,208 @@
+# core/workspace.py
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from uuid import uuid4
+
+from core.config import (KEEP_FAILED_RUNS, KEEP_RUNS, RUN_DIR_RE, WORK_DIR, WORK_MAX_AGE_S, WORK_MAX_MB,
+                         WORK_POOL, WORK_REAP_S, run_dir_name)
+
+# Run workspace: one dir per ngspice run under WORK_DIR = WORK_ROOT/work (point
+# WORK_ROOT at tmpfs, e.g. /dev/shm/logicsim, to keep tb.cir/sim.csv off the disk).
+#   acquire()  → fresh run dir (an emptied pooled dir renamed, else mkdir)
+#   release()  → just queues the dir; the reaper thread empties it and puts it
+#                back in the pool, so no rmtree happens on the response path
+# The reaper also scans WORK_DIR every WORK_REAP_S for leftovers (dirs of a
+# crashed process): older than WORK_MAX_AGE_S or beyond WORK_MAX_MB total
+# (oldest first) → removed. Only names made by run_dir_name() are candidates;
+# runs kept on request (KEEP_RUNS, KEEP_FAILED_RUNS) get a KEEP_MARKER file and
+# are never reaped.
+
+logger = logging.getLogger("logicsim.workspace")
+
+_POOL_PREFIX = ".pool-"
+KEEP_MARKER = ".keep"
+
+
+class Workspace:
+    def __init__(self, root: Path, pool_size: int, max_age_s: float, max_bytes: int,
+                 reap_s: float, keep_runs: bool = False, keep_failed: bool = False):
+        self.root = root
+        self.pool_size = max(0, pool_size)
+        self.max_age_s = max_age_s
+        self.max_bytes = max_bytes
+        self.reap_s = max(1.0, reap_s)
+        self.keep_runs = keep_runs
+        self.keep_failed = keep_failed
+        self._pool: Deque[Path] = deque()
+        self._live: Set[str] = set()
+        self._kept: Set[str] = set()  # kept this process (marker may still be pending)
+        self._trash: "queue.Queue[Tuple[Path, bool]]" = queue.Queue()  # (dir, keep)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._counts = {"created": 0, "reused": 0, "recycled": 0, "reaped": 0}
+
+    # ---------- run dirs ----------
+
+    def acquire(self, prefix: str = "run_") -> Path:
+        self._ensure_reaper()
+        d = self.root / run_dir_name(prefix)
+        with self._lock:
+            pooled = self._pool.pop() if self._pool else None
+            self._live.add(d.name)
+        if pooled is not None:
+            try:
+                os.rename(pooled, d)
+                self._count("reused")
+                return d
+            except OSError:
+                shutil.rmtree(pooled, ignore_errors=True)
+        d.mkdir(parents=True, exist_ok=True)
+        self._count("created")
+        return d
+
+    def release(self, d: Path, failed: bool = False) -> bool:
+        """
+        Hand a run dir back. Returns True when it is kept on disk (KEEP_RUNS,
+        or failed + KEEP_FAILED_RUNS; exempt from the reaper's retention).
+        """
+        keep = self.keep_runs or (failed and self.keep_failed)
+        with self._lock:
+            self._live.discard(d.name)
+            if keep:
+                self._kept.add(d.name)
+        self._ensure_reaper()
+        self._trash.put((d, keep))  # keep → the reaper thread writes the marker
+        return keep
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += n
+
+    # ---------- reaper ----------
+
+    def _ensure_reaper(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            for p in self.root.glob(_POOL_PREFIX + "*"):  # pool of a previous process
+                self._trash.put((p, False))
+            self._thread = threading.Thread(target=self._loop, name="workspace-reaper", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        next_scan = time.monotonic()
+        while True:
+            try:
+                d, keep = self._trash.get(timeout=max(0.0, next_scan - time.monotonic()))
+                if keep:
+                    (d / KEEP_MARKER).touch()
+                else:
+                    self._recycle(d)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                logger.warning("workspace recycle failed: %s", e)
+            if time.monotonic() >= next_scan:
+                try:
+                    self.reap()
+                except Exception as e:
+                    logger.warning("workspace reap failed: %s", e)
+                next_scan = time.monotonic() + self.reap_s
+
+    def _recycle(self, d: Path) -> None:
+        """Empty d; keep it for acquire() if the pool has room, else remove it."""
+        with self._lock:
+            room = len(self._pool) < self.pool_size
+        if not room:
+            shutil.rmtree(d, ignore_errors=True)
+            return
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.is_dir(follow_symlinks=False):
+                        shutil.rmtree(e.path, ignore_errors=True)
+                    else:
+                        os.unlink(e.path)
+            pooled = self.root / f"{_POOL_PREFIX}{uuid4().hex[:8]}"
+            os.rename(d, pooled)
+        except FileNotFoundError:
+            return
+        except OSError:
+            shutil.rmtree(d, ignore_errors=True)
+            return
+        with self._lock:
+            self._pool.append(pooled)
+            self._counts["recycled"] += 1
+
+    @staticmethod
+    def _dir_size(d: str) -> int:
+        total = 0
+        for base, _dirs, files in os.walk(d):
+            for f in files:
+                try:
+                    total += os.lstat(os.path.join(base, f)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def reap(self) -> int:
+        """Apply the age / size retention to finished, unkept run dirs. Returns dirs removed."""
+        if not self.root.exists():
+            return 0
+        with self._lock:
+            skip = self._live | self._kept
+        now = time.time()
+        dirs: List[Tuple[float, int, str]] = []
+        with os.scandir(self.root) as it:
+            for e in it:
+                if (not RUN_DIR_RE.match(e.name) or e.name in skip or not e.is_dir(follow_symlinks=False)
+                        or os.path.exists(os.path.join(e.path, KEEP_MARKER))):
+                    continue
+                try:
+                    mtime = e.stat(follow_symlinks=False).st_mtime
+                except OSError:
+                    continue
+                dirs.append((mtime, self._dir_size(e.path), e.path))
+        dirs.sort()
+        total = sum(size for _mt, size, _p in dirs)
+        removed = 0
+        for mtime, size, path in dirs:
+            too_old = self.max_age_s > 0 and now - mtime > self.max_age_s
+            if not too_old and total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        self._count("reaped", removed)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"root": str(self.root), "pool": len(self._pool), "live": len(self._live)}
+            out.update(self._counts)
+        out["pending"] = self._trash.qsize()
+        return out
+
+
+# Process-wide workspace used by the engine
+workspace = Workspace(
+    root=WORK_DIR,
+    pool_size=WORK_POOL,
+    max_age_s=WORK_MAX_AGE_S,
+    max_bytes=int(WORK_MAX_MB * 1024 * 1024),
+    reap_s=WORK_REAP_S,
+    keep_runs=KEEP_RUNS,
+    keep_failed=KEEP_FAILED_RUNS,
+)
@@ -0,0 +1,85 @@
+# decimate.py
+from __future__ import annotations
+
+from typing import Dict, List
+
+import numpy as np
+
+# Shape-preserving downsampling for plotting: per bucket keep the samples where
+# ANY vector hits its min or max, so edges / glitches / overshoot survive.
+# One shared index set → all vectors keep a common time axis.
+# With many vectors (2*k + 2 > max_points) that can't fit even one bucket, so
+# the extrema are taken of the envelope instead: per sample the max / min over
+# all vectors, each centred on its median and scaled to its own range first.
+
+MIN_POINTS = 16
+
+
+def minmax_indices(Y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Y: (n_vec, n) stacked vectors. Returns sorted sample indices (first and
+    last always included), at most max_points of them. Vectorized: the signal
+    is padded to equal-size buckets and argmin/argmax run over a 3-D view.
+    """
+    k, n = Y.shape
+    if n <= max_points:
+        return np.arange(n)
+    n_buckets = (max_points - 2) // (2 * max(k, 1))
+    if n_buckets < 1:
+        return _envelope_extrema(Y, max(1, (max_points - 2) // 2))
+    idx = _bucket_extrema(Y, n_buckets)
+    # vectors often peak at the same samples → fewer unique indices than the
+    # worst case; one more pass with proportionally more buckets fills the budget
+    if len(idx) < 0.75 * max_points:
+        more = _bucket_extrema(Y, int(n_buckets * (max_points - 2) / max(len(idx), 1)))
+        if len(more) <= max_points:
+            idx = more
+    return idx
+
+
+def _buckets(Y: np.ndarray, n_buckets: int):
+    """(B, offs): Y padded with its last sample and viewed as (k, n_buckets, size)."""
+    k, n = Y.shape
+    n_buckets = max(1, min(n_buckets, n))
+    size = -(-n // n_buckets)  # ceil
+    n_buckets = -(-n // size)
+    pad = n_buckets * size - n
+    if pad:
+        Y = np.concatenate([Y, np.repeat(Y[:, -1:], pad, axis=1)], axis=1)
+    return Y.reshape(k, n_buckets, size), np.arange(n_buckets) * size
+
+
+def _bucket_extrema(Y: np.ndarray, n_buckets: int) -> np.ndarray:
+    n = Y.shape[1]
+    B, offs = _buckets(Y, n_buckets)
+    idx = np.concatenate([
+        (B.argmin(axis=2) + offs[None, :]).ravel(),
+        (B.argmax(axis=2) + offs[None, :]).ravel(),
+        [0, n - 1],
+    ])
+    return np.unique(np.minimum(idx, n - 1))
+
+
+def _envelope_extrema(Y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Per bucket the argmin of the lower and the argmax of the upper envelope (<= 2 * n_buckets + 2 indices)."""
+    n = Y.shape[1]
+    span = np.ptp(Y, axis=1, keepdims=True)
+    Z = (Y - np.median(Y, axis=1, keepdims=True)) / np.where(span > 0, span, 1.0)
+    B, offs = _buckets(np.vstack([Z.min(axis=0), Z.max(axis=0)]), n_buckets)
+    idx = np.concatenate([B[0].argmin(axis=1) + offs, B[1].argmax(axis=1) + offs, [0, n - 1]])
+    return np.unique(np.minimum(idx, n - 1))
+
+
+def decimate_arrays(arrays: Dict[str, np.ndarray], vec_labels: List[str],
+                    max_points: int) -> Dict[str, np.ndarray]:
+    """{"time", label...} → same dict reduced to <= max_points samples (no-op if already smaller)."""
+    t = arrays["time"]
+    labels = [l for l in vec_labels if l in arrays]
+    if len(t) <= max_points or not labels:
+        return arrays
+    Y = np.vstack([np.asarray(arrays[l], dtype=np.float64) for l in labels])
+    idx = minmax_indices(Y, max_points)
+    out = {"time": np.asarray(t)[idx]}
+    for i, l in enumerate(labels):
+        out[l] = Y[i, idx]
+    return out
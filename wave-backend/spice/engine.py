@@ -0,0 +1,199 @@
+# engine.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from core.cache import OUT_PLACEHOLDER
+from core.config import NGSPICE_LIB, SIM_CONCURRENCY, SIM_DEBUG, SIM_ENGINE, SIM_TIMEOUT_S, SLOW_CONCURRENCY
+from core.scheduler import LANES, SimScheduler
+from core.workspace import workspace
+from spice.parse import parse_output_arrays
+from spice.run import run_ngspice_async
+from spice.shared import SharedEnginePool, find_libngspice
+
+ENGINES = ("subprocess", "shared")
+
+# per-run debug output (rendered tb.cir, ngspice rc), off unless SIM_DEBUG=1
+logger = logging.getLogger("logicsim.engine")
+if SIM_DEBUG:
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.StreamHandler())
+
+
+class SimError(Exception):
+    """A failed run: HTTP status, user-facing message, ngspice log and run dir (if any)."""
+
+    def __init__(self, error: str, status_code: int = 500, log: str = "",
+                 run_dir: Optional[Path] = None, details: Optional[Dict[str, Any]] = None):
+        super().__init__(error)
+        self.error = error
+        self.status_code = status_code
+        self.log = log
+        self.run_dir = run_dir
+        self.details = details or {}
+
+    def body(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"error": self.error, **self.details}
+        if self.run_dir is not None:
+            out["paths"] = {
+                "run_dir": str(self.run_dir),
+                "tb": str(self.run_dir / "tb.cir"),
+                "log": str(self.run_dir / "run.log"),
+            }
+        if self.log:
+            out["log"] = self.log
+        return out
+
+
+class SimRun:
+    """
+    A finished run. arrays = {"time": ndarray, "<label>": ndarray, ...}; for the
+    binary rawfile mode these are views into a memory map, so call cleanup()
+    only after the arrays have been consumed.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], log: str, engine: str,
+                 run_dir: Optional[Path] = None):
+        self.arrays = arrays
+        self.log = log
+        self.engine = engine
+        self.run_dir = run_dir
+
+    def cleanup(self) -> None:
+        self.arrays = {}  # drop mmap views first
+        if self.run_dir is not None:
+            workspace.release(self.run_dir)  # emptied by the reaper thread
+
+
+def _out_name(output: str) -> str:
+    return "sim.raw" if output == "binary" else "sim.csv"
+
+
+# ---------------- shared-library engine (lazy) ----------------
+
+_shared_pool: Optional[SharedEnginePool] = None
+_shared_disabled: Optional[str] = None
+
+
+def _get_shared_pool() -> Optional[SharedEnginePool]:
+    global _shared_pool, _shared_disabled
+    if _shared_pool is None and _shared_disabled is None:
+        lib = find_libngspice(NGSPICE_LIB)
+        if lib:
+            _shared_pool = SharedEnginePool(SIM_CONCURRENCY + SLOW_CONCURRENCY, lib)  # one worker per lane slot
+        else:
+            _shared_disabled = "libngspice not found"
+            logger.warning("shared engine disabled: %s; using subprocess", _shared_disabled)
+    return _shared_pool
+
+
+def engine_stats() -> Dict[str, Any]:
+    return {
+        "default": SIM_ENGINE,
+        "shared": _shared_pool.stats() if _shared_pool else {"disabled": _shared_disabled},
+    }
+
+
+async def _run_shared(pool: SharedEnginePool, tb_text: str, vec_labels: List[str],
+                      timeout_s: float) -> SimRun:
+    try:
+        res = await pool.run(tb_text, vec_labels, timeout_s)
+    except asyncio.TimeoutError:
+        raise SimError("ngspice timeout (reduce TSTOP or increase TSTEP)", 504)
+    except (EOFError, OSError) as e:  # worker died mid-run (it is replaced on next run)
+        raise SimError(f"ngspice (shared) worker crashed: {e}", 500)
+    if not res["ok"]:
+        raise SimError("ngspice (shared) run failed", 500, log=res["log"])
+    return SimRun(res["arrays"], res["log"], "shared")
+
+
+# ---------------- subprocess engine ----------------
+
+async def _run_subprocess(tb_text: str, vec_labels: List[str], output: str,
+                          timeout_s: float, prefix: str, check_rc: bool,
+                          scheduler: SimScheduler) -> SimRun:
+    run_dir = await run_in_threadpool(workspace.acquire, prefix=prefix)
+    out_path = run_dir / _out_name(output)
+    cir = run_dir / "tb.cir"
+    log = run_dir / "run.log"
+
+    def _failed(error: str, status_code: int, log_text: str = "") -> SimError:
+        # run dir (and its paths in the error body) only survive with KEEP_FAILED_RUNS
+        kept = workspace.release(run_dir, failed=True)
+        return SimError(error, status_code, log=log_text, run_dir=run_dir if kept else None)
+
+    def _write_tb() -> None:
+        text = tb_text.replace(OUT_PLACEHOLDER, str(out_path.resolve()))
+        logger.debug("rendered testbench %s:\n%s", cir, text)
+        cir.write_text(text)
+
+    def _read_log() -> str:
+        return log.read_text(errors="ignore") if log.exists() else ""
+
+    try:
+        await run_in_threadpool(_write_tb)
+        async with scheduler.slot():
+            ret = await run_ngspice_async(cir, log, timeout_s=timeout_s)
+            logger.debug("ngspice %s: return code %s", cir, ret)
+    except subprocess.TimeoutExpired:
+        raise _failed("ngspice timeout (reduce TSTOP or increase TSTEP)", 504)
+    except OSError as e:
+        raise _failed(f"spawn failed: {e}", 500)
+    except asyncio.CancelledError:
+        # caller went away (sweep cancelled, client gone): child already killed
+        workspace.release(run_dir)
+        raise
+
+    log_text = await run_in_threadpool(_read_log)
+    if check_rc and ret != 0:
+        raise _failed(f"ngspice exited with code {ret}", 500, log_text)
+    if not out_path.exists():
+        logger.debug("ngspice %s: no output file, log:\n%s", cir, log_text)
+        raise _failed("simulation failed (no CSV)", 500, log_text)
+
+    try:
+        arrays = await run_in_threadpool(parse_output_arrays, out_path, vec_labels)
+    except Exception as e:
+        raise _failed(f"parse failed: {e}", 500, log_text)
+    return SimRun(arrays, log_text, "subprocess", run_dir)
+
+
+# ---------------- public entry ----------------
+
+async def run_tb(tb_text: str,
+                 vec_labels: List[str],
+                 output: str = "ascii",
+                 timeout_s: float = SIM_TIMEOUT_S,
+                 prefix: str = "u_",
+                 engine: Optional[str] = None,
+                 check_rc: bool = True,
+                 lane: str = "fast") -> SimRun:
+    """
+    Execute a rendered testbench (output path = OUT_PLACEHOLDER) and return its
+    vectors. engine: "subprocess" (ngspice -b, default) or "shared" (libngspice
+    worker pool, vectors straight from memory). If the shared library can't be
+    loaded the run silently falls back to the subprocess engine.
+    lane: "fast" (default scheduler) or "slow" (core.scheduler.slow_scheduler).
+    Raises SimError on timeout / ngspice failure / unreadable output.
+    """
+    global _shared_disabled, _shared_pool
+    scheduler = LANES[lane]
+    engine = (engine or SIM_ENGINE).lower()
+    if engine == "shared":
+        pool = _get_shared_pool()
+        if pool is not None:
+            async with scheduler.slot():
+                try:
+                    return await _run_shared(pool, tb_text, vec_labels, timeout_s)
+                except RuntimeError as e:  # worker could not load/init libngspice
+                    _shared_disabled, _shared_pool = str(e), None
+                    pool.close()
+                    logger.warning("shared engine disabled: %s; using subprocess", e)
+    return await _run_subprocess(tb_text, vec_labels, output, timeout_s, prefix, check_rc, scheduler)
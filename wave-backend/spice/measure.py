@@ -0,0 +1,389 @@
+# spice/measure.py
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Timing / power measurements straight from the parsed column arrays
+# ({"time": ndarray, "v(NODE)": ndarray, ...}, see parse_output_arrays).
+# Threshold crossings are found with one vectorized pass per (vector, level)
+# and linearly interpolated between samples; edges are then paired with
+# searchsorted, so cost stays O(n) in the number of samples.
+#
+# Supply current: i(VDD_SRC) is the current INTO the + terminal of the supply
+# source, so the current delivered by the supply is its negative.
+
+SUPPLY_SRC = "VDD_SRC"
+SUPPLY_VEC = f"i({SUPPLY_SRC})"
+
+DEFAULT_LEVELS = {"delay": 0.5, "low": 0.1, "high": 0.9}  # fractions of VDD
+
+
+# ---------------- spec ----------------
+
+class MeasureSpec:
+    """
+    Validated 'measure' request field:
+      true | {
+        "delays": [{"from": "A", "to": "Y"}, ...],  # default: first input → first output
+        "nodes": ["Y", ...],          # rise/fall + overshoot; default: every "to" node
+        "supply": true,               # avg/peak supply current + energy (i(VDD_SRC))
+        "levels": {"delay": 0.5, "low": 0.1, "high": 0.9},   # fractions of VDD
+        "window": [t_start, t_end],   # optional, seconds
+        "waveforms": true             # false → metrics only (no time/waveforms)
+      }
+    Raises ValueError on malformed specs.
+    """
+
+    def __init__(self, spec: Any, default_pair: Tuple[Optional[str], Optional[str]]):
+        if spec is True:
+            spec = {}
+        if not isinstance(spec, dict):
+            raise ValueError("measure must be true or an object")
+
+        delays = spec.get("delays")
+        if delays is None:
+            src, dst = default_pair
+            delays = [{"from": src, "to": dst}] if src and dst else []
+        if not isinstance(delays, list):
+            raise ValueError("measure.delays must be a list of {from, to}")
+        self.delays: List[Tuple[str, str]] = []
+        for d in delays:
+            if not isinstance(d, dict) or not d.get("from") or not d.get("to"):
+                raise ValueError("measure.delays entries need 'from' and 'to' nodes")
+            self.delays.append((str(d["from"]), str(d["to"])))
+
+        nodes = spec.get("nodes")
+        if nodes is None:
+            nodes = [dst for _src, dst in self.delays]
+        if not isinstance(nodes, list):
+            raise ValueError("measure.nodes must be a list of node names")
+        self.nodes: List[str] = list(dict.fromkeys(str(n) for n in nodes))
+
+        self.supply = bool(spec.get("supply", True))
+        self.waveforms = bool(spec.get("waveforms", True))
+
+        levels = spec.get("levels") or {}
+        if not isinstance(levels, dict):
+            raise ValueError("measure.levels must be an object {low, high, delay}")
+        levels = {**DEFAULT_LEVELS, **levels}
+        try:
+            self.levels = {k: float(levels[k]) for k in DEFAULT_LEVELS}
+        except (TypeError, ValueError):
+            raise ValueError("measure.levels must be numbers (fractions of VDD)")
+        if not 0.0 < self.levels["low"] < self.levels["high"] < 1.0 or not 0.0 < self.levels["delay"] < 1.0:
+            raise ValueError("measure.levels must satisfy 0 < low < high < 1 and 0 < delay < 1")
+
+        window = spec.get("window")
+        self.window: Optional[Tuple[float, float]] = None
+        if window is not None:
+            try:
+                lo, hi = float(window[0]), float(window[1])
+            except (TypeError, ValueError, IndexError, KeyError):
+                raise ValueError("measure.window must be [t_start, t_end]")
+            if hi <= lo:
+                raise ValueError("measure.window end must be after start")
+            self.window = (lo, hi)
+
+        if not self.delays and not self.nodes and not self.supply:
+            raise ValueError("measure: nothing to measure (no delays, nodes or supply)")
+
+    def node_names(self) -> List[str]:
+        """Nodes whose voltages must be saved, in first-use order."""
+        names = [n for pair in self.delays for n in pair] + self.nodes
+        return list(dict.fromkeys(names))
+
+    def key(self) -> Dict[str, Any]:
+        """JSON-able echo of the effective spec (goes into meta)."""
+        return {
+            "delays": [{"from": a, "to": b} for a, b in self.delays],
+            "nodes": self.nodes,
+            "supply": self.supply,
+            "levels": self.levels,
+            "window": list(self.window) if self.window else None,
+        }
+
+
+# ---------------- primitives ----------------
+
+def crossings(t: np.ndarray, y: np.ndarray, level: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    All crossings of `level`: (times, rising) with times linearly interpolated.
+    A sample sitting exactly on the level counts as above it.
+    """
+    above = y >= level
+    i = np.flatnonzero(above[1:] != above[:-1])
+    if i.size == 0:
+        return np.empty(0), np.empty(0, dtype=bool)
+    y0, y1 = y[i], y[i + 1]
+    frac = (level - y0) / (y1 - y0)
+    return t[i] + frac * (t[i + 1] - t[i]), y1 > y0
+
+
+def _mean(x: np.ndarray) -> Optional[float]:
+    return float(x.mean()) if x.size else None
+
+
+def _edge_delays(t_in: np.ndarray, t_out: np.ndarray) -> np.ndarray:
+    """For each output edge, time since the latest input edge before it (NaN if none)."""
+    k = np.searchsorted(t_in, t_out, side="right") - 1
+    d = np.full(t_out.shape, np.nan)
+    ok = k >= 0
+    d[ok] = t_out[ok] - t_in[k[ok]]
+    return d
+
+
+def _transitions(t: np.ndarray, y: np.ndarray, lo: float, hi: float) -> Dict[str, Optional[float]]:
+    """Mean rise (lo→hi) and fall (hi→lo) times over complete edges."""
+    out: Dict[str, Optional[float]] = {}
+    t_lo, r_lo = crossings(t, y, lo)
+    t_hi, r_hi = crossings(t, y, hi)
+    for name, start_t, end_t in (
+        ("rise", t_lo[r_lo], t_hi[r_hi]),         # leaves lo going up, reaches hi
+        ("fall", t_hi[~r_hi], t_lo[~r_lo]),       # leaves hi going down, reaches lo
+    ):
+        k = np.searchsorted(start_t, end_t, side="right") - 1
+        ok = k >= 0
+        # one start per end: a start reused by a later end is a glitch, not an edge
+        ok[1:] &= k[1:] != k[:-1]
+        out[name] = _mean(end_t[ok] - start_t[k[ok]])
+        out[f"n_{name}"] = int(ok.sum())
+    return out
+
+
+# ---------------- public entry ----------------
+
+def measure_arrays(arrays: Dict[str, np.ndarray], spec: MeasureSpec, vdd: float,
+                   vss: float = 0.0) -> Dict[str, Any]:
+    """
+    Column arrays (+ supply level) → metrics dict:
+      delays: [{from, to, tpLH, tpHL, tpd, n_rise, n_fall}]   (seconds, means over edges)
+      nodes:  {NODE: {rise, fall, n_rise, n_fall, overshoot, undershoot, vmax, vmin}}
+      supply: {i_avg, i_peak, energy, energy_per_transition, duration}
+    Missing vectors give {"error": ...} entries instead of raising.
+    """
+    t = np.asarray(arrays["time"], dtype=np.float64)
+    sel = slice(None)
+    if spec.window is not None:
+        lo_i, hi_i = np.searchsorted(t, spec.window, side="left")
+        sel = slice(lo_i, max(lo_i, hi_i))
+        t = t[sel]
+
+    def vec(node: str) -> Optional[np.ndarray]:
+        a = arrays.get(f"v({node})")
+        return None if a is None else np.asarray(a, dtype=np.float64)[sel]
+
+    swing = vdd - vss
+    level = {k: vss + f * swing for k, f in spec.levels.items()}
+    out: Dict[str, Any] = {}
+    n_out_edges = 0
+
+    delays: List[Dict[str, Any]] = []
+    for src, dst in spec.delays:
+        a, b = vec(src), vec(dst)
+        if a is None or b is None or t.size < 2:
+            delays.append({"from": src, "to": dst, "error": "vector not available"})
+            continue
+        t_in, _r_in = crossings(t, a, level["delay"])
+        t_out, r_out = crossings(t, b, level["delay"])
+        d = _edge_delays(t_in, t_out)
+        ok = ~np.isnan(d)
+        lh, hl = d[ok & r_out], d[ok & ~r_out]
+        both = [x for x in (_mean(lh), _mean(hl)) if x is not None]
+        delays.append({
+            "from": src, "to": dst,
+            "tpLH": _mean(lh), "tpHL": _mean(hl),
+            "tpd": sum(both) / len(both) if both else None,
+            "n_rise": int(lh.size), "n_fall": int(hl.size),
+        })
+    if spec.delays:
+        out["delays"] = delays
+
+    nodes: Dict[str, Any] = {}
+    for node in spec.nodes:
+        y = vec(node)
+        if y is None or y.size < 2:
+            nodes[node] = {"error": "vector not available"}
+            continue
+        vmax, vmin = float(y.max()), float(y.min())
+        m = _transitions(t, y, level["low"], level["high"])
+        n_out_edges += crossings(t, y, level["delay"])[0].size
+        m.update({
+            "vmax": vmax, "vmin": vmin,
+            "overshoot": max(0.0, vmax - vdd),
+            "undershoot": max(0.0, vss - vmin),
+            "overshoot_pct": max(0.0, vmax - vdd) / swing * 100 if swing else None,
+            "undershoot_pct": max(0.0, vss - vmin) / swing * 100 if swing else None,
+        })
+        nodes[node] = m
+    if spec.nodes:
+        out["nodes"] = nodes
+
+    if spec.supply:
+        i_src = arrays.get(SUPPLY_VEC)
+        if i_src is None or t.size < 2:
+            out["supply"] = {"error": f"{SUPPLY_VEC} not available (testbench has no {SUPPLY_SRC} source)"}
+        else:
+            i_sup = -np.asarray(i_src, dtype=np.float64)[sel]
+            duration = float(t[-1] - t[0])
+            charge = float(np.sum((i_sup[1:] + i_sup[:-1]) * np.diff(t)) / 2)  # trapezoid
+            energy = charge * vdd
+            out["supply"] = {
+                "i_avg": charge / duration if duration > 0 else None,
+                "i_peak": float(np.abs(i_sup).max()),
+                "energy": energy,
+                "energy_per_transition": energy / n_out_edges if n_out_edges else None,
+                "duration": duration,
+            }
+    return out
+
+
+# ---------------- truth table (see spice.tb.truth_table_sources) ----------------
+
+# functions recognised by name; everything else is reported as a minimized SOP
+_NAMED = {
+    "AND": lambda bits: all(bits),
+    "NAND": lambda bits: not all(bits),
+    "OR": lambda bits: any(bits),
+    "NOR": lambda bits: not any(bits),
+    "XOR": lambda bits: sum(bits) % 2 == 1,
+    "XNOR": lambda bits: sum(bits) % 2 == 0,
+}
+SOP_MAX_INPUTS = 8  # Quine-McCluskey above this gets slow; minterms are still listed
+
+
+def _code_bits(code: int, n: int) -> List[int]:
+    """MSB first: bit n-1 belongs to the first input."""
+    return [(code >> (n - 1 - k)) & 1 for k in range(n)]
+
+
+def _prime_implicants(minterms: List[int], n: int) -> List[Tuple[int, int]]:
+    """Quine-McCluskey: minterms → prime implicants as (value, dont_care_mask)."""
+    terms = {(m, 0) for m in minterms}
+    primes = set()
+    while terms:
+        merged, used = set(), set()
+        by_mask: Dict[int, List[Tuple[int, int]]] = {}
+        for t in terms:
+            by_mask.setdefault(t[1], []).append(t)
+        for mask, group in by_mask.items():
+            values = {v for v, _m in group}
+            for v in values:
+                for b in range(n):
+                    bit = 1 << b
+                    if mask & bit or v & bit or (v | bit) not in values:
+                        continue
+                    merged.add((v, mask | bit))
+                    used.add((v, mask))
+                    used.add((v | bit, mask))
+        primes |= terms - used
+        terms = merged
+    return sorted(primes)
+
+
+def _cover(primes: List[Tuple[int, int]], minterms: List[int]) -> List[Tuple[int, int]]:
+    """Essential primes first, then greedy largest cover."""
+    def covers(p: Tuple[int, int], m: int) -> bool:
+        return (m & ~p[1]) == p[0]
+
+    left, chosen = set(minterms), []
+    for m in minterms:
+        cands = [p for p in primes if covers(p, m)]
+        if len(cands) == 1 and cands[0] not in chosen:
+            chosen.append(cands[0])
+    for p in chosen:
+        left -= {m for m in left if covers(p, m)}
+    while left:
+        best = max(primes, key=lambda p: (sum(covers(p, m) for m in left), bin(p[1]).count("1")))
+        chosen.append(best)
+        left -= {m for m in left if covers(best, m)}
+    return chosen
+
+
+def _sop(minterms: List[int], names: List[str]) -> str:
+    n = len(names)
+    if not minterms:
+        return "0"
+    if len(minterms) == 1 << n:
+        return "1"
+    products = []
+    for value, mask in _cover(_prime_implicants(minterms, n), minterms):
+        lits = [("" if (value >> (n - 1 - k)) & 1 else "~") + name
+                for k, name in enumerate(names) if not (mask >> (n - 1 - k)) & 1]
+        products.append(" & ".join(lits))
+    return " | ".join(products) if len(products) > 1 else products[0]
+
+
+def infer_function(column: List[Optional[int]], names: List[str]) -> Dict[str, Any]:
+    """
+    Output bits indexed by input code (None = not settled) → {"name", "expr",
+    "minterms", "hex", "unsettled"}. name is e.g. "NAND2", "INV", "BUF",
+    "CONST0", or None when the function has no common name.
+    """
+    n = len(names)
+    unsettled = [c for c, b in enumerate(column) if b is None]
+    out: Dict[str, Any] = {"name": None, "expr": None, "unsettled": unsettled}
+    if unsettled:
+        return out
+    minterms = [c for c, b in enumerate(column) if b]
+    out["minterms"] = minterms
+    out["hex"] = format(sum(1 << c for c in minterms), "x")
+
+    if not minterms or len(minterms) == len(column):
+        out["name"] = "CONST1" if minterms else "CONST0"
+    elif n == 1:
+        out["name"] = "BUF" if minterms == [1] else "INV"
+    else:
+        for name, fn in _NAMED.items():
+            if all(bool(b) == fn(_code_bits(c, n)) for c, b in enumerate(column)):
+                out["name"] = f"{name}{n}"
+                break
+    if n <= SOP_MAX_INPUTS:
+        out["expr"] = _sop(minterms, names)
+    return out
+
+
+def truth_table(arrays: Dict[str, np.ndarray], inputs: List[str], outputs: List[str],
+                codes: List[int], slot: float, vdd: float, vss: float = 0.0,
+                at: float = 0.9) -> Dict[str, Any]:
+    """
+    Settled output levels of a truth-table run: each code k is held during
+    [k*slot, (k+1)*slot) and sampled at (k + at) * slot. A level within 10%
+    of a rail is a 0/1, anything between is unsettled (None).
+    Rows are returned in code order (000, 001, ...), whatever the walk order.
+    """
+    t = np.asarray(arrays["time"], dtype=np.float64)
+    n = len(inputs)
+    ts = (np.arange(len(codes)) + at) * slot
+    order = np.argsort(codes)
+    swing = vdd - vss
+    lo, hi, mid = vss + 0.1 * swing, vdd - 0.1 * swing, vss + 0.5 * swing
+
+    volts: Dict[str, np.ndarray] = {}
+    columns: Dict[str, List[Optional[int]]] = {}
+    for node in outputs:
+        y = arrays.get(f"v({node})")
+        if y is None:
+            continue
+        v = np.interp(ts, t, np.asarray(y, dtype=np.float64))[order]
+        volts[node] = v
+        settled = (v <= lo) | (v >= hi)
+        columns[node] = [int(b) if ok else None for b, ok in zip((v >= mid).tolist(), settled.tolist())]
+
+    sorted_codes = [codes[i] for i in order]
+    rows = []
+    for r, code in enumerate(sorted_codes):
+        rows.append({
+            "code": code,
+            "inputs": dict(zip(inputs, _code_bits(code, n))),
+            "outputs": {node: col[r] for node, col in columns.items()},
+            "v": {node: float(v[r]) for node, v in volts.items()},
+        })
+    return {
+        "inputs": inputs,
+        "outputs": list(columns),
+        "slot": slot,
+        "rows": rows,
+        "functions": {node: infer_function(col, inputs) for node, col in columns.items()},
+    }
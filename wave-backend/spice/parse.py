@@ -1,10 +1,17 @@
 # parse.py
+import hashlib
 import re
+import threading
+import warnings
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 
-from core.config import DEFAULT_HINTS, DEFAULT_PARAM_DEFAULTS
-from core.utils import merge_hints, load_env_hints, to_lower_set
+import numpy as np
+
+from core.config import DEFAULT_PARAM_DEFAULTS
+from core.utils import CompiledHints, compile_hints, hints_key
+from spice.rawfile import is_rawfile, parse_raw_arrays
 
 
 # --------- Regex ---------
@@ -12,7 +19,7 @@ SUBCKT_RE = re.compile(r"^\s*\.subckt\s+(\S+)\s+(.+)$", re.IGNORECASE)
 
 
 # ---- split pins vs params; support commas; use supply hints if no 'params:' ----
-def _split_pins_params(rest: str, merged_hints: dict):
+def _split_pins_params(rest: str, hints: CompiledHints):
     """
     Return (pins:list[str], params:list[str]) from the '.subckt ...' tail.
     - Split on commas OR whitespace, strip trailing commas/parentheses.
@@ -37,10 +44,6 @@ def _split_pins_params(rest: str, merged_hints: dict):
         pin_tokens = toks
         param_tokens = []
 
-    # helper sets
-    vdd_alias = to_lower_set(merged_hints["supplies"]["vdd"])
-    vss_alias = to_lower_set(merged_hints["supplies"]["vss"])
-
     # remove k=v from pin candidates, bucket them into params
     pin_clean = []
     for t in pin_tokens:
@@ -53,8 +56,7 @@ def _split_pins_params(rest: str, merged_hints: dict):
     if not param_tokens:
         last_supply_idx = -1
         for idx, t in enumerate(pin_clean):
-            tl = t.lower()
-            if tl in vdd_alias or tl in vss_alias:
+            if t.lower() in hints.supplies:
                 last_supply_idx = idx
         if last_supply_idx >= 0 and last_supply_idx < len(pin_clean) - 1:
             # move trailing tokens after last supply to params
@@ -80,19 +82,294 @@ def _split_pins_params(rest: str, merged_hints: dict):
     return pins_out, params_out
 
 
+# ---- single pass: subckt index + pin/param split + normalized text ----
+class NetlistAnalysis:
+    """
+    Result of analyze_netlist(). Read-only (shared through the memo):
+      subckts    [{"name", "pins", "params"}] in file order
+      normalized text with .SUBCKT headers rewritten to PARAMS: form
+    """
+    __slots__ = ("subckts", "normalized")
+
+    def __init__(self, subckts: List[Dict[str, Any]], normalized: str):
+        self.subckts = subckts
+        self.normalized = normalized
+
+    def index(self) -> List[Dict[str, Any]]:
+        """[{name, pins}] copies (the /analyze shape)."""
+        return [{"name": s["name"], "pins": list(s["pins"])} for s in self.subckts]
+
+
+def _normalized_header(line: str, name: str, rest: str, pins: List[str], params: List[str]) -> str:
+    # already explicit PARAMS: → keep original
+    if " params:" in rest.lower():
+        return line
+    # inject PARAMS: defaults
+    if params:
+        defaults = [f"{p}={DEFAULT_PARAM_DEFAULTS.get(p.upper(), '0')}" for p in params]
+        return f".SUBCKT {name} {' '.join(pins)} PARAMS: {' '.join(defaults)}"
+    return f".SUBCKT {name} {' '.join(pins)}"
+
+
+def scan_subckt_line(line: str, hints: CompiledHints) -> Optional[Tuple[Dict[str, Any], str]]:
+    """
+    One physical line → ({"name", "pins", "params"}, normalized header) if it
+    is a .subckt header, else None. Shared by analyze_netlist and streaming uploads.
+    """
+    # cheap pre-filter before the regex (most lines are devices/models)
+    if line.lstrip()[:7].lower() != ".subckt":
+        return None
+    m = SUBCKT_RE.match(line)
+    if not m:
+        return None
+    name = m.group(1)
+    rest = m.group(2).strip()
+    pins, params = _split_pins_params(rest, hints)
+    return {"name": name, "pins": pins, "params": params}, _normalized_header(line, name, rest, pins, params)
+
+
+def _analyze(text: str, hints: CompiledHints) -> NetlistAnalysis:
+    subckts: List[Dict[str, Any]] = []
+    out_lines = text.splitlines()
+    for i, line in enumerate(out_lines):
+        hit = scan_subckt_line(line, hints)
+        if hit is not None:
+            subckts.append(hit[0])
+            out_lines[i] = hit[1]
+    return NetlistAnalysis(subckts, "\n".join(out_lines))
+
+
+class _Memo:
+    """Tiny thread-safe LRU for per-netlist results (keys include a content hash)."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._d: "OrderedDict[Tuple[str, ...], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, ...]) -> Any:
+        with self._lock:
+            hit = self._d.get(key)
+            if hit is not None:
+                self._d.move_to_end(key)
+            return hit
+
+    def put(self, key: Tuple[str, ...], value: Any) -> Any:
+        with self._lock:
+            self._d[key] = value
+            while len(self._d) > self.size:
+                self._d.popitem(last=False)
+        return value
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+_analysis_memo = _Memo(32)
+
+
+def analyze_netlist(text: str, hints: Any = None) -> NetlistAnalysis:
+    """
+    Parse a netlist once: subckt index, pin/param split and normalized text in
+    one scan. Memoized (LRU) by sha256 of the text + canonical hints, so every
+    render of the same netlist in a request / sweep / session reuses it.
+    """
+    ch = compile_hints(hints)
+    key = (_text_hash(text), hints_key(ch.merged))
+    hit = _analysis_memo.get(key)
+    if hit is not None:
+        return hit
+    return _analysis_memo.put(key, _analyze(text, ch))
+
+
+# ---- hierarchy index + reachability pruning ----
+class NetlistIndex:
+    """
+    Structure of a netlist, by physical line ranges [start, end):
+      subckts  name(lower) → range of the whole .subckt … .ends block (nested
+               definitions stay inside their parent)
+      models   name(lower) → ranges of top-level .model cards (binned names
+               like 'nch.1' are also filed under 'nch')
+      refs     subckt name → (subckt names, model names) used in its body
+      top_refs (subckt names, model names) used by top-level lines
+    '+' continuation lines belong to the card they continue.
+    """
+    __slots__ = ("lines", "subckts", "models", "refs", "top_refs")
+
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        self.subckts: Dict[str, Tuple[int, int]] = {}
+        self.models: Dict[str, List[Tuple[int, int]]] = {}
+        self.refs: Dict[str, Tuple[set, set]] = {}
+        self.top_refs: Tuple[set, set] = (set(), set())
+
+    def reachable(self, top: str) -> Tuple[set, set]:
+        """(subckts, models) reachable from subckt `top` plus the top-level lines."""
+        subs: set = set()
+        models = set(self.top_refs[1])
+        todo = [top.lower(), *self.top_refs[0]]
+        while todo:
+            name = todo.pop()
+            if name in subs or name not in self.subckts:
+                continue
+            subs.add(name)
+            sub_refs, model_refs = self.refs.get(name, (set(), set()))
+            models |= model_refs
+            todo.extend(sub_refs - subs)
+        return subs, models
+
+
+def _cards(lines: List[str]) -> List[Tuple[int, int, str]]:
+    """
+    Physical lines → logical cards (start, end, joined text). '+' lines are
+    folded into the last real card: '*' comment and blank lines in between
+    stay separate cards (inside that card's line range).
+    """
+    cards: List[Tuple[int, int, str]] = []
+    last = -1  # index in cards of the last non-comment card
+    for i, ln in enumerate(lines):
+        st = ln.lstrip()
+        if st.startswith("+") and last >= 0:
+            s0, _e, txt = cards[last]
+            cards[last] = (s0, i + 1, txt + " " + st[1:])
+        else:
+            if st and not st.startswith("*"):
+                last = len(cards)
+            cards.append((i, i + 1, st))
+    return cards
+
+
+_SEP = str.maketrans(",()", "   ")
+
+
+def _strip_inline_comment(card: str) -> str:
+    for mark in (" ;", " $", "\t;", "\t$"):
+        cut = card.find(mark)
+        if cut >= 0:
+            card = card[:cut]
+    return card
+
+
+def _tokens(text: str) -> set:
+    # lower-cased words, split on whitespace/commas/parens; k=v tokens are params
+    return {t for t in text.lower().translate(_SEP).split() if "=" not in t}
+
+
+def index_netlist(text: str) -> NetlistIndex:
+    lines = text.splitlines()
+    idx = NetlistIndex(lines)
+    cards = _cards(lines)
+
+    # pass 1: structure (subckt blocks, top-level models)
+    owner: List[Optional[str]] = []  # per card: enclosing top-level subckt (None = top level)
+    depth, current, start, in_lib = 0, None, 0, False
+    for s0, e0, card in cards:
+        if in_lib:  # .lib section … .endl: kept verbatim, not indexed
+            owner.append(None)
+            in_lib = not card[:5].lower() == ".endl"
+            continue
+        if card[:1] != ".":
+            owner.append(current)
+            continue
+        low = card.lower()
+        if low.startswith(".subckt"):
+            toks = low.split()
+            if depth == 0 and len(toks) > 1:
+                current, start = toks[1], s0
+            depth += 1
+            owner.append(current)
+            continue
+        if low.startswith(".ends") and depth > 0:
+            depth -= 1
+            owner.append(current)
+            if depth == 0 and current is not None:
+                idx.subckts.setdefault(current, (start, e0))
+                current = None
+            continue
+        owner.append(current)
+        if depth == 0:
+            if low.startswith(".lib ") and len(low.split()) == 2:
+                in_lib = True
+            elif low.startswith(".model"):
+                toks = low.split()
+                if len(toks) > 1:
+                    name = toks[1]
+                    idx.models.setdefault(name, []).append((s0, e0))
+                    base, _, suffix = name.partition(".")
+                    if suffix.isdigit():
+                        idx.models.setdefault(base, []).append((s0, e0))
+    if depth:  # unterminated .subckt → don't prune anything
+        idx.subckts.clear()
+        return idx
+
+    # pass 2: references, one token set per owner
+    # (X cards → subckt names, any device card → model names)
+    devices: Dict[Optional[str], List[str]] = {}
+    xcards: Dict[Optional[str], List[str]] = {}
+    for (_s, _e, card), own in zip(cards, owner):
+        c0 = card[:1]
+        if not c0 or c0 in "*.+":
+            continue
+        if ";" in card or "$" in card:
+            card = _strip_inline_comment(card)
+        devices.setdefault(own, []).append(card)
+        if c0 in "xX":
+            xcards.setdefault(own, []).append(card)
+    sub_names, model_names = idx.subckts.keys(), idx.models.keys()
+    for own, body in devices.items():
+        refs = (_tokens(" ".join(xcards.get(own, []))) & sub_names,
+                _tokens(" ".join(body)) & model_names)
+        if own is None:
+            idx.top_refs = refs
+        else:
+            idx.refs[own] = refs
+    return idx
+
+
+_prune_memo = _Memo(32)
+
+
+def prune_netlist(text: str, top: str) -> str:
+    """
+    Keep only what subckt `top` needs: its .subckt block, the subckts and
+    top-level .model cards reachable through X instances / device model names,
+    and every other top-level line (.param, .include, .lib, .global, …).
+    Unknown top or an unparsable hierarchy → text unchanged. Memoized.
+    """
+    key = (_text_hash(text), top.lower())
+    hit = _prune_memo.get(key)
+    if hit is not None:
+        return hit
+
+    idx = index_netlist(text)
+    if top.lower() not in idx.subckts:
+        return _prune_memo.put(key, text)
+    subs, models = idx.reachable(top)
+
+    drop = bytearray(len(idx.lines))
+    for name, (a, b) in idx.subckts.items():
+        if name not in subs:
+            drop[a:b] = b"\1" * (b - a)
+    kept_ranges = {r for m in models for r in idx.models.get(m, [])}
+    for ranges in idx.models.values():
+        for a, b in ranges:
+            if (a, b) not in kept_ranges:
+                drop[a:b] = b"\1" * (b - a)
+    if not any(drop):
+        return _prune_memo.put(key, text)
+
+    all_models = {r for ranges in idx.models.values() for r in ranges}
+    out = [f"* pruned for {top}: {len(subs)}/{len(idx.subckts)} subckts, "
+           f"{len(kept_ranges)}/{len(all_models)} models"]
+    out.extend(ln for ln, d in zip(idx.lines, drop) if not d)
+    return _prune_memo.put(key, "\n".join(out))
+
+
 # ---- scan .subckt lines from netlist text ----
 def parse_subckts_from_text(text: str, hints: Optional[dict] = None):
     """Return list of {name, pins[]} found in a netlist text."""
-    subckts = []
-    merged = merge_hints(hints, load_env_hints(), DEFAULT_HINTS)
-    for line in text.splitlines():
-        m = SUBCKT_RE.match(line)
-        if m:
-            name = m.group(1)
-            rest = m.group(2).strip()
-            pins, _params = _split_pins_params(rest, merged)
-            subckts.append({"name": name, "pins": pins})
-    return subckts
+    return analyze_netlist(text, hints).index()
 
 
 # ---- guess roles (output / inputs / supplies) from pins ----
@@ -101,63 +378,173 @@ def guess_roles(pins: List[str], hints: Optional[dict] = None):
     Heuristic using provided hints (request/env) with fallback to defaults.
     Returns: {"output": str, "inputs": [..], "vdd": str, "vss": str}
     """
-    hints_final = merge_hints(hints, load_env_hints(), DEFAULT_HINTS)
-    vdd_alias = to_lower_set(hints_final["supplies"]["vdd"])
-    vss_alias = to_lower_set(hints_final["supplies"]["vss"])
-    out_alias = to_lower_set(hints_final["outputs"])
+    ch = compile_hints(hints)
 
-    vdd = next((p for p in pins if p.lower() in vdd_alias), None)
-    vss = next((p for p in pins if p.lower() in vss_alias), None)
+    vdd = next((p for p in pins if p.lower() in ch.vdd), None)
+    vss = next((p for p in pins if p.lower() in ch.vss), None)
 
-    out_pin = next((p for p in pins if p.lower() in out_alias), None)
+    out_pin = next((p for p in pins if p.lower() in ch.outputs), None)
     if not out_pin:
         # first non-supply as output fallback
-        non_supply = [p for p in pins if p.lower() not in (vdd_alias | vss_alias)]
+        non_supply = [p for p in pins if p.lower() not in ch.supplies]
         out_pin = non_supply[0] if non_supply else (pins[0] if pins else "Y")
 
-    inputs = [p for p in pins if p != out_pin and p.lower() not in (vdd_alias | vss_alias)]
+    inputs = [p for p in pins if p != out_pin and p.lower() not in ch.supplies]
     return {"output": out_pin, "inputs": inputs, "vdd": vdd or "VDD", "vss": vss or "0"}
 
 
 # ---- rewrite .SUBCKT headers to add PARAMS: so ngspice doesn't treat params as pins ----
 def normalize_netlist_subckt_params(netlist_text: str, hints: Optional[dict] = None) -> str:
-    merged = merge_hints(hints, load_env_hints(), DEFAULT_HINTS)
-    out_lines = []
-    for line in netlist_text.splitlines():
-        m = SUBCKT_RE.match(line)
-        if not m:
-            out_lines.append(line)
-            continue
+    return analyze_netlist(netlist_text, hints).normalized
 
-        name = m.group(1)
-        rest = m.group(2).strip()
-        pins, params = _split_pins_params(rest, merged)
 
-        # already explicit PARAMS: → keep original
-        if " params:" in rest.lower():
-            out_lines.append(line)
-            continue
+# ===================== wrdata parsing =====================
 
-        # inject PARAMS: defaults
-        if params:
-            defaults = []
-            for p in params:
-                pv = DEFAULT_PARAM_DEFAULTS.get(p.upper(), "0")
-                defaults.append(f"{p}={pv}")
-            new_line = f".SUBCKT {name} {' '.join(pins)} PARAMS: {' '.join(defaults)}"
-        else:
-            new_line = f".SUBCKT {name} {' '.join(pins)}"
+def _is_float_row(tokens: List[str]) -> bool:
+    try:
+        for x in tokens:
+            float(x)
+        return True
+    except ValueError:
+        return False
 
-        out_lines.append(new_line)
 
-    return "\n".join(out_lines)
+def _load_numeric_block(csv_path: Path) -> Tuple[Optional[List[str]], List[str], np.ndarray]:
+    """
+    Fast path: load the whole wrdata block with ONE np.loadtxt call (C reader).
+    Returns (header_tokens or None, first_row_tokens, float64 array [rows, cols]).
+    Raises ValueError on anything irregular (ragged/garbage rows) so callers
+    can fall back to the line-by-line parser.
+    """
+    header: Optional[List[str]] = None
+    first_tokens: List[str] = []
+    skip = 0
+    with csv_path.open() as f:
+        for ln in f:
+            toks = ln.split()
+            if not toks:
+                skip += 1
+                continue
+            if header is None and not first_tokens and not _is_float_row(toks):
+                header = toks
+                skip += 1
+                continue
+            first_tokens = toks
+            break
+    if not first_tokens:
+        raise ValueError("no numeric data rows")
 
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # empty-file warnings → handled below
+        block = np.loadtxt(csv_path, dtype=np.float64, skiprows=skip, ndmin=2, comments=None)
+    if block.shape[1] != len(first_tokens):
+        raise ValueError("malformed wrdata (ragged rows)")
+    return header, first_tokens, block
+
+
+def _data_columns(first_tokens: List[str], n_vec: int) -> Tuple[int, int]:
+    """Same Index/no-Index inference as parse_wrdata_ordered → (idx_time, start_data)."""
+    ncol = len(first_tokens)
+    if ncol == n_vec + 2:
+        return 1, 2
+    if ncol == n_vec + 1:
+        return 0, 1
+    # fallback heuristic: first tok int & second float → index present
+    try:
+        int(first_tokens[0])
+        float(first_tokens[1])
+        return 1, 2
+    except (ValueError, IndexError):
+        return 0, 1
+
+
+def parse_wrdata_arrays(csv_path: Path, vec_labels: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Vectorized parse_wrdata_ordered: returns float64 column arrays
+    {"time": ndarray, "<label>": ndarray, ...}. Falls back to the line-by-line
+    parser only when the numeric block is malformed.
+    """
+    try:
+        _header, first_tokens, block = _load_numeric_block(csv_path)
+    except ValueError:
+        slow = _parse_wrdata_ordered_lines(csv_path, vec_labels)
+        return {k: np.asarray(v, dtype=np.float64) for k, v in slow.items()}
+
+    idx_time, start_data = _data_columns(first_tokens, len(vec_labels))
+    if block.shape[1] < start_data + len(vec_labels):
+        raise ValueError("no numeric rows parsed")
+    out: Dict[str, np.ndarray] = {"time": block[:, idx_time]}
+    for i, lbl in enumerate(vec_labels):
+        out[lbl] = block[:, start_data + i]
+    return out
+
+
+def parse_output_arrays(out_path: Path, vec_labels: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Parse whatever the testbench produced: binary rawfile ('write', memory-mapped,
+    zero-copy column views) or wrdata ASCII. Dispatch is on file content, so
+    templates that still hard-code wrdata keep working.
+    """
+    if is_rawfile(out_path):
+        return parse_raw_arrays(out_path, vec_labels)
+    return parse_wrdata_arrays(out_path, vec_labels)
+
+
+def split_batch_arrays(arrays: Dict[str, np.ndarray], n_points: int) -> List[Dict[str, np.ndarray]]:
+    """
+    Cut the combined output of a batched testbench (appendwrite, one block per
+    sweep point) back into per-point arrays. Blocks are found where time resets,
+    so a count mismatch means some point failed → ValueError.
+    """
+    t = arrays["time"]
+    cuts = np.flatnonzero(np.diff(t) < 0) + 1
+    if len(cuts) != n_points - 1:
+        raise ValueError(f"batch output has {len(cuts) + 1} blocks, expected {n_points}")
+    bounds = [0] + cuts.tolist() + [len(t)]
+    return [{k: v[a:b] for k, v in arrays.items()} for a, b in zip(bounds[:-1], bounds[1:])]
 
-# ===================== wrdata parsing =====================
 
 def parse_csv(csv_path: Path) -> Dict[str, List[float]]:
     """
-    Legacy helper: Parse ngspice 'wrdata' ASCII (whitespace-delimited) for fixed vectors v(a), v(y).
+    Legacy helper (fixed v(a), v(y)). Vectorized load first; the line-by-line
+    parser below is only used when the file has malformed rows.
+    """
+    if is_rawfile(csv_path):
+        raw = parse_raw_arrays(csv_path, ["v(a)", "v(y)"])
+        return {k: v.tolist() for k, v in raw.items()}
+    try:
+        header, _first, block = _load_numeric_block(csv_path)
+    except ValueError:
+        return _parse_csv_lines(csv_path)
+
+    if header is None:
+        ncol = block.shape[1]
+        if ncol >= 4:
+            idx_time, idx_va, idx_vy = 1, 2, 3
+        elif ncol == 3:
+            idx_time, idx_va, idx_vy = 0, 1, 2
+        else:
+            raise ValueError(f"unexpected numeric format with {ncol} columns")
+    else:
+        lower = [h.lower().replace(" ", "") for h in header]
+        if "time" not in lower:
+            raise ValueError(f"unexpected header missing time: {header}")
+        if "v(a)" not in lower or "v(y)" not in lower:
+            return _parse_csv_lines(csv_path)
+        idx_time, idx_va, idx_vy = lower.index("time"), lower.index("v(a)"), lower.index("v(y)")
+        if block.shape[1] <= max(idx_time, idx_va, idx_vy):
+            return _parse_csv_lines(csv_path)
+
+    return {
+        "time": block[:, idx_time].tolist(),
+        "v(a)": block[:, idx_va].tolist(),
+        "v(y)": block[:, idx_vy].tolist(),
+    }
+
+
+def _parse_csv_lines(csv_path: Path) -> Dict[str, List[float]]:
+    """
+    Line-by-line parse_csv: Parse ngspice 'wrdata' ASCII (whitespace-delimited) for fixed vectors v(a), v(y).
     Handles:
       - No header: numeric first line (3 cols: time v(a) v(y) OR 4 cols: Index time v(a) v(y))
       - Header present: 'Index time v(a) v(y)' OR 'time v(a) v(y)'
@@ -258,7 +645,14 @@ def parse_wrdata_ordered(csv_path: Path, vec_labels: List[str]) -> Dict[str, Lis
       - If 'Index' present: [Index, time, v(node1), v(node2), ...]
       - Else:               [time, v(node1), v(node2), ...]
     vec_labels: e.g., ["v(A)","v(Y)"] in the SAME ORDER used in wrdata.
+    Thin list-returning wrapper around parse_wrdata_arrays.
     """
+    arrays = parse_wrdata_arrays(csv_path, vec_labels)
+    return {k: v.tolist() for k, v in arrays.items()}
+
+
+def _parse_wrdata_ordered_lines(csv_path: Path, vec_labels: List[str]) -> Dict[str, List[float]]:
+    """Line-by-line parse_wrdata_ordered (fallback for malformed files)."""
     with csv_path.open() as f:
         lines = [ln.strip() for ln in f if ln.strip()]
     if not lines:
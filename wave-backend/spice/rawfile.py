@@ -0,0 +1,106 @@
+# rawfile.py
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+RAW_MAGIC = b"Title:"
+_BINARY_MARK = b"Binary:\n"
+_HEADER_MAX = 1 << 20  # header is tiny; never scan more than 1 MiB for it
+
+
+def is_rawfile(path: Path) -> bool:
+    """True if the file looks like an ngspice rawfile (ascii or binary)."""
+    try:
+        with path.open("rb") as f:
+            return f.read(len(RAW_MAGIC)) == RAW_MAGIC
+    except OSError:
+        return False
+
+
+class RawFile:
+    """
+    Memory-mapped view of an ngspice *binary* rawfile (first plot only).
+      - header:  {"title", "plotname", "flags", "no. variables", ...} (lower-case keys)
+      - names:   vector names in file order, e.g. ["time", "v(a)", "v(y)"]
+      - data:    np.memmap [points, variables] (float64 or complex128)
+    column(i) returns a zero-copy (strided) view into the mapping.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with path.open("rb") as f:
+            head = f.read(_HEADER_MAX)
+        pos = head.find(_BINARY_MARK)
+        if pos < 0:
+            raise ValueError("not a binary rawfile (no 'Binary:' section)")
+        self.offset = pos + len(_BINARY_MARK)
+
+        self.header: Dict[str, str] = {}
+        self.names: List[str] = []
+        in_vars = False
+        for ln in head[:pos].decode("latin-1").splitlines():
+            if in_vars:
+                parts = ln.split()
+                if len(parts) >= 2 and parts[0].isdigit():
+                    self.names.append(parts[1])
+                    continue
+                in_vars = False
+            if ":" not in ln:
+                continue
+            key, _, val = ln.partition(":")
+            key = key.strip().lower()
+            if key == "variables":
+                in_vars = True
+                continue
+            self.header[key] = val.strip()
+
+        nvars = int(self.header.get("no. variables", len(self.names)))
+        if nvars != len(self.names) or nvars == 0:
+            raise ValueError(f"rawfile variable table mismatch ({nvars} vs {len(self.names)})")
+
+        flags = self.header.get("flags", "real").lower()
+        dtype = np.dtype("<c16") if "complex" in flags else np.dtype("<f8")
+        # trust the file size over 'No. Points' (aborted runs leave it stale)
+        avail = (path.stat().st_size - self.offset) // (nvars * dtype.itemsize)
+        npoints = min(int(self.header.get("no. points", avail)), avail)
+        if npoints <= 0:
+            raise ValueError("rawfile has no data points")
+
+        self.data = np.memmap(path, dtype=dtype, mode="r",
+                              offset=self.offset, shape=(npoints, nvars))
+
+    def index(self, name: str) -> Optional[int]:
+        """Column of a vector, also matching the bare/branch spellings ('y' for v(y), 'vdd#branch' for i(vdd))."""
+        nm = name.lower().replace(" ", "")
+        aliases = {nm}
+        m = re.fullmatch(r"([vi])\((.+)\)", nm)
+        if m:
+            aliases.add(m.group(2) if m.group(1) == "v" else f"{m.group(2)}#branch")
+        for i, n in enumerate(self.names):
+            if n.lower() in aliases:
+                return i
+        return None
+
+    def column(self, i: int) -> np.ndarray:
+        return self.data[:, i]
+
+
+def parse_raw_arrays(raw_path: Path, vec_labels: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Rawfile counterpart of parse_wrdata_arrays: {"time": view, "<label>": view, ...}.
+    Labels are matched by name (ngspice lower-cases node names); a label that
+    isn't in the file raises ValueError rather than guessing a column.
+    """
+    raw = RawFile(raw_path)
+    i_time = raw.index("time")
+    out: Dict[str, np.ndarray] = {"time": raw.column(0 if i_time is None else i_time)}
+    for lbl in vec_labels:
+        i = raw.index(lbl)
+        if i is None:
+            raise ValueError(f"vector '{lbl}' not found in rawfile {raw.names}")
+        out[lbl] = raw.column(i)
+    return out
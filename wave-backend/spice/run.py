@@ -1,25 +1,51 @@
 # run.py
 from __future__ import annotations
 
+import asyncio
+import os
 import re
+import signal
 import subprocess
 from pathlib import Path
 from typing import Dict, List
 
 
-def run_ngspice(cir_path: Path, log_path: Path, timeout_s: int = 20) -> int:
+def _kill_tree(proc: asyncio.subprocess.Process) -> None:
+    """Hard-kill ngspice and anything it spawned (own process group on POSIX)."""
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def run_ngspice_async(cir_path: Path, log_path: Path, timeout_s: float = 20) -> int:
     """
-    Execute ngspice in batch mode on the given circuit file.
-    Writes stdout/stderr to log_path. Returns process return code.
+    Run ngspice in batch mode (log via -o) without blocking the event loop;
+    returns its exit code. On timeout the child group is killed and
+    subprocess.TimeoutExpired is raised; on task cancellation it is killed too.
     """
-    proc = subprocess.run(
-        ["ngspice", "-b", "-o", str(log_path), str(cir_path)],
-        cwd=cir_path.parent,
-        text=True,
-        capture_output=False,
-        timeout=timeout_s,
+    kwargs = {"start_new_session": True} if os.name == "posix" else {}
+    proc = await asyncio.create_subprocess_exec(
+        "ngspice", "-b", "-o", str(log_path), str(cir_path),
+        cwd=str(cir_path.parent),
+        stdin=asyncio.subprocess.DEVNULL,
+        **kwargs,
     )
-    return proc.returncode
+    try:
+        return await asyncio.wait_for(proc.wait(), timeout=timeout_s)
+    except asyncio.TimeoutError:
+        _kill_tree(proc)
+        await proc.wait()
+        raise subprocess.TimeoutExpired(["ngspice", str(cir_path)], timeout_s)
+    except asyncio.CancelledError:
+        _kill_tree(proc)
+        await asyncio.shield(proc.wait())
+        raise
 
 
 def tail_warnings(log_text: str) -> List[str]:
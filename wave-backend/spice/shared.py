@@ -0,0 +1,270 @@
+# shared.py
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import multiprocessing as mp
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# ================= libngspice (ctypes) =================
+#
+# Minimal binding of the ngspice shared-library API (sharedspice.h):
+#   ngSpice_Init, ngSpice_Circ, ngSpice_Command, ngGet_Vec_Info
+
+
+class _VectorInfo(ctypes.Structure):
+    _fields_ = [
+        ("v_name", ctypes.c_char_p),
+        ("v_type", ctypes.c_int),
+        ("v_flags", ctypes.c_short),
+        ("v_realdata", ctypes.POINTER(ctypes.c_double)),
+        ("v_compdata", ctypes.c_void_p),
+        ("v_length", ctypes.c_int),
+    ]
+
+
+_SendChar = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p)
+_SendStat = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p)
+_ControlledExit = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_int, ctypes.c_bool, ctypes.c_bool,
+                                   ctypes.c_int, ctypes.c_void_p)
+
+
+def find_libngspice(explicit: str = "") -> Optional[str]:
+    """NGSPICE_LIB if given, else whatever the loader can find."""
+    if explicit:
+        return explicit
+    return ctypes.util.find_library("ngspice")
+
+
+def circuit_lines(tb_text: str) -> List[str]:
+    """
+    Testbench text → lines for ngSpice_Circ. Drops the .control block (the
+    session issues 'run' itself and reads vectors from memory, no wrdata/write).
+    """
+    lines: List[str] = []
+    in_control = False
+    for ln in tb_text.splitlines():
+        low = ln.strip().lower()
+        if low.startswith(".control"):
+            in_control = True
+            continue
+        if in_control:
+            if low.startswith(".endc"):
+                in_control = False
+            continue
+        lines.append(ln)
+    if not any(l.strip().lower() == ".end" for l in lines):
+        lines.append(".end")
+    return lines
+
+
+class NgSpiceSession:
+    """One loaded libngspice instance (one per worker process — the library is not reentrant)."""
+
+    def __init__(self, lib_path: str):
+        self.lib = ctypes.CDLL(lib_path)
+        self._log: List[str] = []
+        self._exited = False
+        # keep references so the callbacks aren't garbage-collected
+        self._cb_char = _SendChar(self._on_char)
+        self._cb_stat = _SendStat(lambda *_: 0)
+        self._cb_exit = _ControlledExit(self._on_exit)
+
+        self.lib.ngSpice_Init.argtypes = [_SendChar, _SendStat, _ControlledExit,
+                                          ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
+                                          ctypes.c_void_p]
+        self.lib.ngSpice_Circ.argtypes = [ctypes.POINTER(ctypes.c_char_p)]
+        self.lib.ngSpice_Command.argtypes = [ctypes.c_char_p]
+        self.lib.ngGet_Vec_Info.argtypes = [ctypes.c_char_p]
+        self.lib.ngGet_Vec_Info.restype = ctypes.POINTER(_VectorInfo)
+        self.lib.ngSpice_Init(self._cb_char, self._cb_stat, self._cb_exit, None, None, None, None)
+
+    def _on_char(self, text: bytes, _id: int, _user: Any) -> int:
+        line = text.decode(errors="ignore")
+        for prefix in ("stdout ", "stderr "):
+            if line.startswith(prefix):
+                line = line[len(prefix):]
+        self._log.append(line)
+        return 0
+
+    def _on_exit(self, status: int, _unload: bool, _quit: bool, _id: int, _user: Any) -> int:
+        self._exited = True
+        self._log.append(f"ngspice exit request (status {status})")
+        return 0
+
+    def cmd(self, command: str) -> int:
+        return self.lib.ngSpice_Command(command.encode())
+
+    def vector(self, name: str) -> Optional[np.ndarray]:
+        """Copy a real vector of the current plot out of ngspice memory."""
+        for cand in (name, name.lower()):
+            ptr = self.lib.ngGet_Vec_Info(cand.encode())
+            if ptr and ptr.contents.v_realdata and ptr.contents.v_length > 0:
+                info = ptr.contents
+                return np.ctypeslib.as_array(info.v_realdata, shape=(info.v_length,)).copy()
+        return None
+
+    def run(self, lines: List[str], vectors: List[str]) -> Dict[str, Any]:
+        """Load circuit line by line, run it, return {"arrays", "log", "ok"}."""
+        self._log.clear()
+        arr = (ctypes.c_char_p * (len(lines) + 1))(*[l.encode() for l in lines], None)
+        ok = self.lib.ngSpice_Circ(arr) == 0
+        ok = ok and self.cmd("run") == 0
+        arrays: Dict[str, np.ndarray] = {}
+        if ok:
+            for name in ["time"] + vectors:
+                v = self.vector(name)
+                if v is None:
+                    ok = False
+                    self._log.append(f"vector '{name}' not found in current plot")
+                    break
+                arrays[name] = v
+        # free circuit + plots so the session doesn't grow between runs
+        self.cmd("remcirc")
+        self.cmd("destroy all")
+        return {"ok": ok and not self._exited, "arrays": arrays, "log": "\n".join(self._log)}
+
+
+def _worker_main(conn, lib_path: str) -> None:
+    """Long-lived worker: one NgSpiceSession, jobs arrive over the pipe."""
+    try:
+        sess = NgSpiceSession(lib_path)
+        conn.send({"ready": True})
+    except Exception as e:  # library missing / wrong ABI
+        conn.send({"ready": False, "error": str(e)})
+        return
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            conn.send(sess.run(job["lines"], job["vectors"]))
+        except Exception as e:
+            conn.send({"ok": False, "arrays": {}, "log": f"shared engine error: {e}"})
+        if sess._exited:  # ngspice asked to quit → state is unusable, let pool respawn
+            return
+
+
+# ================= worker pool =================
+
+class SharedWorker:
+    def __init__(self, ctx, lib_path: str):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child, lib_path), daemon=True)
+        self.proc.start()
+        child.close()
+        try:
+            hello = self.conn.recv()
+        except (EOFError, OSError) as e:
+            hello = {"ready": False, "error": f"worker died during init: {e!r}"}
+        if not hello.get("ready"):
+            self.proc.join(1)
+            raise RuntimeError(hello.get("error", "libngspice init failed"))
+
+    def alive(self) -> bool:
+        return self.proc.is_alive()
+
+    def kill(self) -> None:
+        if self.proc.is_alive():
+            self.proc.kill()
+        self.proc.join(1)
+        self.conn.close()
+
+
+class SharedEnginePool:
+    """
+    Pool of at most `size` long-lived processes, each holding an ngspice
+    shared-library session. Runs are bounded by the caller (scheduler slot);
+    a run that times out or is cancelled kills its worker, which is replaced
+    lazily on the next run. _idle/_spawned are shared between the event loop
+    and executor threads, so they only change under _cond.
+    """
+
+    def __init__(self, size: int, lib_path: str):
+        self.size = max(1, size)
+        self.lib_path = lib_path
+        self._ctx = mp.get_context("spawn")
+        self._idle: List[SharedWorker] = []
+        self._spawned = 0
+        self._cond = threading.Condition()
+
+    def _take(self) -> SharedWorker:
+        """Idle worker, or a new one while fewer than `size` exist; otherwise wait for one (executor thread)."""
+        with self._cond:
+            while True:
+                while self._idle:
+                    w = self._idle.pop()
+                    if w.alive():
+                        return w
+                    w.kill()
+                    self._spawned -= 1
+                if self._spawned < self.size:
+                    self._spawned += 1
+                    break
+                self._cond.wait()
+        try:
+            return SharedWorker(self._ctx, self.lib_path)
+        except Exception:
+            self._drop(None)
+            raise
+
+    def _put(self, w: SharedWorker) -> None:
+        if not w.alive():
+            self._drop(w)
+            return
+        with self._cond:
+            self._idle.append(w)
+            self._cond.notify()
+
+    def _drop(self, w: Optional[SharedWorker]) -> None:
+        if w is not None:
+            w.kill()
+        with self._cond:
+            self._spawned -= 1
+            self._cond.notify()
+
+    def _orphaned(self, fut: asyncio.Future) -> None:
+        # the caller was cancelled while _take was still running: hand the worker back
+        if not fut.cancelled() and fut.exception() is None:
+            self._put(fut.result())
+
+    async def run(self, tb_text: str, vectors: List[str], timeout_s: float) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        taking = loop.run_in_executor(None, self._take)
+        try:
+            w = await asyncio.shield(taking)
+        except asyncio.CancelledError:
+            taking.add_done_callback(self._orphaned)
+            raise
+        job = {"lines": circuit_lines(tb_text), "vectors": vectors}
+
+        def _roundtrip():
+            w.conn.send(job)
+            return w.conn.recv()
+
+        try:
+            res = await asyncio.wait_for(loop.run_in_executor(None, _roundtrip), timeout=timeout_s)
+        except BaseException:  # timeout / cancel / broken pipe → worker state unknown
+            self._drop(w)
+            raise
+        self._put(w)
+        return res
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {"size": self.size, "workers": self._spawned, "idle": len(self._idle)}
+
+    def close(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._spawned -= len(idle)
+            self._cond.notify_all()
+        for w in idle:
+            w.kill()
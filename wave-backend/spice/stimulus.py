@@ -0,0 +1,327 @@
+# spice/stimulus.py
+from __future__ import annotations
+
+import copy
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from uuid import uuid4
+
+import numpy as np
+
+from core.config import (STIM_DISK_MB, STIM_INLINE_POINTS, STIM_KEEP_S, STIM_MAX_POINTS, STIM_MEMO_POINTS,
+                         STIM_ROOT)
+
+# Stimulus compiler for pin_drives beyond pulse/dc:
+#   {"type": "bits", "bits": "0110 1001", "period": 1e-9, "slew"?: 5e-11, "td"?: 0,
+#    "v1"?: low, "v2"?: high (default VDD), "repeat"?: false}
+#   {"type": "prbs", "order": 7|9|15|23|31, "length"?: 2^order-1, "seed"?: int,
+#    + the bits timing/level fields}
+#   {"type": "pwl", "points": [[t, v], ...]}  or  {"t": [...], "v": [...]}  (volts)
+#
+# Every drive compiles to one numeric PWL (bits/prbs as 0..1, scaled to v1..v2
+# at instantiation). Short ones are written inline; longer ones go to a
+# content-addressed include file STIM_ROOT/STIM_<hash>.inc holding a subckt,
+# so tb.cir only carries ".include" + one X line and identical waveforms (any
+# pin, any level) share one file. Stimuli too big for the in-memory memo are
+# written to their include file on first compile and remembered header-only,
+# so validation / every render / every sweep point reuse the file instead of
+# recompiling the whole PRBS/PWL.
+
+STIM_TYPES = ("bits", "prbs", "pwl")
+
+# PRBS recurrences b[n] = b[n-a] ^ b[n-b] (ITU-T O.150 polynomials)
+PRBS_TAPS = {7: (7, 6), 9: (9, 5), 15: (15, 14), 23: (23, 18), 31: (31, 28)}
+
+
+class StimulusError(ValueError):
+    pass
+
+
+def _fmt(x: float) -> str:
+    return f"{x:.12g}"
+
+
+def _pair_rows(t: np.ndarray, u: np.ndarray) -> str:
+    """'t v' pairs formatted like _fmt, 8 pairs per line."""
+    flat = np.column_stack((t, u)).ravel()
+    full = flat.size // 16 * 16
+    buf = io.StringIO()
+    if full:
+        np.savetxt(buf, flat[:full].reshape(-1, 16), fmt="%.12g", delimiter=" ")
+    if full < flat.size:
+        np.savetxt(buf, flat[full:].reshape(1, -1), fmt="%.12g", delimiter=" ")
+    return buf.getvalue().rstrip("\n")
+
+
+class Stimulus:
+    """
+    Compiled drive: strictly increasing times t, values u (0..1 when scaled,
+    volts otherwise). name/key derive from the point data, not the pin.
+    A header() copy (body None) stands for a stimulus whose include file exists.
+    """
+
+    def __init__(self, t: np.ndarray, u: np.ndarray, scaled: bool, repeat: bool):
+        if t.size > STIM_MAX_POINTS:
+            raise StimulusError(f"stimulus has {t.size} points (max {STIM_MAX_POINTS})")
+        self.t = t
+        self.u = u
+        self.scaled = scaled
+        self.repeat = repeat
+        self.points = int(t.size)
+        self.body: Optional[str] = _pair_rows(t, u)
+        h = hashlib.sha256(self.body.encode())
+        h.update(f"|{int(scaled)}|{int(repeat)}".encode())
+        self.key = h.hexdigest()[:16]
+        self.name = f"STIM_{self.key}"
+
+    def header(self) -> "Stimulus":
+        """Copy without the point data (name/key/points/scaled/repeat only)."""
+        head = copy.copy(self)
+        head.t = head.u = head.body = None
+        return head
+
+    def _pwl(self, sep: str) -> str:
+        if self.body is None:
+            raise StimulusError(f"stimulus {self.key} has no point data (header only)")
+        return "PWL(" + self.body.replace("\n", sep) + ")" + (" r=0" if self.repeat else "")
+
+    def include_text(self) -> str:
+        """Body of the include file (one subckt: p n [VLO VHI])."""
+        nl = os.linesep
+        head = f"* logicsim stimulus {self.key} ({self.points} points)"
+        if self.scaled:
+            return nl.join([
+                head,
+                f".subckt {self.name} p n PARAMS: VLO=0 VHI=1",
+                "VS u 0 " + self._pwl(nl + "+ "),
+                "BS p n V={VLO}+({VHI}-{VLO})*V(u)",
+                ".ends",
+                "",
+            ])
+        return nl.join([head, f".subckt {self.name} p n", "VS p n " + self._pwl(nl + "+ "), ".ends", ""])
+
+    def inline(self, lo: Any, hi: Any) -> str:
+        """PWL(...) with the values written out (scaled 0/1 → lo/hi)."""
+        if not self.scaled:
+            return self._pwl(" ")
+        lv = {0.0: str(lo), 1.0: str(hi)}
+        pairs = [f"{_fmt(a)} {lv[b]}" for a, b in zip(self.t.tolist(), self.u.tolist())]
+        return "PWL(" + " ".join(pairs) + ")" + (" r=0" if self.repeat else "")
+
+
+# ---------------- compilers ----------------
+
+def _num(drive: Dict[str, Any], key: str, default: Optional[float] = None) -> float:
+    v = drive.get(key, default)
+    if v is None:
+        raise StimulusError(f"{drive.get('type')} drive needs '{key}'")
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        raise StimulusError(f"'{key}' must be a number")
+    if not math.isfinite(x):
+        raise StimulusError(f"'{key}' must be finite")
+    return x
+
+
+def _bit_array(bits: Any) -> np.ndarray:
+    if isinstance(bits, str):
+        s = "".join(bits.split()).replace("_", "")
+        if not s or set(s) - {"0", "1"}:
+            raise StimulusError("bits must be a non-empty string of 0/1 ('_' and spaces allowed)")
+        return np.frombuffer(s.encode(), dtype=np.uint8) - ord("0")
+    if isinstance(bits, list) and bits and all(b in (0, 1, True, False) for b in bits):
+        return np.asarray(bits, dtype=np.uint8)
+    raise StimulusError("bits must be a 0/1 string or list")
+
+
+def prbs_bits(order: int, length: int, seed: Optional[int] = None) -> np.ndarray:
+    """PRBS-<order> bit sequence (LFSR), computed in vector chunks of the shorter tap lag."""
+    if order not in PRBS_TAPS:
+        raise StimulusError(f"prbs order must be one of {sorted(PRBS_TAPS)}")
+    a, b = PRBS_TAPS[order]
+    state = (1 << order) - 1 if seed is None else int(seed) & ((1 << order) - 1)
+    if state == 0:
+        raise StimulusError("prbs seed must be non-zero")
+    buf = np.empty(order + length, dtype=np.uint8)
+    buf[:order] = [(state >> (order - 1 - k)) & 1 for k in range(order)]
+    n = order
+    while n < buf.size:
+        k = min(b, buf.size - n)
+        buf[n:n + k] = buf[n - a:n - a + k] ^ buf[n - b:n - b + k]
+        n += k
+    return buf[order:]
+
+
+def _bits_pwl(bits: np.ndarray, period: float, slew: float, td: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Bit k held from td + k*period; each change ramps over slew from the bit boundary."""
+    idx = np.flatnonzero(bits[1:] != bits[:-1]) + 1
+    tb = td + idx * period
+    t = np.empty(1 + 2 * idx.size)
+    u = np.empty_like(t)
+    t[0], u[0] = 0.0, bits[0]
+    t[1::2], u[1::2] = tb, bits[idx - 1]
+    t[2::2], u[2::2] = tb + slew, bits[idx]
+    return t, u
+
+
+def _timing(drive: Dict[str, Any]) -> Tuple[float, float, float]:
+    period = _num(drive, "period")
+    slew = _num(drive, "slew", period / 20)
+    td = _num(drive, "td", 0.0)
+    if period <= 0 or not 0 < slew < period or td < 0:
+        raise StimulusError("need period > 0, 0 < slew < period, td >= 0")
+    return period, slew, td
+
+
+def _compile(drive: Dict[str, Any]) -> Stimulus:
+    kind = (drive.get("type") or drive.get("kind") or "").lower()
+    repeat = bool(drive.get("repeat", False))
+
+    if kind in ("bits", "prbs"):
+        period, slew, td = _timing(drive)
+        if kind == "bits":
+            bits = _bit_array(drive.get("bits"))
+        else:
+            order = int(_num(drive, "order", 7))
+            length = int(_num(drive, "length", (1 << min(order, 20)) - 1))
+            if not 1 <= length <= STIM_MAX_POINTS:
+                raise StimulusError(f"prbs length must be 1..{STIM_MAX_POINTS}")
+            bits = prbs_bits(order, length, drive.get("seed"))
+        t, u = _bits_pwl(bits, period, slew, td)
+        return Stimulus(t, u.astype(np.float64), scaled=True, repeat=repeat)
+
+    if kind == "pwl":
+        if "points" in drive:
+            try:
+                pts = np.asarray(drive["points"], dtype=np.float64)
+            except (TypeError, ValueError):
+                raise StimulusError("pwl points must be [[t, v], ...] numbers")
+            if pts.ndim != 2 or pts.shape[1] != 2:
+                raise StimulusError("pwl points must be [[t, v], ...]")
+            t, u = pts[:, 0].copy(), pts[:, 1].copy()
+        else:
+            try:
+                t = np.asarray(drive.get("t"), dtype=np.float64)
+                u = np.asarray(drive.get("v"), dtype=np.float64)
+            except (TypeError, ValueError):
+                raise StimulusError("pwl t / v must be number arrays")
+            if t.ndim != 1 or t.shape != u.shape:
+                raise StimulusError("pwl t and v must be arrays of the same length")
+        if t.size == 0 or not (np.isfinite(t).all() and np.isfinite(u).all()):
+            raise StimulusError("pwl needs at least one finite point")
+        if t[0] < 0 or (t.size > 1 and not (np.diff(t) > 0).all()):
+            raise StimulusError("pwl times must start >= 0 and strictly increase")
+        return Stimulus(t, u, scaled=False, repeat=repeat)
+
+    raise StimulusError(f"unknown stimulus type '{kind}' (one of {list(STIM_TYPES)})")
+
+
+# LRU bounded by total points held in memory (a PRBS/PWL stimulus can hold
+# ~STIM_MAX_POINTS points); one larger than the whole budget is kept header-only
+# (weight 1) once its include file is written
+_memo: "OrderedDict[str, Stimulus]" = OrderedDict()
+_memo_lock = threading.Lock()
+_memo_points = 0
+
+
+def _weight(stim: Stimulus) -> int:
+    return stim.points if stim.body is not None else 1
+
+
+def compile_drive(drive: Dict[str, Any]) -> Stimulus:
+    """
+    bits/prbs/pwl drive → Stimulus (memoized on the drive's content; may be a
+    header() whose include file is on disk). Raises StimulusError.
+    """
+    global _memo_points
+    try:
+        key = hashlib.sha256(json.dumps(drive, sort_keys=True).encode()).hexdigest()
+    except (TypeError, ValueError):
+        raise StimulusError("drive must be JSON data")
+    with _memo_lock:
+        hit = _memo.get(key)
+        if hit is not None:
+            _memo.move_to_end(key)
+    if hit is not None and (hit.body is not None or _file_path(hit).exists()):
+        return hit
+    stim = _compile(drive)
+    entry = stim
+    if stim.points > STIM_MEMO_POINTS:
+        stimulus_file(stim)
+        entry = stim.header()
+    with _memo_lock:
+        old = _memo.pop(key, None)
+        if old is not None:
+            _memo_points -= _weight(old)
+        _memo[key] = entry
+        _memo_points += _weight(entry)
+        while _memo_points > STIM_MEMO_POINTS:
+            _k, old = _memo.popitem(last=False)
+            _memo_points -= _weight(old)
+    return stim
+
+
+# ---------------- include files ----------------
+
+def _evict(root: Path, keep: Path) -> None:
+    files = []
+    for p in root.glob("STIM_*.inc"):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, p))
+    total = sum(size for _mt, size, _p in files)
+    limit = STIM_DISK_MB * 1024 * 1024
+    cutoff = time.time() - STIM_KEEP_S
+    for mtime, size, p in sorted(files):
+        if total <= limit or mtime > cutoff:
+            break
+        if p != keep:
+            p.unlink(missing_ok=True)
+            total -= size
+
+
+def _file_path(stim: Stimulus) -> Path:
+    return (STIM_ROOT / f"{stim.name}.inc").resolve()
+
+
+def stimulus_file(stim: Stimulus) -> Path:
+    """Write (once) / touch the include file for stim; returns its absolute path."""
+    STIM_ROOT.mkdir(parents=True, exist_ok=True)
+    path = _file_path(stim)
+    try:
+        os.utime(path)  # recently used → safe from eviction
+        return path
+    except FileNotFoundError:
+        pass
+    tmp = path.with_name(f".{stim.name}.{uuid4().hex[:6]}.tmp")
+    tmp.write_text(stim.include_text())
+    os.replace(tmp, path)
+    _evict(STIM_ROOT, keep=path)
+    return path
+
+
+def stimulus_lines(pin: str, drive: Dict[str, Any], vdd: Any) -> Tuple[Optional[str], str]:
+    """
+    (".include <file>" or None, source line) for one pin. lo/hi levels are
+    drive v1/v2 (default 0 / vdd; vdd may be a '{LS_VDD}' ref in batch testbenches).
+    """
+    stim = compile_drive(drive)
+    lo = float(drive["v1"]) if drive.get("v1") is not None else 0.0
+    hi = float(drive["v2"]) if drive.get("v2") is not None else vdd
+    if stim.points <= STIM_INLINE_POINTS:
+        return None, f"VIN_{pin} {pin} 0 {stim.inline(lo, hi)}"
+    inst = f"XVIN_{pin} {pin} 0 {stim.name}"
+    if stim.scaled:
+        inst += f" VLO={lo} VHI={hi}"
+    return f".include {stimulus_file(stim)}", inst
@@ -2,11 +2,14 @@
 from __future__ import annotations
 
 import os
+import re
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 
-from core.config import TPL_PATH
-from spice.parse import guess_roles, normalize_netlist_subckt_params
+from core.config import NETLIST_PRUNE, TPL_PATH
+from spice.parse import guess_roles, normalize_netlist_subckt_params, prune_netlist
+from spice.stimulus import STIM_TYPES, stimulus_lines
+from spice.template import CompiledTemplate, load_template
 
 
 # ---------------- Template writer (for /prepare_tpl) ----------------
@@ -47,9 +50,9 @@ Cload {Y_NODE} 0 {CLOAD}
   set noaskquit
   set nomoremode
   set wr_singlescale
-  set filetype=ascii
+  set filetype={FILETYPE}
   run
-  wrdata {OUT_CSV} time {SAVE_VECTORS}
+  {WRITE_CMD} {OUT_CSV} time {SAVE_VECTORS}
 .endc
 
 .end
@@ -59,17 +62,55 @@ Cload {Y_NODE} 0 {CLOAD}
     TPL_PATH.write_text(tpl_text)
 
 
+# ---------------- Output mode ----------------
+
+OUTPUT_MODES = ("ascii", "binary")
+
+
+def output_cmds(output: str) -> Tuple[str, str]:
+    """
+    (filetype, write command) for the .control block.
+      ascii  → wrdata text columns   (parse_wrdata_arrays)
+      binary → 'write' binary rawfile (memory-mapped by spice.rawfile)
+    """
+    if output == "binary":
+        return "binary", "write"
+    return "ascii", "wrdata"
+
+
 # ---------------- Template renderer (legacy /simulate route) ----------------
 
+# placeholders render_tb fills in tb.tpl.cir (anything else in {CAPS} is left as-is)
+TB_VARS = ("VDD", "TR", "TF", "PW", "PER", "CLOAD", "TSTEP", "TSTOP", "TEMP",
+           "A_NODE", "Y_NODE", "SAVE_VECTORS", "OUT_CSV", "SUBCKT_NAME", "PIN_LIST",
+           "FILETYPE", "WRITE_CMD")
+# without these the run writes no output file
+TB_REQUIRED = ("OUT_CSV", "SAVE_VECTORS")
+
+
+def template_report() -> Dict[str, List[str]]:
+    """Placeholder check of the current tb.tpl.cir (see CompiledTemplate.report)."""
+    return load_template(TPL_PATH, known=TB_VARS, expected=TB_REQUIRED).report(TB_REQUIRED)
+
+
+def template_defines(element: str) -> bool:
+    """True if the current tb.tpl.cir has an element line named `element` (e.g. VDD_SRC)."""
+    text = "".join(load_template(TPL_PATH, known=TB_VARS, expected=TB_REQUIRED).parts)
+    return re.search(rf"^[ \t]*{re.escape(element)}\s", text, re.M | re.I) is not None
+
+
 def render_tb(params: Dict[str, float],
               nodes: List[str],
               out_csv: Path,
-              tpl_vars: Optional[Dict[str, Any]] = None) -> str:
+              tpl_vars: Optional[Dict[str, Any]] = None,
+              output: str = "ascii",
+              extra_vectors: Optional[List[str]] = None) -> str:
     """
     tb.tpl.cir ko fill karta hai. Optional tpl_vars:
       { "SUBCKT_NAME": "NAND2", "PIN_LIST": ["Y","A","B","VDD","0"] }
+    Old templates without {FILETYPE}/{WRITE_CMD} keep producing wrdata ASCII.
+    extra_vectors are appended to {SAVE_VECTORS} (e.g. "i(VDD_SRC)").
     """
-    tpl = TPL_PATH.read_text()
     a_node = nodes[0] if len(nodes) >= 1 else "A"
     y_node = nodes[1] if len(nodes) >= 2 else "Y"
 
@@ -85,43 +126,46 @@ def render_tb(params: Dict[str, float],
         elif isinstance(pl, str) and pl.strip():
             pin_list = pl.strip()
 
-    save_vec = f"v({a_node}) v({y_node})"
-    text = (
-        tpl.replace("{VDD}", f"{params['VDD']}")
-           .replace("{TR}", f"{params['TR']}")
-           .replace("{TF}", f"{params['TF']}")
-           .replace("{PW}", f"{params['PW']}")
-           .replace("{PER}", f"{params['PER']}")
-           .replace("{CLOAD}", f"{params['CLOAD']}")
-           .replace("{TSTEP}", f"{params['TSTEP']}")
-           .replace("{TSTOP}", f"{params['TSTOP']}")
-           .replace("{TEMP}", f"{params['TEMP']}")
-           .replace("{A_NODE}", a_node)
-           .replace("{Y_NODE}", y_node)
-           .replace("{SAVE_VECTORS}", save_vec)
-           .replace("{OUT_CSV}", str(out_csv))
-           .replace("{SUBCKT_NAME}", subckt_name)
-           .replace("{PIN_LIST}", pin_list)
-    )
-    return text
+    filetype, write_cmd = output_cmds(output)
+    tpl = load_template(TPL_PATH, known=TB_VARS, expected=TB_REQUIRED)
+    return tpl.render({
+        "VDD": params["VDD"], "TR": params["TR"], "TF": params["TF"],
+        "PW": params["PW"], "PER": params["PER"], "CLOAD": params["CLOAD"],
+        "TSTEP": params["TSTEP"], "TSTOP": params["TSTOP"], "TEMP": params["TEMP"],
+        "A_NODE": a_node,
+        "Y_NODE": y_node,
+        "SAVE_VECTORS": " ".join([f"v({a_node})", f"v({y_node})"] + list(extra_vectors or [])),
+        "OUT_CSV": out_csv,
+        "SUBCKT_NAME": subckt_name,
+        "PIN_LIST": pin_list,
+        "FILETYPE": filetype,
+        "WRITE_CMD": write_cmd,
+    })
 
 
 # ---------------- Helpers ----------------
 
+def _num(v: Any, default: Any) -> Any:
+    """float(v) if given, else the default untouched (may be a '{PARAM}' ref)."""
+    return default if v is None else float(v)
+
+
 def _drive_line_for_pin(pin: str,
                         drive: Dict[str, Any],
-                        vdd: float,
-                        tr: float,
-                        tf: float,
-                        pw: float,
-                        per: float) -> str:
+                        vdd: Any,
+                        tr: Any,
+                        tf: Any,
+                        pw: Any,
+                        per: Any) -> str:
     """
     'pin_drives' ko NGspice source line me convert karta hai.
     Accepts either:
       {type:"pulse", v1, v2, td, tr, tf, pw, per}
+      (bits / prbs / pwl go through spice.stimulus instead)
     or   {kind:"pulse", ...}  (back-compat)
       {type:"dc"/"const", v: <volt>} or {dc: <volt>}
       {type:"none"}   -> no source (commented)
+    vdd/tr/... defaults are floats, or '{LS_VDD}'-style refs in batch testbenches.
     """
     # normalize keys
     t = (drive.get("type") or drive.get("kind") or "pulse").lower()
@@ -135,33 +179,25 @@ def _drive_line_for_pin(pin: str,
 
     # default: pulse
     v1 = float(drive.get("v1", 0.0))
-    v2 = float(drive.get("v2", vdd))
+    v2 = _num(drive.get("v2"), vdd)
     td = float(drive.get("td", 0.0))
-    tr_ = float(drive.get("tr", tr))
-    tf_ = float(drive.get("tf", tf))
-    pw_ = float(drive.get("pw", pw))
-    per_ = float(drive.get("per", per))
+    tr_ = _num(drive.get("tr"), tr)
+    tf_ = _num(drive.get("tf"), tf)
+    pw_ = _num(drive.get("pw"), pw)
+    per_ = _num(drive.get("per"), per)
     return f"VIN_{pin} {pin} 0 PULSE({v1} {v2} {td} {tr_} {tf_} {pw_} {per_})"
 
 
-# ---------------- Rich testbench builder (for /simulate_uploaded) ----------------
+# ---------------- Roles ----------------
 
-def render_uploaded_tb(netlist_text: str,
-                       subckt_name: str,
-                       pin_order: List[str],
-                       params: Dict[str, float],
-                       plot_nodes: List[str],
-                       out_csv: Path,
-                       roles: Optional[Dict[str, Any]] = None,
-                       pin_drives: Optional[Dict[str, Dict[str, Any]]] = None,
-                       hints: Optional[dict] = None) -> str:
+def io_roles(pin_order: List[str],
+             roles: Optional[Dict[str, Any]],
+             hints: Optional[dict]) -> Dict[str, Any]:
     """
-    Final TB jo ngspice ko jayega.
+    Supplies + IO of the DUT: explicit roles, else guess_roles().
+    Returns {"vdd", "vss", "inputs", "outputs", "supplies"}; supply nets are
+    never reported as inputs/outputs.
     """
-    # 1) Normalize .SUBCKT headers so width/length jaise params pins na ban jayen
-    netlist_text = normalize_netlist_subckt_params(netlist_text, hints=hints)
-
-    # 2) Roles: supplies + IO
     if roles is None:
         auto = guess_roles(pin_order, hints=hints)
         roles = {
@@ -170,37 +206,127 @@ def render_uploaded_tb(netlist_text: str,
             "outputs": [auto["output"]],
             "inputs": auto["inputs"],
         }
-    else:
-        roles.setdefault("outputs", [])
-        roles.setdefault("inputs", [])
-
     vdd_node = roles.get("vdd", "VDD")
     vss_node = roles.get("vss", "0")
 
     # be safe: never treat supplies as inputs accidentally
     supplies = {vdd_node, vss_node, "VDD", "VSS", "0", "GND"}
-    inputs = [p for p in roles.get("inputs", []) if p not in supplies]
-    outputs = [p for p in roles.get("outputs", []) if p not in supplies]
+    return {
+        "vdd": vdd_node,
+        "vss": vss_node,
+        "inputs": [p for p in roles.get("inputs") or [] if p not in supplies],
+        "outputs": [p for p in roles.get("outputs") or [] if p not in supplies],
+        "supplies": supplies,
+    }
+
+
+# ---------------- Truth-table stimulus ----------------
+
+TRUTH_TABLE_ORDERS = ("binary", "gray")
+
+
+def truth_table_codes(n_inputs: int, order: str = "binary") -> List[int]:
+    """All 2^N input codes in simulation order. Bit N-1 (MSB) drives the first input."""
+    codes = range(1 << n_inputs)
+    if order == "gray":  # one input toggles per step → no multi-input races
+        return [c ^ (c >> 1) for c in codes]
+    return list(codes)
+
+
+def truth_table_sources(inputs: List[str], codes: List[int], slot: float,
+                        vdd: float, tr: float, tf: float) -> List[str]:
+    """
+    One PWL source per input, holding code k during [k*slot, (k+1)*slot).
+    Edges start at the slot boundary and take TR/TF. Only changes are emitted;
+    long lists continue on '+' lines.
+    """
+    n = len(inputs)
+    lines: List[str] = []
+    for k, pin in enumerate(inputs):
+        bit = n - 1 - k
+        level = (codes[0] >> bit) & 1
+        pts = [f"0 {vdd if level else 0.0}"]
+        for j, code in enumerate(codes[1:], start=1):
+            b = (code >> bit) & 1
+            if b == level:
+                continue
+            t0 = j * slot
+            pts.append(f"{t0} {vdd if level else 0.0}")
+            pts.append(f"{t0 + (tr if b else tf)} {vdd if b else 0.0}")
+            level = b
+        rows = [" ".join(pts[i:i + 8]) for i in range(0, len(pts), 8)]
+        lines.append(f"VIN_{pin} {pin} 0 PWL(" + f"{os.linesep}+ ".join(rows) + ")")
+    return lines
+
+
+# ---------------- Rich testbench builder (for /simulate_uploaded) ----------------
+
+def _uploaded_tb_parts(netlist_text: str,
+                       subckt_name: str,
+                       pin_order: List[str],
+                       pv: Dict[str, Any],
+                       plot_nodes: List[str],
+                       roles: Optional[Dict[str, Any]],
+                       pin_drives: Optional[Dict[str, Dict[str, Any]]],
+                       hints: Optional[dict],
+                       normalized: bool = False,
+                       extra_vectors: Optional[List[str]] = None,
+                       truth_table: Optional[Dict[str, Any]] = None) -> Tuple[str, str, str]:
+    """
+    Shared body of the uploaded-netlist testbenches.
+    pv: value to embed per param — a float, or '{NAME}' in batch testbenches.
+    normalized: netlist_text already went through normalize_netlist_subckt_params
+    (netlist registry), skip it.
+    extra_vectors: saved after the node voltages, e.g. ["i(VDD_SRC)"] for measurements.
+    truth_table: {"codes": [...], "slot": s} → inputs get PWL code walks instead
+    of pin_drives (TSTOP must cover len(codes) * slot).
+    Returns (netlist_text, circuit_block, save_vecs).
+    """
+    # 1) Normalize .SUBCKT headers so width/length jaise params pins na ban jayen
+    if not normalized:
+        netlist_text = normalize_netlist_subckt_params(netlist_text, hints=hints)
+    # 1b) Sirf DUT se reachable subckts/models rakho (badi libraries ke liye)
+    if NETLIST_PRUNE:
+        netlist_text = prune_netlist(netlist_text, subckt_name)
+
+    # 2) Roles: supplies + IO
+    io = io_roles(pin_order, roles, hints)
+    vdd_node, vss_node = io["vdd"], io["vss"]
+    supplies, inputs, outputs = io["supplies"], io["inputs"], io["outputs"]
 
     # 3) Sources
     src_lines: List[str] = [
-        f"VDD_SRC {vdd_node} 0 {params['VDD']}",  # VDD tie
+        f"VDD_SRC {vdd_node} 0 {pv['VDD']}",  # VDD tie
         f"VSS_SRC {vss_node} 0 0",               # VSS tie  <<< IMPORTANT
     ]
 
+    # truth-table mode: every input walks the code sequence (PWL)
+    if truth_table is not None:
+        src_lines += truth_table_sources(inputs, truth_table["codes"], truth_table["slot"],
+                                         pv["VDD"], pv["TR"], pv["TF"])
+        inputs = []
+
     # user-specified drives (default: pulse 0->VDD)
     pin_drives = pin_drives or {}
+    includes: List[str] = []
     for p in inputs:
         drv = pin_drives.get(p, {"type": "pulse"})
+        if (drv.get("type") or drv.get("kind") or "").lower() in STIM_TYPES:
+            # bits / prbs / pwl: compiled PWL, long ones via an include file
+            inc, line = stimulus_lines(p, drv, pv["VDD"])
+            if inc and inc not in includes:
+                includes.append(inc)
+            src_lines.append(line)
+            continue
         src_lines.append(
             _drive_line_for_pin(
                 pin=p,
                 drive=drv,
-                vdd=params["VDD"],
-                tr=params["TR"],
-                tf=params["TF"],
-                pw=params["PW"],
-                per=params["PER"],
+                vdd=pv["VDD"],
+                tr=pv["TR"],
+                tf=pv["TF"],
+                pw=pv["PW"],
+                per=pv["PER"],
             )
         )
 
@@ -208,12 +334,12 @@ def render_uploaded_tb(netlist_text: str,
     load_lines: List[str] = []
     if outputs:
         for outp in outputs:
-            load_lines.append(f"CLOAD_{outp} {outp} 0 {params['CLOAD']}")
+            load_lines.append(f"CLOAD_{outp} {outp} 0 {pv['CLOAD']}")
     else:
         # fallback: pick first non-supply pin
         fallback = next((p for p in pin_order if p not in supplies), None)
         if fallback:
-            load_lines.append(f"CLOAD_{fallback} {fallback} 0 {params['CLOAD']}")
+            load_lines.append(f"CLOAD_{fallback} {fallback} 0 {pv['CLOAD']}")
 
     # 5) DUT instance — strictly nodes only; params header me defaulted
     pinlist = " ".join(pin_order)
@@ -227,38 +353,161 @@ def render_uploaded_tb(netlist_text: str,
         if n not in seen:
             uniq_nodes.append(n)
             seen.add(n)
-    save_vecs = " ".join([f"v({n})" for n in uniq_nodes])
+    save_vecs = " ".join([f"v({n})" for n in uniq_nodes] + list(extra_vectors or []))
 
-    # 7) TB text
-    return f"""
+    stim_block = f"* Stimuli{os.linesep}{os.linesep.join(includes)}{os.linesep}{os.linesep}" if includes else ""
+    circuit = f"""{stim_block}* Sources
+{os.linesep.join(src_lines)}
+
+* DUT
+{xu_line}
+
+* Loads
+{os.linesep.join(load_lines) if load_lines else "* (no extra loads)"}"""
+    return netlist_text, circuit, save_vecs
+
+
+_UPLOADED_TB = CompiledTemplate("""
 * === Uploaded Netlist ===
-{netlist_text}
+{NETLIST}
 
 * === Auto-generated Testbench ===
 .options method=trap reltol=1e-3 maxord=2
-.temp {params['TEMP']}
+.temp {TEMP}
 
-* Sources
-{os.linesep.join(src_lines)}
+{CIRCUIT}
 
-* DUT
-{xu_line}
+.tran {TSTEP} {TSTOP}
+.save time {SAVE_VECTORS}
 
-* Loads
-{os.linesep.join(load_lines) if load_lines else "* (no extra loads)"}
+.control
+  set noaskquit
+  set nomoremode
+  set wr_singlescale
+  set filetype={FILETYPE}
+  run
+  {WRITE_CMD} {OUT_CSV} time {SAVE_VECTORS}
+.endc
+
+
+.end
+""".strip())
+
+
+def render_uploaded_tb(netlist_text: str,
+                       subckt_name: str,
+                       pin_order: List[str],
+                       params: Dict[str, float],
+                       plot_nodes: List[str],
+                       out_csv: Path,
+                       roles: Optional[Dict[str, Any]] = None,
+                       pin_drives: Optional[Dict[str, Dict[str, Any]]] = None,
+                       hints: Optional[dict] = None,
+                       output: str = "ascii",
+                       normalized: bool = False,
+                       extra_vectors: Optional[List[str]] = None,
+                       truth_table: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Final TB jo ngspice ko jayega.
+    output: "ascii" (wrdata) or "binary" (rawfile via 'write').
+    truth_table: see _uploaded_tb_parts (all 2^N input codes in one transient).
+    """
+    netlist_text, circuit, save_vecs = _uploaded_tb_parts(
+        netlist_text, subckt_name, pin_order, params, plot_nodes, roles, pin_drives, hints, normalized,
+        extra_vectors, truth_table
+    )
+    filetype, write_cmd = output_cmds(output)
+
+    # 7) TB text
+    return _UPLOADED_TB.render({
+        "NETLIST": netlist_text,
+        "CIRCUIT": circuit,
+        "TEMP": params["TEMP"],
+        "TSTEP": params["TSTEP"],
+        "TSTOP": params["TSTOP"],
+        "SAVE_VECTORS": save_vecs,
+        "FILETYPE": filetype,
+        "WRITE_CMD": write_cmd,
+        "OUT_CSV": out_csv,
+    })
+
+
+# ---------------- Batched testbench (many sweep points, one ngspice run) ----------------
+
+# params embedded as .param refs and changed with 'alterparam' between runs;
+# declared as LS_<name> so they can't clash with .param names in the user netlist
+BATCH_PARAMS = ("VDD", "TR", "TF", "PW", "PER", "CLOAD")
+BATCH_PARAM_PREFIX = "LS_"
+
+_BATCH_TB = CompiledTemplate("""
+* === Uploaded Netlist ===
+{NETLIST}
+
+* === Auto-generated Testbench (batch of {N_POINTS}) ===
+.options method=trap reltol=1e-3 maxord=2
+{PARAM_LINES}
 
-.tran {params['TSTEP']} {params['TSTOP']}
-.save time {save_vecs}
+{CIRCUIT}
+
+.save time {SAVE_VECTORS}
 
 .control
   set noaskquit
   set nomoremode
   set wr_singlescale
   set filetype=ascii
-  run
-  wrdata {out_csv} time {save_vecs}
+  set appendwrite
+{CONTROL}
 .endc
 
 
 .end
-""".strip()
+""".strip())
+
+
+def render_uploaded_tb_batch(netlist_text: str,
+                             subckt_name: str,
+                             pin_order: List[str],
+                             points: List[Dict[str, float]],
+                             plot_nodes: List[str],
+                             out_csv: Path,
+                             roles: Optional[Dict[str, Any]] = None,
+                             pin_drives: Optional[Dict[str, Dict[str, Any]]] = None,
+                             hints: Optional[dict] = None,
+                             normalized: bool = False,
+                             extra_vectors: Optional[List[str]] = None) -> str:
+    """
+    One testbench for many parameter points (each a full norm_params dict).
+    Source/load values reference .param names; the .control block walks the
+    points: alterparam → reset → option temp → tran → wrdata (appendwrite).
+    All points land in ONE wrdata file; split_batch_arrays() cuts it back
+    apart on the time resets.
+    """
+    if not points:
+        raise ValueError("empty batch")
+    pv = {k: "{" + BATCH_PARAM_PREFIX + k + "}" for k in BATCH_PARAMS}
+    netlist_text, circuit, save_vecs = _uploaded_tb_parts(
+        netlist_text, subckt_name, pin_order, pv, plot_nodes, roles, pin_drives, hints, normalized,
+        extra_vectors
+    )
+    first = points[0]
+    param_lines = os.linesep.join(f".param {BATCH_PARAM_PREFIX}{k}={first[k]}" for k in BATCH_PARAMS)
+
+    ctl: List[str] = []
+    for i, pt in enumerate(points):
+        ctl.append(f"  * point {i}")
+        ctl.extend(f"  alterparam {BATCH_PARAM_PREFIX}{k}={pt[k]}" for k in BATCH_PARAMS)
+        ctl.append("  reset")
+        ctl.append(f"  option temp={pt['TEMP']}")
+        ctl.append(f"  tran {pt['TSTEP']} {pt['TSTOP']}")
+        ctl.append(f"  wrdata {out_csv} time {save_vecs}")
+        ctl.append("  destroy all")
+
+    return _BATCH_TB.render({
+        "NETLIST": netlist_text,
+        "N_POINTS": len(points),
+        "PARAM_LINES": param_lines,
+        "CIRCUIT": circuit,
+        "SAVE_VECTORS": save_vecs,
+        "CONTROL": os.linesep.join(ctl),
+    })
@@ -0,0 +1,103 @@
+# spice/template.py
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Compiled testbench templates.
+# A template is split ONCE into literal segments + {NAME} slots; render() is a
+# single "".join instead of one full-text str.replace copy per placeholder.
+# Values are never re-scanned, so a value containing "{VDD}" stays literal.
+#
+# Only {UPPER_CASE} names are placeholders (SPICE expressions like {W*2} or
+# {w} in embedded netlists are literal text). With known= given, other upper
+# case names are left in place; they are reported as "unknown" only outside
+# SPICE parameter context — a value after '=' (W={WP}, .param X={Y}) is an
+# expression of the netlist's own params, not a missed placeholder.
+
+PLACEHOLDER_RE = re.compile(r"\{([A-Z][A-Z0-9_]*)\}")
+
+logger = logging.getLogger("logicsim.template")
+_SPICE_VALUE_RE = re.compile(r"=[ \t]*$")  # text right before a {NAME} used as a param value
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class CompiledTemplate:
+    def __init__(self, text: str, known: Optional[Iterable[str]] = None):
+        known_set = frozenset(known) if known is not None else None
+        self.parts: List[str] = []
+        self.slots: List[Tuple[int, str]] = []  # (index into parts, name)
+        unknown = set()
+        pos = 0
+        for m in PLACEHOLDER_RE.finditer(text):
+            name = m.group(1)
+            if known_set is not None and name not in known_set:
+                if not _SPICE_VALUE_RE.search(text, max(0, m.start() - 64), m.start()):
+                    unknown.add(name)
+                continue
+            self.parts.append(text[pos:m.start()])
+            self.slots.append((len(self.parts), name))
+            self.parts.append("")
+            pos = m.end()
+        self.parts.append(text[pos:])
+        self.names: FrozenSet[str] = frozenset(n for _i, n in self.slots)
+        self.unknown: FrozenSet[str] = frozenset(unknown)
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """values may hold extra keys; every slot in the template needs one (TemplateError)."""
+        missing = self.names.difference(values)
+        if missing:
+            raise TemplateError(f"missing template values: {', '.join(sorted(missing))}")
+        out = list(self.parts)
+        for i, name in self.slots:
+            out[i] = str(values[name])
+        return "".join(out)
+
+    def report(self, expected: Iterable[str] = ()) -> Dict[str, List[str]]:
+        """
+        placeholders: slots found; unknown: {NAME}s not in known= (left as-is);
+        missing: expected names the template never uses.
+        """
+        return {
+            "placeholders": sorted(self.names),
+            "unknown": sorted(self.unknown),
+            "missing": sorted(set(expected) - self.names),
+        }
+
+
+# ---------- file templates (cached by mtime) ----------
+
+_file_cache: Dict[Tuple[str, Optional[FrozenSet[str]]], Tuple[Tuple[int, int], CompiledTemplate]] = {}
+_file_lock = threading.Lock()
+
+
+def load_template(path: Path, known: Optional[Iterable[str]] = None,
+                  expected: Iterable[str] = ()) -> CompiledTemplate:
+    """
+    Compiled template for a file; recompiled only when its mtime/size changes
+    (e.g. after /prepare_tpl rewrites it). Problems are printed once per compile.
+    """
+    known_set = frozenset(known) if known is not None else None
+    key = (str(path), known_set)
+    st = path.stat()
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _file_lock:
+        hit = _file_cache.get(key)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+
+    tpl = CompiledTemplate(path.read_text(), known_set)
+    rep = tpl.report(expected)
+    if rep["missing"]:
+        logger.warning("template %s: no placeholder for %s", path.name, rep["missing"])
+    if rep["unknown"]:
+        logger.warning("template %s: unknown placeholders left as-is %s", path.name, rep["unknown"])
+    with _file_lock:
+        _file_cache[key] = (stamp, tpl)
+    return tpl